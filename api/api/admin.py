@@ -1,8 +1,9 @@
 from django.contrib import admin
-from .models import Switch, Reservation, Port, TopologyShare
+from .models import Switch, Reservation, Port, TopologyShare, Job
 
 # Register your models here.
 admin.site.register(Switch)
 admin.site.register(Reservation)
 admin.site.register(Port)
-admin.site.register(TopologyShare)
\ No newline at end of file
+admin.site.register(TopologyShare)
+admin.site.register(Job)
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+Per-device circuit breaker.
+
+When a switch or backbone is down, every cli() call used to burn its retries
+and timeouts, and every SSH connect waited for its own timeout, filling the
+worker pools with requests bound to fail. The REST client, the SSH pool (and
+so the management commands) and the async client now report the outcome of
+their connection attempts here:
+
+- after BREAKER_THRESHOLD consecutive connection failures the circuit of the
+  host opens: calls fail immediately with CircuitOpen for BREAKER_RESET
+  seconds;
+- then the circuit is half-open: a single call goes through as a probe; its
+  success closes the circuit, its failure opens it again. A probe whose
+  outcome is never reported (it raised an error the caller doesn't count)
+  expires after BREAKER_PROBE_TIMEOUT seconds and another probe is let through.
+
+Only failures to reach the device count (timeouts, refused connections,
+TLS/SSH transport errors); an error answered by the device proves it is up.
+
+The state lives in memory for the fast path. Openings and closings are stored
+in the DeviceCircuit table and picked up by the other processes (web,
+job workers, daemons) within BREAKER_SYNC seconds; the table also feeds the
+device_health endpoint.
+"""
+import threading
+import time
+import logging
+from datetime import timedelta
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Consecutive connection failures opening the circuit of a host
+BREAKER_THRESHOLD = 3
+# Seconds an open circuit fails fast before letting a probe through
+BREAKER_RESET = 30
+# Seconds between two reads of the shared state of a host
+BREAKER_SYNC = 5
+# Seconds after which a probe with no reported outcome is abandoned
+BREAKER_PROBE_TIMEOUT = 60
+
+
+class CircuitOpen(ConnectionError):
+    """Raised instead of contacting a host whose circuit is open."""
+    def __init__(self, host: str, retry_in: float):
+        self.host = host
+        self.message = f"{host} is unreachable, not retrying for {max(retry_in, 0):.0f}s (circuit open)"
+        super().__init__(self.message)
+
+
+class _Circuit:
+    def __init__(self):
+        self.failures = 0
+        self.open_until = None  # monotonic time, None when closed
+        self.probing = False
+        self.probe_started = 0.0
+        self.synced_at = float('-inf')
+
+
+class BreakerRegistry:
+    """
+    Thread-safe registry of the circuits of every host seen by the process.
+    """
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset: float = BREAKER_RESET, sync: float = BREAKER_SYNC,
+                 probe_timeout: float = BREAKER_PROBE_TIMEOUT):
+        self.threshold = threshold
+        self.reset = reset
+        self.sync = sync
+        self.probe_timeout = probe_timeout
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _probing(self, circuit: _Circuit, now: float) -> bool:
+        # A probe whose outcome was never reported doesn't block the circuit forever
+        return circuit.probing and now - circuit.probe_started < self.probe_timeout
+
+    def _circuit(self, host: str) -> _Circuit:
+        circuit = self._circuits.get(host)
+        if circuit is None:
+            circuit = self._circuits[host] = _Circuit()
+        return circuit
+
+    def before(self, host: str, sync: bool = True):
+        """
+        Called before contacting a host.
+
+        Args:
+            sync (bool): Read the shared state first when it is stale. Async
+                callers pass False and run pull() in a thread (see stale()).
+
+        Raises:
+            CircuitOpen: If the circuit is open, or half-open with a probe already running.
+        """
+        if sync and self.stale(host):
+            self.pull(host)
+
+        with self._lock:
+            circuit = self._circuit(host)
+            if circuit.open_until is None:
+                return
+            now = time.monotonic()
+            if now < circuit.open_until or self._probing(circuit, now):
+                raise CircuitOpen(host, max(circuit.open_until, circuit.probe_started + self.probe_timeout) - now)
+            # Half-open: this call is the probe
+            circuit.probing = True
+            circuit.probe_started = now
+            logger.info(f"Circuit of {host} half-open, probing")
+
+    def success(self, host: str):
+        """Called when the host answered."""
+        transition = self.record_success(host)
+        if transition:
+            self.store(host, transition)
+
+    def failure(self, host: str, error=None):
+        """Called when the host couldn't be reached."""
+        transition = self.record_failure(host, error)
+        if transition:
+            self.store(host, transition)
+
+    def record_success(self, host: str):
+        """
+        In-memory part of success(), without database access.
+
+        Returns:
+            dict: State to store() if the circuit closed, else None.
+        """
+        with self._lock:
+            circuit = self._circuit(host)
+            was_open = circuit.open_until is not None
+            circuit.failures = 0
+            circuit.open_until = None
+            circuit.probing = False
+        if not was_open:
+            return None
+        logger.info(f"Circuit of {host} closed")
+        return {'state': 'CLOSED', 'failures': 0, 'open_until': None, 'last_error': ''}
+
+    def record_failure(self, host: str, error=None):
+        """
+        In-memory part of failure(), without database access.
+
+        Returns:
+            dict: State to store() if the circuit opened, else None.
+        """
+        with self._lock:
+            circuit = self._circuit(host)
+            circuit.failures += 1
+            opening = circuit.probing or (circuit.open_until is None and circuit.failures >= self.threshold)
+            if opening:
+                circuit.open_until = time.monotonic() + self.reset
+                circuit.probing = False
+            failures = circuit.failures
+        if not opening:
+            return None
+        logger.warning(f"Circuit of {host} opened after {failures} failure(s): {error}")
+        return {'state': 'OPEN', 'failures': failures, 'open_until': timezone.now() + timedelta(seconds=self.reset),
+                'last_error': str(error or '')[:1000]}
+
+    def stale(self, host: str) -> bool:
+        """Tells whether the shared state of a host should be read again (pull())."""
+        with self._lock:
+            return time.monotonic() - self._circuit(host).synced_at >= self.sync
+
+    def pull(self, host: str):
+        """Adopts the state stored by another process (database access)."""
+        from .models import DeviceCircuit
+        try:
+            row = DeviceCircuit.objects.filter(host=host).values('state', 'failures', 'open_until').first()
+        except Exception as e:
+            logger.warning(f"Can't read the circuit of {host}: {e}")
+            row = None
+        with self._lock:
+            circuit = self._circuit(host)
+            circuit.synced_at = time.monotonic()
+            if row is None or self._probing(circuit, circuit.synced_at):
+                return
+            if row['state'] == 'OPEN' and circuit.open_until is None:
+                remaining = (row['open_until'] - timezone.now()).total_seconds() if row['open_until'] else 0
+                circuit.open_until = time.monotonic() + remaining
+                circuit.failures = row['failures']
+            elif row['state'] == 'CLOSED' and circuit.open_until is not None:
+                circuit.open_until = None
+                circuit.failures = 0
+
+    def store(self, host: str, transition: dict):
+        """Shares a transition with the other processes (database access)."""
+        from .models import DeviceCircuit
+        try:
+            DeviceCircuit.objects.update_or_create(host=host, defaults=transition)
+        except Exception as e:
+            logger.warning(f"Can't store the circuit of {host}: {e}")
+
+    def reset_all(self):
+        """Forgets the in-memory state of every host."""
+        with self._lock:
+            self._circuits.clear()
+
+
+BREAKERS = BreakerRegistry()
@@ -0,0 +1,134 @@
+"""
+Conditional GETs and delta feed built on the inventory change log.
+
+- inventory_condition() serves the latest change version of the models a
+  list endpoint depends on as ETag/Last-Modified, and answers
+  304 Not Modified when the client already has it;
+- delta() returns the rows changed since a version, so a client that did one
+  full sync only needs to fetch what changed afterwards.
+"""
+import functools
+from datetime import timedelta
+
+from django.db.models import Min, Max
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import Switch, Port, Reservation, TopologyShare, Change
+from .serializers import SwitchHealthSerializer, PortSerializer, ReservationSerializer, values_of
+from .health import with_health
+
+# Changes younger than this are replayed in the next delta as well: a log row
+# with a lower id may still be committing.
+SETTLE_SECONDS = 1
+
+DELTA_MODELS = (
+    ('switchs', Switch, SwitchHealthSerializer),
+    ('ports', Port, PortSerializer),
+    ('reservations', Reservation, ReservationSerializer),
+)
+
+
+def base_queryset(model):
+    """Rows of an inventory model as its list endpoint returns them (switches come with their health)."""
+    return with_health(model.objects.all()) if model is Switch else model.objects.all()
+
+
+def inventory_condition(*models, extra_modified=None):
+    """
+    Decorator for GET endpoints whose content only depends on `models`.
+    Responses carry the change version as ETag and must be revalidated
+    (Cache-Control: no-cache), so browsers send If-None-Match by themselves.
+
+    Args:
+        extra_modified: Optional function returning the last modification
+            date of other data the endpoint serves (not in the change log);
+            it is part of the ETag and Last-Modified as well.
+    """
+    def latest(request):
+        # ETag and Last-Modified come from the same queries
+        if not hasattr(request, '_latest_change'):
+            version, modified = Change.latest(*models)
+            extra = extra_modified() if extra_modified else None
+            request._latest_change = (version, modified, extra)
+        return request._latest_change
+
+    def etag(request, *args, **kwargs):
+        version, _, extra = latest(request)
+        suffix = f"-{extra.timestamp():.6f}" if extra else ""
+        return f"{'-'.join(model._meta.model_name for model in models)}-{version}{suffix}"
+
+    def last_modified(request, *args, **kwargs):
+        _, modified, extra = latest(request)
+        return max(filter(None, (modified, extra)), default=None)
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def current_version() -> int:
+    """
+    Returns the version a client can safely resume from: the latest change
+    old enough that no row with a lower id can still be committing.
+    Younger changes are sent again in the next delta.
+    """
+    settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+    return Change.objects.filter(created_at__lt=settled).aggregate(version=Max('id'))['version'] or 0
+
+
+def delta(user, since: int) -> dict:
+    """
+    Collects the objects changed after version `since`.
+
+    Args:
+        user (User): Requesting user; only their topology shares are returned.
+        since (int): Version of the client's last sync.
+
+    Returns:
+        dict: {
+            "version": <version to send as 'since' next time>,
+            "switchs": [...], "ports": [...], "reservations": [...],
+            "topology_shares": [...],
+            "deleted": {"switchs": [ids], "ports": [ids], "reservations": [ids], "topology_shares": [ids]}
+        }
+    """
+    version = current_version()
+    changed = {}
+    for model, object_id in Change.objects.filter(id__gt=since).values_list('model', 'object_id'):
+        changed.setdefault(model, set()).add(object_id)
+
+    result = {"version": max(version, since), "deleted": {}}
+    for key, model, serializer in DELTA_MODELS:
+        ids = changed.get(model._meta.model_name, set())
+        rows = values_of(base_queryset(model).filter(id__in=ids).order_by('id'), serializer) if ids else []
+        result[key] = rows
+        result["deleted"][key] = sorted(ids - {row['id'] for row in rows})
+
+    ids = changed.get(TopologyShare._meta.model_name, set())
+    shares = list(
+        TopologyShare.objects.filter(id__in=ids).order_by('id')
+        .values('id', 'owner_id', 'target_id', 'created_at')
+    ) if ids else []
+    result["topology_shares"] = [share for share in shares if user.id in (share['owner_id'], share['target_id'])]
+    result["deleted"]["topology_shares"] = sorted(ids - {share['id'] for share in shares})
+    return result
+
+
+def needs_resync(since: int) -> bool:
+    """
+    Tells whether the log can't answer a delta from `since`: the changes right
+    after it were pruned, or the version comes from another database.
+    """
+    bounds = Change.objects.aggregate(oldest=Min('id'), latest=Max('id'))
+    if bounds['latest'] is None:
+        return since > 0
+    return since < bounds['oldest'] - 1 or since > bounds['latest']
@@ -0,0 +1,98 @@
+"""
+Short-lived cache of the parsed VLAN configuration of each backbone.
+
+Verifying a link used to download and re-parse the whole
+'show configuration snapshot vlan' output on every attempt. The parsed index
+(svlan -> SAP lines) is now kept per backbone for a few seconds:
+
+- configuration writes made through cli() invalidate the backbone's entry;
+- concurrent verifications on the same backbone share a single fetch, and a
+  caller never gets a snapshot taken before its own last invalidation.
+"""
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Seconds a parsed snapshot is served without refetching it
+CONFIG_TTL = 5
+
+
+class _Entry:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.index = None
+        self.index_generation = -1
+        self.fetched_at = 0.0
+        self.generation = 0
+        self.fetching = False
+
+
+class VlanConfigCache:
+    """
+    Thread-safe, per-backbone cache with single-flight refresh.
+    """
+    def __init__(self, ttl: float = CONFIG_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, ip: str) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(ip)
+            if entry is None:
+                entry = self._entries[ip] = _Entry()
+            return entry
+
+    def get(self, ip: str, fetch) -> dict:
+        """
+        Returns the parsed configuration of a backbone, fetching it if needed.
+
+        Args:
+            ip (str): IP address of the backbone.
+            fetch (callable): Downloads and parses the configuration.
+
+        Returns:
+            dict: The parsed configuration index.
+        """
+        entry = self._entry(ip)
+        with entry.cond:
+            wanted = entry.generation
+            while True:
+                if (entry.index is not None and entry.index_generation >= wanted
+                        and time.monotonic() - entry.fetched_at < self.ttl):
+                    return entry.index
+                if not entry.fetching:
+                    break
+                # Another thread is fetching: wait for its result
+                entry.cond.wait()
+            entry.fetching = True
+            generation = entry.generation
+
+        try:
+            index = fetch()
+        except Exception:
+            with entry.cond:
+                entry.fetching = False
+                entry.cond.notify_all()
+            raise
+
+        with entry.cond:
+            entry.index = index
+            entry.index_generation = generation
+            entry.fetched_at = time.monotonic()
+            entry.fetching = False
+            entry.cond.notify_all()
+        return index
+
+    def invalidate(self, ip: str):
+        """
+        Marks the cached configuration of a backbone as outdated.
+        """
+        entry = self._entry(ip)
+        with entry.cond:
+            entry.generation += 1
+
+
+VLAN_CONFIG = VlanConfigCache()
@@ -0,0 +1,399 @@
+"""
+Asyncio client for the switches and backbones.
+
+It offers the operations of the blocking helpers of models.py (cli(),
+cli_batch(), the cleanup SSH session, link creation/deletion),
+but awaits the network instead of holding a thread, so the ASGI application
+can keep hundreds of slow device operations in flight in one process:
+
+- HTTPS requests go through one keep-alive httpx.AsyncClient per device, with
+  the session cookie cached and refreshed like rest_sessions.SESSIONS;
+- SSH sessions are opened with asyncssh;
+- every connection attempt goes through the circuit breaker of the device
+  (breaker.py), shared with the blocking client.
+
+The HTTPS clients belong to the event loop that created them. Each loop gets
+its own set (uvicorn runs one loop per process; async_to_sync under WSGI
+creates short-lived ones).
+"""
+import asyncio
+import contextlib
+import logging
+import weakref
+from typing import Any, Optional
+
+import asyncssh
+import httpx
+from asgiref.sync import sync_to_async
+from django.db import connection
+
+from .models import (
+    SWITCH_USERNAME, SWITCH_PASSWORD, APIRequestError, Port, Reservation, Change, batch_error, parse_vlan_snapshot,
+)
+from .rest_sessions import ACCEPT_HEADER, COOKIE_TTL, POOL_MAXSIZE, parse_max_age
+from .config_cache import VLAN_CONFIG
+from .breaker import BREAKERS, CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a device request or SSH login times out
+DEVICE_TIMEOUT = 5
+# Request errors meaning the device couldn't be reached (fed to the circuit breaker)
+UNREACHABLE_ERRORS = (httpx.TransportError,)
+
+
+def _breaker_db(method, *args):
+    # Runs a database step of the breaker in a worker thread, off the shared sync thread
+    try:
+        method(*args)
+    finally:
+        connection.close()
+
+
+async def breaker_before(host: str):
+    """
+    BREAKERS.before() without blocking the loop: the circuit is checked in
+    memory, and only the periodic read of the shared state leaves the loop.
+    """
+    if BREAKERS.stale(host):
+        await sync_to_async(_breaker_db, thread_sensitive=False)(BREAKERS.pull, host)
+    BREAKERS.before(host, sync=False)
+
+
+async def breaker_success(host: str):
+    transition = BREAKERS.record_success(host)
+    if transition:
+        await sync_to_async(_breaker_db, thread_sensitive=False)(BREAKERS.store, host, transition)
+
+
+async def breaker_failure(host: str, error=None):
+    transition = BREAKERS.record_failure(host, error)
+    if transition:
+        await sync_to_async(_breaker_db, thread_sensitive=False)(BREAKERS.store, host, transition)
+
+
+class AsyncSwitchSession:
+    """
+    Keep-alive HTTPS client and authentication cookie for one device.
+
+    Attributes:
+        ip (str): IP address of the device.
+        http (httpx.AsyncClient): Pooled client used for every request.
+        auth_lock (asyncio.Lock): Serializes authentication so concurrent
+            tasks don't all log in at the same time.
+    """
+    def __init__(self, ip: str, pool_maxsize: int = POOL_MAXSIZE, cookie_ttl: int = COOKIE_TTL):
+        self.ip = ip
+        self.cookie_ttl = cookie_ttl
+        self.http = httpx.AsyncClient(
+            verify=False, timeout=DEVICE_TIMEOUT, headers={'Accept': ACCEPT_HEADER},
+            limits=httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize),
+        )
+        self.auth_lock = asyncio.Lock()
+        self._cookie = None
+        self._expires_at = 0.0
+
+    def valid_cookie(self) -> Optional[str]:
+        if self._cookie is not None and asyncio.get_running_loop().time() < self._expires_at:
+            return self._cookie
+        return None
+
+    def store_cookie(self, cookie: str, max_age: Optional[int] = None):
+        ttl = max_age if max_age is not None else self.cookie_ttl
+        self._cookie = cookie
+        self._expires_at = asyncio.get_running_loop().time() + ttl
+
+    def invalidate(self):
+        self._cookie = None
+        self._expires_at = 0.0
+
+
+_sessions = weakref.WeakKeyDictionary()
+
+
+def get_session(ip: str) -> AsyncSwitchSession:
+    """
+    Returns the session of a device for the running event loop, creating it on first use.
+    """
+    sessions = _sessions.setdefault(asyncio.get_running_loop(), {})
+    session = sessions.get(ip)
+    if session is None:
+        session = sessions[ip] = AsyncSwitchSession(ip)
+        logger.info(f"Opened async HTTPS session for {ip}")
+    return session
+
+
+async def get_cookie(ip: str, retries: int = 3, delay: float = 1.0) -> str:
+    """
+    Authenticate and retrieve a session cookie for a given switch.
+
+    Raises:
+        APIRequestError: If authentication fails.
+    """
+    session = get_session(ip)
+    auth_url = f"https://{ip}?domain=auth&username={SWITCH_USERNAME}&password={SWITCH_PASSWORD}"
+
+    for attempt in range(retries):
+        try:
+            await breaker_before(ip)
+        except CircuitOpen as e:
+            raise APIRequestError(e.message)
+        try:
+            response = await session.http.get(auth_url)
+            await breaker_success(ip)
+            response.raise_for_status()
+            set_cookie = response.headers.get('Set-Cookie')
+            if set_cookie:
+                cookie_pair = set_cookie.split(';')[0]
+                if '=' in cookie_pair:
+                    _, cookie_value = cookie_pair.split('=', 1)
+                    session.store_cookie(cookie_value, parse_max_age(set_cookie))
+                    logger.info(f"Authenticated on {ip}; cookie obtained.")
+                    return cookie_value
+            logger.warning(f"Authentication on {ip} did not return a cookie.")
+        except httpx.HTTPError as e:
+            if isinstance(e, UNREACHABLE_ERRORS):
+                await breaker_failure(ip, e)
+            logger.error(f"Attempt {attempt+1}/{retries}: Authentication failed for {ip}: {e}")
+            if attempt < retries - 1:
+                await asyncio.sleep(delay)
+                continue
+            raise APIRequestError(f"Authentication failed for {ip}: {e}")
+    raise APIRequestError(f"Authentication failed for {ip} after {retries} attempts.")
+
+
+async def session_cookie(ip: str) -> str:
+    """
+    Returns a valid session cookie for a switch, authenticating only when needed.
+    """
+    session = get_session(ip)
+    cookie = session.valid_cookie()
+    if cookie is None:
+        async with session.auth_lock:
+            cookie = session.valid_cookie() or await get_cookie(ip)
+    return cookie
+
+
+async def cli(ip: str, cmd: str, retries: int = 3, delay: float = 1.0) -> Any:
+    """
+    Executes a CLI command on a network device. Same behaviour as models.cli().
+
+    Raises:
+        APIRequestError: If the API request fails.
+    """
+    session = get_session(ip)
+    headers = {'Cookie': f"wv_sess={await session_cookie(ip)}"}
+
+    for attempt in range(retries):
+        try:
+            await breaker_before(ip)
+        except CircuitOpen as e:
+            raise APIRequestError(e.message)
+        try:
+            response = await session.http.get(f"https://{ip}?domain=cli&cmd={cmd}", headers=headers)
+            await breaker_success(ip)
+            if response.status_code != 200:
+                try:
+                    error_message = response.json().get("error", response.text)
+                except ValueError:
+                    error_message = response.text
+                logger.error(f"Request to {ip} failed with status {response.status_code}: {error_message}")
+                raise APIRequestError(f"Request to {ip} failed with status {response.status_code}: {error_message}")
+
+            result = response.json().get("result", {})
+            if result.get("error") == "You must login first":
+                logger.info(f"Cookie expired on {ip}, re-authenticating.")
+                session.invalidate()
+                headers['Cookie'] = f"wv_sess={await session_cookie(ip)}"
+                continue
+
+            output = result.get("output")
+            if output is None:
+                raise APIRequestError("Unexpected response format: 'output' missing.")
+            if not cmd.startswith("show"):
+                VLAN_CONFIG.invalidate(ip)
+            return output
+
+        except httpx.HTTPError as e:
+            if isinstance(e, UNREACHABLE_ERRORS):
+                await breaker_failure(ip, e)
+            logger.error(f"Attempt {attempt+1}/{retries}: Request to {ip} failed: {e}")
+            if attempt < retries - 1:
+                await asyncio.sleep(delay)
+                continue
+            raise APIRequestError(f"Request to {ip} failed: {e}")
+
+    raise APIRequestError(f"CLI command failed on {ip} after {retries} attempts.")
+
+
+async def cli_batch(ip: str, cmds: list, retries: int = 3, delay: float = 1.0) -> list:
+    """
+    Executes an ordered list of CLI commands. Same result format as models.cli_batch().
+    """
+    results = []
+    failed = False
+    for cmd in cmds:
+        if failed:
+            results.append({'cmd': cmd, 'status': 'skipped', 'output': None, 'error': None})
+            continue
+        try:
+            output = await cli(ip, cmd, retries, delay)
+            results.append({'cmd': cmd, 'status': 'ok', 'output': output, 'error': None})
+        except APIRequestError as e:
+            logger.error(f"Batch on {ip} stopped at '{cmd}': {e.message}")
+            results.append({'cmd': cmd, 'status': 'failed', 'output': None, 'error': e.message})
+            failed = True
+    return results
+
+
+def _store_admin_state(port_ids: list, state: str):
+    Port.objects.filter(id__in=port_ids).update(status=state)
+    Change.record(Port, port_ids)
+
+
+async def set_admin_state(ports, state: str, commands: dict = None) -> bool:
+    """
+    Sets the admin state of several ports. Same behaviour as Port.set_admin_state(),
+    the backbones are configured concurrently.
+    """
+    batches = {backbone: list(cmds) for backbone, cmds in (commands or {}).items()}
+    state_commands = {}
+    for port in ports:
+        cmd = port.admin_state_command(state)
+        batches.setdefault(port.backbone, []).append(cmd)
+        state_commands[(port.backbone, cmd)] = port
+
+    backbones = list(batches)
+    outcomes = await asyncio.gather(*(cli_batch(backbone, batches[backbone]) for backbone in backbones))
+
+    success = True
+    changed = []
+    for backbone, results in zip(backbones, outcomes):
+        for result in results:
+            port = state_commands.get((backbone, result['cmd']))
+            if port is not None and result['status'] == 'ok':
+                changed.append(port)
+        error = batch_error(results)
+        if error:
+            logger.error("Command '%s' failed on %s: %s", error['cmd'], backbone, error['error'])
+            success = False
+
+    if changed:
+        await sync_to_async(_store_admin_state)([port.id for port in changed], state)
+        for port in changed:
+            port.status = state
+    return success
+
+
+async def create_link(portA, portB, user_name: str) -> bool:
+    """
+    Creates a link configuration between two ports, see Port.create_link().
+    """
+    link_commands = Port.link_commands(portA, portB, user_name)
+    if not await set_admin_state([portA, portB], 'UP', {portA.backbone: link_commands}):
+        logger.error("Failed to create link between ports %s and %s", portA.port_backbone, portB.port_backbone)
+        return False
+    return True
+
+
+async def delete_link(portA, portB, user_name: str) -> bool:
+    """
+    Deletes the link configuration between two ports, see Port.delete_link().
+    """
+    if portA.svlan is None:
+        logger.info("Port %s has no SVLAN, link already deleted", portA.port_backbone)
+        return True
+    if portA.svlan != portB.svlan:
+        logger.error("Ports %s and %s don't have matching SVLANs (%s vs %s)",
+                     portA.port_backbone, portB.port_backbone, portA.svlan, portB.svlan)
+        return False
+
+    if not await set_admin_state([portA, portB], 'DOWN'):
+        logger.error("Failed to bring down one or both ports before link deletion")
+        return False
+
+    results = await cli_batch(portA.backbone, Port.unlink_commands(portA, portB, user_name))
+    error = batch_error(results)
+    if error:
+        logger.error("Failed to delete link between ports %s and %s: %s",
+                     portA.port_backbone, portB.port_backbone, error['error'])
+        return False
+    logger.info("Link deleted successfully between ports %s and %s", portA.port_backbone, portB.port_backbone)
+    return True
+
+
+async def verify_links(backbone: str, svlans: list, expected_lines: int = 4) -> set:
+    """
+    Verifies several links of a backbone against one fresh configuration snapshot,
+    see Port.verify_links().
+
+    Returns:
+        set: The SVLANs whose configuration is correct.
+    """
+    index = parse_vlan_snapshot(await cli(backbone, "show configuration snapshot vlan"))
+    return {svlan for svlan in svlans if len(index.get(str(svlan), [])) == expected_lines}
+
+
+@contextlib.asynccontextmanager
+async def _connect_ssh(switch):
+    # CircuitOpen is an OSError: callers report it like any connection error
+    await breaker_before(switch.mngt_IP)
+    try:
+        conn = await asyncssh.connect(switch.mngt_IP, username=SWITCH_USERNAME, password=SWITCH_PASSWORD,
+                                      known_hosts=None, connect_timeout=DEVICE_TIMEOUT,
+                                      login_timeout=DEVICE_TIMEOUT)
+    except asyncssh.PermissionDenied:
+        # A refused login proves the switch is up
+        await breaker_success(switch.mngt_IP)
+        raise
+    except (OSError, asyncssh.Error) as e:
+        await breaker_failure(switch.mngt_IP, e)
+        raise
+    await breaker_success(switch.mngt_IP)
+    async with conn:
+        yield conn
+
+
+async def cleanup(switch) -> bool:
+    """
+    Restores the clean configuration of a free switch and reloads it, see Switch.cleanup().
+    """
+    if await Reservation.objects.filter(switch=switch).aexists():
+        logger.info("Switch %s is reserved. Skipping cleanup.", switch.mngt_IP)
+        return False
+
+    try:
+        async with _connect_ssh(switch) as conn:
+            result = await conn.run("rm -rf working/*")
+            if result.exit_status != 0:
+                logger.warning("Working directory cleanup on %s returned status %s: %s",
+                               switch.mngt_IP, result.exit_status, result.stderr)
+            result = await conn.run("cp -r init/* working/")
+            if result.exit_status != 0:
+                logger.error("Copy from init to working failed on %s with exit status %s: %s",
+                             switch.mngt_IP, result.exit_status, result.stderr)
+                return False
+
+            result = await conn.run("ls working/")
+            if result.exit_status != 0:
+                logger.error("Could not verify working directory contents on switch %s", switch.mngt_IP)
+                return False
+            missing = [name for name in ('.img', 'pkg', 'vcboot.cfg') if name not in result.stdout]
+            if missing:
+                logger.error("Missing %s in working directory on switch %s", missing, switch.mngt_IP)
+                return False
+
+            await conn.run("rm -rf certified/*")
+            result = await conn.run("cp -r init/* certified/")
+            if result.exit_status != 0:
+                logger.warning("Copy to certified failed on %s: %s", switch.mngt_IP, result.stderr)
+
+            # The reload asks for a confirmation on a pseudo-tty
+            process = await conn.create_process("reload from working no rollback-timeout", term_type='vt100')
+            await asyncio.sleep(1)
+            process.stdin.write('y\n')
+            logger.info("Successfully initiated cleanup reload for switch %s", switch.mngt_IP)
+            return True
+    except (OSError, asyncssh.Error) as e:
+        logger.error("Error during cleanup for switch %s: %s", switch.mngt_IP, e)
+        return False
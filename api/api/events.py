@@ -0,0 +1,296 @@
+"""
+Server-sent events for live topology updates.
+
+Each ASGI process runs one EventHub. It pulls inventory changes from a
+broker, resolves them into events once, and fans them out to the queues of
+the connected clients, keeping only what each user can see:
+- switches and reservations: everybody (like list_switch/list_reservation);
+- ports (status and links): users with a reservation on the port's switch
+  and the users those owners shared their topology with;
+- topology shares: their owner and target;
+- deletions: everybody, as they only carry the id of a row that no longer exists.
+
+The broker is pluggable (settings.EVENT_BROKER). The default one follows the
+inventory change log (models.Change), which every process writing to the
+inventory (API, job worker, cleanup daemon, populate commands) already feeds.
+"""
+import abc
+import asyncio
+import json
+import logging
+import secrets
+from datetime import timedelta
+from typing import AsyncIterator
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.authtoken.models import Token
+
+from .models import Switch, Port, Reservation, TopologyShare, Change, EventTicket
+from .serializers import SwitchHealthSerializer, PortSerializer, ReservationSerializer, values_of
+from .changes import SETTLE_SECONDS, base_queryset
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two reads of the change log
+EVENT_POLL_INTERVAL = 0.25
+# Events buffered per client before it is asked to resync
+QUEUE_SIZE = 256
+# Seconds between two keepalive comments on an idle stream
+KEEPALIVE_INTERVAL = 15
+# Seconds the browser waits before reconnecting a closed stream
+RECONNECT_DELAY = 3
+# Seconds a stream ticket stays valid
+TICKET_TTL = 30
+
+EVENT_MODELS = {
+    'switch': (Switch, SwitchHealthSerializer),
+    'port': (Port, PortSerializer),
+    'reservation': (Reservation, ReservationSerializer),
+}
+
+
+class Broker(abc.ABC):
+    """
+    Source of inventory changes (settings.EVENT_BROKER).
+    """
+    @abc.abstractmethod
+    def listen(self) -> AsyncIterator[list]:
+        """
+        Async iterator yielding lists of (version, model name, object id),
+        typically an async generator.
+        """
+
+
+class ChangeLogBroker(Broker):
+    """
+    Polls the change log. Rows younger than SETTLE_SECONDS are read again on
+    the next polls (and deduplicated), as a row with a lower id may still be
+    committing.
+    """
+    def __init__(self, poll_interval: float = EVENT_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+
+    async def listen(self):
+        cursor = await sync_to_async(self.latest_version)()
+        seen = set()
+        while True:
+            rows = await sync_to_async(self.read_after)(cursor)
+            fresh = [(version, model, object_id) for version, model, object_id, _ in rows if version not in seen]
+            if fresh:
+                yield fresh
+
+            settled = timezone.now() - timedelta(seconds=SETTLE_SECONDS)
+            seen.update(version for version, _, _ in fresh)
+            cursor = max([cursor] + [version for version, _, _, created_at in rows if created_at < settled])
+            seen = {version for version in seen if version > cursor}
+            await asyncio.sleep(self.poll_interval)
+
+    @staticmethod
+    def latest_version() -> int:
+        return Change.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    @staticmethod
+    def read_after(cursor: int) -> list:
+        return list(Change.objects.filter(id__gt=cursor).order_by('id')
+                    .values_list('id', 'model', 'object_id', 'created_at'))
+
+
+def resolve(changes: list) -> list:
+    """
+    Turns a batch of changes into events with their audience.
+
+    Args:
+        changes (list): (version, model name, object id) tuples.
+
+    Returns:
+        list: (audience, event) tuples; audience is a set of user ids, or None
+        for everybody.
+    """
+    ids = {}
+    for _, model, object_id in changes:
+        ids.setdefault(model, set()).add(object_id)
+    version = max(change[0] for change in changes)
+
+    events = []
+    for name, (model, serializer) in EVENT_MODELS.items():
+        if name not in ids:
+            continue
+        rows = values_of(base_queryset(model).filter(id__in=ids[name]).order_by('id'), serializer)
+        viewers = port_viewers(rows) if name == 'port' else None
+        for row in rows:
+            audience = viewers.get(row['switch'], set()) if viewers is not None else None
+            events.append((audience, {"type": name, "id": row['id'], "data": row, "version": version}))
+        for object_id in sorted(ids[name] - {row['id'] for row in rows}):
+            events.append((None, {"type": name, "id": object_id, "deleted": True, "version": version}))
+
+    if 'topologyshare' in ids:
+        shares = list(TopologyShare.objects.filter(id__in=ids['topologyshare'])
+                      .values('id', 'owner_id', 'target_id', 'created_at'))
+        for share in shares:
+            events.append(({share['owner_id'], share['target_id']},
+                           {"type": "topology_share", "id": share['id'], "data": share, "version": version}))
+        for object_id in sorted(ids['topologyshare'] - {share['id'] for share in shares}):
+            events.append((None, {"type": "topology_share", "id": object_id, "deleted": True, "version": version}))
+    return events
+
+
+def port_viewers(ports: list) -> dict:
+    """
+    Returns switch id -> ids of the users whose topology (own or shared) contains it.
+    """
+    owners = {}
+    for switch_id, user_id in Reservation.objects.filter(
+            switch__in={port['switch'] for port in ports}).values_list('switch_id', 'user_id'):
+        owners.setdefault(switch_id, set()).add(user_id)
+
+    targets = {}
+    all_owners = set().union(*owners.values()) if owners else set()
+    for owner_id, target_id in TopologyShare.objects.filter(owner__in=all_owners).values_list('owner_id', 'target_id'):
+        targets.setdefault(owner_id, set()).add(target_id)
+
+    return {
+        switch_id: users.union(*(targets.get(owner, set()) for owner in users))
+        for switch_id, users in owners.items()
+    }
+
+
+class Subscription:
+    def __init__(self, user_id: int):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+
+    def push(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog and ask for a full reload
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({"type": "resync"})
+
+
+class EventHub:
+    """
+    In-process pub/sub. The broker is only listened to while at least one
+    client is connected.
+    """
+    def __init__(self, broker: Broker = None):
+        self.broker = broker
+        self.subscriptions = set()
+        self.task = None
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id)
+        self.subscriptions.add(subscription)
+        if self.task is None or self.task.done():
+            if self.broker is None:
+                self.broker = import_string(getattr(settings, 'EVENT_BROKER', 'api.events.ChangeLogBroker'))()
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+        if not self.subscriptions and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def publish(self, audience, event: dict):
+        for subscription in list(self.subscriptions):
+            if audience is None or subscription.user_id in audience:
+                subscription.push(event)
+
+    async def run(self):
+        try:
+            async for changes in self.broker.listen():
+                for audience, event in await sync_to_async(resolve)(changes):
+                    self.publish(audience, event)
+        except Exception as e:
+            # Clients end their stream on resync and reconnect, which restarts the hub
+            logger.error(f"Event hub stopped: {e}")
+            self.publish(None, {"type": "resync"})
+
+
+HUB = EventHub()
+
+
+async def token_user(key: str):
+    """
+    Returns the active user owning an API token, or None.
+    """
+    token = await Token.objects.select_related('user').filter(key=key).afirst()
+    return token.user if token is not None and token.user.is_active else None
+
+
+def issue_ticket(user) -> str:
+    """
+    Creates a stream ticket for a user (from an authenticated request), and
+    drops the expired ones.
+
+    Returns:
+        str: The ticket, valid once and for TICKET_TTL seconds.
+    """
+    now = timezone.now()
+    EventTicket.objects.filter(expires_at__lt=now).delete()
+    key = secrets.token_urlsafe(32)
+    EventTicket.objects.create(key=key, user=user, expires_at=now + timedelta(seconds=TICKET_TTL))
+    return key
+
+
+async def ticket_user(key: str):
+    """
+    Consumes a stream ticket.
+
+    Returns:
+        User: The active user of the ticket, or None if it is unknown, expired
+        or already used.
+    """
+    ticket = await EventTicket.objects.select_related('user').filter(key=key).afirst()
+    if ticket is None:
+        return None
+    # Only the request deleting the row gets the user: a ticket can't open two streams
+    deleted, _ = await EventTicket.objects.filter(id=ticket.id).adelete()
+    if not deleted or ticket.expires_at <= timezone.now() or not ticket.user.is_active:
+        return None
+    return ticket.user
+
+
+async def authenticate(request):
+    """
+    Authenticates an event stream request. EventSource can't send headers,
+    so a single-use ticket from the event_ticket endpoint is accepted as a
+    'ticket' query parameter; the session cookie set at login works as well.
+    The API token is never accepted in the URL, where it would end up in logs.
+
+    Returns:
+        User: The authenticated user, or None.
+    """
+    key = request.GET.get('ticket')
+    if key:
+        return await ticket_user(key)
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+async def stream(subscription: Subscription):
+    """
+    Formats the events of a subscription as server-sent events. The stream
+    ends after a 'resync' event, the client reloads and reconnects.
+    """
+    try:
+        yield f"retry: {RECONNECT_DELAY * 1000}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            version = f"id: {event['version']}\n" if 'version' in event else ""
+            yield f"{version}data: {json.dumps(event, cls=DjangoJSONEncoder)}\n\n"
+            if event['type'] == 'resync':
+                return
+    finally:
+        HUB.unsubscribe(subscription)
@@ -0,0 +1,89 @@
+"""
+Timing of reservation expiries for the cleanup daemon.
+
+The daemon sleeps until the next end_date instead of scanning the table at
+a fixed interval. Creating, changing or deleting a reservation sends a
+PostgreSQL NOTIFY on RESERVATION_CHANNEL, which wakes it up early so the new
+end_date is taken into account. On other databases the daemon re-checks
+every FALLBACK_POLL seconds.
+"""
+import select
+import logging
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Reservation
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_CHANNEL = 'blab_reservations'
+# Longest sleep when the database can't notify the daemon
+FALLBACK_POLL = 10
+
+
+def notify_reservation_change():
+    """
+    Wakes up the cleanup daemon once the current transaction commits.
+    """
+    if connection.vendor != 'postgresql':
+        return
+
+    def notify():
+        with connection.cursor() as cursor:
+            cursor.execute(f"NOTIFY {RESERVATION_CHANNEL}")
+    transaction.on_commit(notify)
+
+
+def next_expiry(exclude_switches=()):
+    """
+    Returns the earliest end_date still in the future, using the end_date index.
+
+    Args:
+        exclude_switches (iterable): Switches to ignore (e.g. being cleaned).
+
+    Returns:
+        datetime: The next expiry, or None if no reservation ends.
+    """
+    return (Reservation.objects.filter(end_date__gte=timezone.now())
+            .exclude(switch__in=exclude_switches)
+            .order_by('end_date').values_list('end_date', flat=True).first())
+
+
+class ExpiryListener:
+    """
+    Blocks until a timeout or a reservation change notification.
+    Uses its own connection, so LISTEN survives Django closing or recycling
+    the connection of the daemon.
+    """
+    def __init__(self):
+        self.raw = None
+        if connection.vendor == 'postgresql':
+            self.raw = connection.get_new_connection(connection.get_connection_params())
+            self.raw.autocommit = True
+            with self.raw.cursor() as cursor:
+                cursor.execute(f"LISTEN {RESERVATION_CHANNEL}")
+            logger.info(f"Listening for reservation changes on '{RESERVATION_CHANNEL}'")
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waits up to `timeout` seconds.
+
+        Returns:
+            bool: True if a reservation changed in the meantime.
+        """
+        timeout = max(timeout, 0)
+        if self.raw is None:
+            select.select([], [], [], min(timeout, FALLBACK_POLL))
+            return False
+
+        self.raw.poll()
+        if not self.raw.notifies and select.select([self.raw], [], [], timeout)[0]:
+            self.raw.poll()
+        changed = bool(self.raw.notifies)
+        self.raw.notifies.clear()
+        return changed
+
+    def close(self):
+        if self.raw is not None:
+            self.raw.close()
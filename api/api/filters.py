@@ -0,0 +1,28 @@
+import django_filters
+from .models import Switch, Port
+
+
+class PortFilter(django_filters.FilterSet):
+    """
+    Query string filters of list_port.
+    e.g. ?switch=3&status=UP, ?backbone=10.69.144.130&free=true, ?svlan=1001
+    """
+    free = django_filters.BooleanFilter(field_name='svlan', lookup_expr='isnull',
+                                        label='True for ports without link, false for linked ports')
+
+    class Meta:
+        model = Port
+        fields = ['switch', 'backbone', 'status', 'svlan']
+
+
+class SwitchFilter(django_filters.FilterSet):
+    """
+    Query string filters of list_switch.
+    e.g. ?model=OS6900-V48C8, ?free=true
+    """
+    free = django_filters.BooleanFilter(field_name='reservation', lookup_expr='isnull', distinct=True,
+                                        label='True for switches nobody reserved, false for reserved ones')
+
+    class Meta:
+        model = Switch
+        fields = ['model', 'mngt_IP']
@@ -0,0 +1,139 @@
+"""
+Reachability of the switches and backbones.
+
+The monitor_devices command probes every switch management IP and every
+backbone on a schedule, and stores the outcome in the DeviceHealth table:
+
+- a probe is a TCP connect to the SSH port, optionally followed by reading
+  the SSH banner; the connect time is stored as the latency;
+- all hosts are probed at the same time from one event loop (at most
+  PROBE_CONCURRENCY sockets open), so a sweep takes about one probe timeout
+  whatever the size of the lab;
+- the results are written with one upsert per outcome.
+
+list_switch reads the stored health (with_health()), never the devices.
+Its ETag includes the date of the last sweep (health_modified()), so clients
+never revalidate stale health. Switches whose reachability changed are also
+logged in the change log, so the delta feed reports them; latency alone
+doesn't bump the version.
+"""
+import asyncio
+import time
+import logging
+
+from django.db.models import F, Max
+from django.utils import timezone
+
+from .models import Switch, Port, DeviceHealth, Change
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a probe gives up
+PROBE_TIMEOUT = 2
+# Sockets opened at the same time by a sweep
+PROBE_CONCURRENCY = 500
+# Port probed on every device
+PROBE_PORT = 22
+
+
+def monitored_hosts() -> list:
+    """
+    Returns the distinct management IPs and backbones of the inventory.
+    """
+    hosts = set(Switch.objects.exclude(mngt_IP="Not available").values_list('mngt_IP', flat=True))
+    hosts.update(Port.objects.values_list('backbone', flat=True).distinct())
+    hosts.discard('')
+    return sorted(hosts)
+
+
+async def probe(host: str, port: int = PROBE_PORT, timeout: float = PROBE_TIMEOUT, banner: bool = False) -> dict:
+    """
+    Checks that a device accepts TCP connections (and sends an SSH banner).
+
+    Returns:
+        dict: {"host", "reachable", "latency_ms", "error"}
+    """
+    started = time.monotonic()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        latency_ms = (time.monotonic() - started) * 1000
+        if banner:
+            line = await asyncio.wait_for(reader.readline(), max(timeout - latency_ms / 1000, 0.1))
+            if not line.startswith(b'SSH-'):
+                raise ConnectionError(f"No SSH banner (got {line[:40]!r})")
+        return {"host": host, "reachable": True, "latency_ms": round(latency_ms, 2), "error": ''}
+    except asyncio.TimeoutError:
+        return {"host": host, "reachable": False, "latency_ms": None, "error": f"No answer within {timeout}s"}
+    except OSError as e:
+        return {"host": host, "reachable": False, "latency_ms": None, "error": str(e) or type(e).__name__}
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def sweep(hosts: list, port: int = PROBE_PORT, timeout: float = PROBE_TIMEOUT, banner: bool = False,
+                concurrency: int = PROBE_CONCURRENCY) -> list:
+    """
+    Probes every host concurrently.
+
+    Returns:
+        list: Result of probe() for each host, in the same order.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(host):
+        async with semaphore:
+            return await probe(host, port, timeout, banner)
+
+    return await asyncio.gather(*(limited(host) for host in hosts))
+
+
+def store(results: list) -> list:
+    """
+    Saves the probe results and forgets the hosts that left the inventory.
+
+    Returns:
+        list: Hosts whose reachability changed (including new ones).
+    """
+    now = timezone.now()
+    previous = dict(DeviceHealth.objects.values_list('host', 'reachable'))
+    up = [DeviceHealth(host=r['host'], reachable=True, latency_ms=r['latency_ms'], checked_at=now, last_seen=now)
+          for r in results if r['reachable']]
+    down = [DeviceHealth(host=r['host'], reachable=False, latency_ms=None, checked_at=now, error=r['error'][:1000])
+            for r in results if not r['reachable']]
+    # last_seen is only moved forward by a successful probe
+    if up:
+        DeviceHealth.objects.bulk_create(up, update_conflicts=True, unique_fields=['host'],
+                                         update_fields=['reachable', 'latency_ms', 'checked_at', 'last_seen', 'error'])
+    if down:
+        DeviceHealth.objects.bulk_create(down, update_conflicts=True, unique_fields=['host'],
+                                         update_fields=['reachable', 'latency_ms', 'checked_at', 'error'])
+    DeviceHealth.objects.exclude(host__in=[r['host'] for r in results]).delete()
+
+    changed = [r['host'] for r in results if previous.get(r['host']) != r['reachable']]
+    if changed:
+        Change.record(Switch, Switch.objects.filter(mngt_IP__in=changed).values_list('id', flat=True))
+    return changed
+
+
+def with_health(queryset):
+    """
+    Annotates a Switch queryset with the stored health of its management IP:
+    reachable, latency_ms, last_seen and health_checked_at (all None if the
+    switch was never probed). The health rows are read with one LEFT JOIN
+    on host (Switch.health).
+    """
+    return queryset.annotate(
+        reachable=F('health__reachable'),
+        latency_ms=F('health__latency_ms'),
+        last_seen=F('health__last_seen'),
+        health_checked_at=F('health__checked_at'),
+    )
+
+
+def health_modified():
+    """
+    Returns the date of the last stored probe (None before the first sweep).
+    """
+    return DeviceHealth.objects.aggregate(latest=Max('checked_at'))['latest']
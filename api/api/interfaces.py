@@ -0,0 +1,98 @@
+"""
+Bulk handling of backbone interface admin states.
+
+Instead of one 'interfaces <port> admin-state ...' command per port, the
+desired states are compared with what the backbone reports and only the
+ports that differ are pushed, grouped into port ranges such as
+'interfaces 1/1/1-48 admin-state enable'.
+"""
+import re
+
+# Matches the first columns of 'show interfaces status': "  1/1/1    en  ..."
+ADMIN_STATE_RE = re.compile(r'^\s*(\d+/\d+/\d+)\s+(en|dis)\b', re.MULTILINE)
+
+ADMIN_STATE_KEYWORDS = {'UP': 'enable', 'DOWN': 'disable'}
+
+
+def parse_admin_states(output: str) -> dict:
+    """
+    Parses the output of 'show interfaces status'.
+
+    Args:
+        output (str): Raw command output.
+
+    Returns:
+        dict: Port (e.g. "1/1/1") -> 'UP' or 'DOWN'.
+    """
+    return {port: 'UP' if state == 'en' else 'DOWN' for port, state in ADMIN_STATE_RE.findall(output)}
+
+
+def port_key(port: str) -> tuple:
+    """
+    Sort key of a port string ("1/2/10" -> (1, 2, 10)).
+    """
+    return tuple(int(part) for part in port.split('/'))
+
+
+def compress_ports(ports) -> list:
+    """
+    Groups ports into ranges of consecutive ports on the same chassis/slot.
+    Inverse of models.expand_port_range.
+
+    Args:
+        ports (iterable): Port strings (e.g. ["1/1/1", "1/1/2", "1/2/5"]).
+
+    Returns:
+        list: Port ranges (e.g. ["1/1/1-2", "1/2/5"]).
+    """
+    ranges = []
+    start = previous = None
+    for port in sorted(set(ports), key=port_key):
+        key = port_key(port)
+        if previous is not None and key[:-1] == previous[:-1] and key[-1] == previous[-1] + 1:
+            previous = key
+            continue
+        if start is not None:
+            ranges.append(format_range(start, previous))
+        start = previous = key
+    if start is not None:
+        ranges.append(format_range(start, previous))
+    return ranges
+
+
+def format_range(start: tuple, end: tuple) -> str:
+    base = '/'.join(str(part) for part in start)
+    return base if start == end else f"{base}-{end[-1]}"
+
+
+def diff_states(desired: dict, current: dict) -> dict:
+    """
+    Finds the ports whose state must change.
+
+    Args:
+        desired (dict): Port -> target state ('UP' or 'DOWN').
+        current (dict): Port -> state reported by the device. Ports missing
+            from it are always pushed.
+
+    Returns:
+        dict: Target state -> list of ports to move to that state.
+    """
+    changes = {}
+    for port, state in desired.items():
+        if current.get(port) != state:
+            changes.setdefault(state, []).append(port)
+    return changes
+
+
+def state_commands(changes: dict) -> list:
+    """
+    Builds the range commands applying the result of diff_states().
+
+    Returns:
+        list: CLI commands, one per port range.
+    """
+    commands = []
+    for state, ports in changes.items():
+        for port_range in compress_ports(ports):
+            commands.append(f"interfaces {port_range} admin-state {ADMIN_STATE_KEYWORDS[state]}")
+    return commands
@@ -0,0 +1,398 @@
+"""
+Background execution of connect/disconnect operations.
+
+The views validate the request, create a Job row and answer immediately with
+its id. The process_jobs management command claims pending jobs from the
+database and runs them on a bounded thread pool, so link creation and the
+verification retries no longer hold a gunicorn worker.
+
+Switch banners are written the same way: reserve/release only queue a
+'banner' job. A switch has at most one pending banner job, which writes the
+reservations of the switch as they are when it runs, so several changes in a
+row end in a single write. A failed write is retried with an exponential
+backoff.
+
+A worker killed in the middle of a job leaves it RUNNING; the workers
+recover such jobs once they are older than JOB_TIMEOUT (see
+recover_stale_jobs).
+"""
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job, Port, Switch, Svlan, Change
+
+logger = logging.getLogger(__name__)
+
+# Verification of the backbone configuration after a link change
+VERIFY_RETRIES = 3
+VERIFY_DELAY = 2
+# Backbones configured at the same time by a connect_many job
+BACKBONE_WORKERS = 8
+
+# Seconds after which a RUNNING job is considered abandoned by a dead worker
+JOB_TIMEOUT = 600
+
+# Retries of a job raising RetryJob, waiting RETRY_BASE_DELAY * 2**attempt seconds (at most RETRY_MAX_DELAY)
+JOB_RETRIES = 5
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 300
+
+# One banner write at a time per switch
+_banner_locks = {}
+_banner_locks_lock = threading.Lock()
+
+
+class RetryJob(Exception):
+    """Raised by a job handler when the operation failed but may succeed later."""
+
+
+def submit(kind: str, user, payload: dict) -> Job:
+    """
+    Queues a job for the background workers.
+
+    Args:
+        kind (str): Operation to run ('connect' or 'disconnect').
+        user (User): User submitting the job.
+        payload (dict): Arguments of the operation.
+
+    Returns:
+        Job: The created job.
+    """
+    job = Job.objects.create(kind=kind, user=user, payload=payload)
+    logger.info(f"Job {job.id} ({kind}) submitted by {user.username}: {payload}")
+    return job
+
+
+def start_inline(kind: str, user, payload: dict) -> Job:
+    """
+    Records an operation run by the caller itself (e.g. an async view) as a
+    RUNNING job, so every process sees it in progress. Workers never claim it;
+    recover_stale_jobs fails it if the caller dies before finish_inline().
+
+    Returns:
+        Job: The created job.
+    """
+    job = Job.objects.create(kind=kind, user=user, payload=payload, status='RUNNING', started_at=timezone.now())
+    logger.info(f"Job {job.id} ({kind}) started inline by {user.username}: {payload}")
+    return job
+
+
+def finish_inline(job: Job, success: bool, detail: str):
+    """
+    Records the outcome of a job started with start_inline().
+    """
+    Job.objects.filter(id=job.id, status='RUNNING').update(
+        status='SUCCEEDED' if success else 'FAILED', detail=detail, finished_at=timezone.now()
+    )
+    logger.info(f"Job {job.id} ({job.kind}) {'SUCCEEDED' if success else 'FAILED'}: {detail}")
+
+
+def job_ports(payload: dict) -> list:
+    """
+    Returns the port ids of a connect, connect_many or disconnect payload.
+    """
+    return [link[key] for link in [payload] + payload.get('links', []) for key in ('portA', 'portB') if key in link]
+
+
+def _unassign_ports(port_ids: list):
+    """
+    Clears the SVLAN of ports whose link couldn't be created and frees it.
+    """
+    ports = Port.objects.filter(id__in=port_ids).exclude(svlan=None)
+    held = list(ports.values_list('id', 'svlan'))
+    if not held:
+        return
+    ports.update(svlan=None)
+    Change.record(Port, [port_id for port_id, _ in held])
+    Svlan.release(*{svlan for _, svlan in held})
+
+
+def connect_ports(job: Job):
+    """
+    Creates the link between the two ports of the job and verifies it.
+    The SVLAN has already been assigned to both ports by the view; it is
+    given back unless the link is verified, even if an error is raised.
+
+    Returns:
+        tuple: (success, detail message)
+    """
+    connected = False
+    try:
+        portA = Port.objects.get(id=job.payload['portA'])
+        portB = Port.objects.get(id=job.payload['portB'])
+        svlan = portA.svlan
+
+        if not Port.create_link(portA, portB, job.user.username):
+            logger.error(f"Failed to connect ports {portA.id} and {portB.id}.")
+            return False, "Ports failed to connect"
+        for attempt in range(VERIFY_RETRIES):
+            if portA.verify_configuration(svlan, 4):
+                connected = True
+                logger.info(f"Ports {portA.id} and {portB.id} connected successfully with svlan {svlan}.")
+                return True, "Ports connected successfully with svlan {}".format(svlan)
+            logger.warning(f"Verification failed on attempt {attempt + 1}/{VERIFY_RETRIES}. Retrying...")
+            time.sleep(VERIFY_DELAY)
+        return False, "Ports failed to connect - Verification fail"
+    finally:
+        if not connected:
+            _unassign_ports(job_ports(job.payload))
+
+
+def _connect_backbone(backbone: str, pairs: list, user_name: str) -> dict:
+    # Creates the links of one backbone over its keep-alive session, then
+    # verifies them together: one configuration snapshot per attempt.
+    outcomes = {}
+    try:
+        pending = {}
+        for portA, portB in pairs:
+            if Port.create_link(portA, portB, user_name):
+                pending[portA.svlan] = (portA, portB)
+            else:
+                outcomes[(portA.id, portB.id)] = (False, "Ports failed to connect")
+
+        for attempt in range(VERIFY_RETRIES):
+            if not pending:
+                break
+            if attempt:
+                time.sleep(VERIFY_DELAY)
+            for svlan in Port.verify_links(backbone, list(pending)):
+                portA, portB = pending.pop(svlan)
+                outcomes[(portA.id, portB.id)] = (True, f"Ports connected successfully with svlan {svlan}")
+        for portA, portB in pending.values():
+            outcomes[(portA.id, portB.id)] = (False, "Ports failed to connect - Verification fail")
+    except Exception as e:
+        logger.error(f"Error while connecting links on backbone {backbone}: {e}")
+        for portA, portB in pairs:
+            outcomes.setdefault((portA.id, portB.id), (False, f"Unexpected error: {e}"))
+    finally:
+        connection.close()
+    return outcomes
+
+
+def connect_links(job: Job):
+    """
+    Creates all the links of the job. The SVLANs have already been assigned
+    by the view. Backbones are configured in parallel; the links of a backbone
+    are created one after the other and verified together.
+    The per-link outcome is stored in job.result. The SVLANs of the links not
+    verified are given back, even if an error is raised.
+
+    Returns:
+        tuple: (success, detail message)
+    """
+    links = job.payload['links']
+    outcomes = {}
+    try:
+        ports = Port.objects.in_bulk([link[key] for link in links for key in ('portA', 'portB')])
+        by_backbone = {}
+        for link in links:
+            portA, portB = ports[link['portA']], ports[link['portB']]
+            by_backbone.setdefault(portA.backbone, []).append((portA, portB))
+
+        with ThreadPoolExecutor(max_workers=min(BACKBONE_WORKERS, len(by_backbone)),
+                                thread_name_prefix='backbone') as executor:
+            futures = {executor.submit(_connect_backbone, backbone, pairs, job.user.username): pairs
+                       for backbone, pairs in by_backbone.items()}
+            for future, pairs in futures.items():
+                try:
+                    outcomes.update(future.result())
+                except Exception as e:
+                    logger.error(f"Job {job.id}: error while connecting links {pairs}: {e}")
+                    for portA, portB in pairs:
+                        outcomes[(portA.id, portB.id)] = (False, f"Unexpected error: {e}")
+
+        job.result = []
+        for link in links:
+            connected, detail = outcomes[(link['portA'], link['portB'])]
+            job.result.append({"portA": link['portA'], "portB": link['portB'], "svlan": ports[link['portA']].svlan,
+                               "status": "connected" if connected else "failed", "detail": detail})
+    finally:
+        failed = [link for link in links if not outcomes.get((link['portA'], link['portB']), (False,))[0]]
+        _unassign_ports([link[key] for link in failed for key in ('portA', 'portB')])
+
+    connected = len(links) - len(failed)
+    logger.info(f"Job {job.id}: {connected}/{len(links)} links connected.")
+    return not failed, f"{connected}/{len(links)} links connected"
+
+
+def disconnect_ports(job: Job):
+    """
+    Deletes the link between the two ports of the job and verifies it is gone.
+
+    Returns:
+        tuple: (success, detail message)
+    """
+    portA = Port.objects.get(id=job.payload['portA'])
+    portB = Port.objects.get(id=job.payload['portB'])
+    original_svlan = portA.svlan
+
+    if not Port.delete_link(portA, portB, job.user.username):
+        logger.error(f"Failed to disconnect ports {portA.id} and {portB.id}.")
+        return False, "Ports failed to disconnect."
+
+    for attempt in range(VERIFY_RETRIES):
+        # Verify the link is actually deleted by checking for 0 configuration lines
+        if portA.verify_configuration(str(original_svlan), 0):
+            Port.objects.filter(id__in=[portA.id, portB.id]).update(svlan=None)
+            Change.record(Port, [portA.id, portB.id])
+            Svlan.release(original_svlan)
+            logger.info(f"Ports {portA.id} and {portB.id} disconnected successfully.")
+            return True, "Ports disconnected successfully."
+        logger.warning(f"Verification failed on attempt {attempt + 1}/{VERIFY_RETRIES}. Retrying...")
+        time.sleep(VERIFY_DELAY)
+    return False, "Ports failed to disconnect - Verification fail"
+
+
+def queue_banner(switch: Switch, user) -> Job:
+    """
+    Queues an update of the banner of a switch, unless one is already pending.
+
+    Args:
+        switch (Switch): Switch whose reservations changed.
+        user (User): User who made the change.
+
+    Returns:
+        Job: The pending banner job of the switch.
+    """
+    job = Job.objects.filter(kind='banner', status='PENDING', payload__switch=switch.id).first()
+    if job is None:
+        job = submit('banner', user, {'switch': switch.id})
+    return job
+
+
+def _banner_lock(switch_id: int) -> threading.Lock:
+    with _banner_locks_lock:
+        return _banner_locks.setdefault(switch_id, threading.Lock())
+
+
+def update_banner(job: Job):
+    """
+    Writes the current reservations of the job's switch into its banner.
+
+    Returns:
+        tuple: (success, detail message)
+
+    Raises:
+        RetryJob: If the switch couldn't be reached.
+    """
+    with _banner_lock(job.payload['switch']):
+        switch = Switch.objects.filter(id=job.payload['switch']).first()
+        if switch is None:
+            return True, "Switch no longer exists, banner skipped."
+        if not switch.changeBanner():
+            raise RetryJob(f"Failed to update the banner of switch {switch.mngt_IP}")
+        return True, "Banner updated."
+
+
+HANDLERS = {
+    'connect': connect_ports,
+    'connect_many': connect_links,
+    'disconnect': disconnect_ports,
+    'banner': update_banner,
+}
+
+
+def claim_jobs(limit: int) -> list:
+    """
+    Atomically marks up to `limit` pending jobs as running.
+    Rows locked by another worker are skipped, so several workers can share
+    the same queue. Jobs waiting for a retry are left until their run_after.
+
+    Returns:
+        list: Ids of the claimed jobs, oldest first.
+    """
+    with transaction.atomic():
+        job_ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status='PENDING')
+            .filter(Q(run_after__isnull=True) | Q(run_after__lte=timezone.now()))
+            .order_by('created_at')
+            .values_list('id', flat=True)[:limit]
+        )
+        if job_ids:
+            Job.objects.filter(id__in=job_ids).update(status='RUNNING', started_at=timezone.now())
+    return job_ids
+
+
+def recover_stale_jobs(timeout: float = JOB_TIMEOUT) -> list:
+    """
+    Handles the jobs left RUNNING for more than `timeout` seconds by a worker
+    that died (crash, docker stop). Banner jobs are queued again; link jobs
+    are failed, and the SVLANs of connect jobs are given back since the link
+    can't be trusted. The ports of a failed disconnect keep their link.
+
+    Returns:
+        list: Ids of the recovered jobs.
+    """
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    with transaction.atomic():
+        stale = list(Job.objects.select_for_update(skip_locked=True)
+                     .filter(status='RUNNING', started_at__lt=cutoff).order_by('id'))
+        for job in stale:
+            if job.kind == 'banner':
+                job.status, job.run_after = 'PENDING', None
+                job.detail = "Requeued: its worker stopped."
+            else:
+                job.status, job.finished_at = 'FAILED', timezone.now()
+                job.detail = f"Abandoned: its worker stopped or it ran for more than {timeout:.0f}s."
+                if job.kind in ('connect', 'connect_many'):
+                    _unassign_ports(job_ports(job.payload))
+            job.save(update_fields=['status', 'detail', 'run_after', 'finished_at'])
+            logger.warning(f"Job {job.id} ({job.kind}) was stuck in RUNNING: {job.detail}")
+    return [job.id for job in stale]
+
+
+def run_job(job_id: int):
+    """
+    Executes a claimed job and records its outcome.
+    Meant to run on a worker thread: it closes its own DB connection.
+    """
+    try:
+        job = Job.objects.select_related('user').get(id=job_id)
+        handler = HANDLERS.get(job.kind)
+        try:
+            if handler is None:
+                success, detail = False, f"Unknown job kind '{job.kind}'"
+            else:
+                success, detail = handler(job)
+        except RetryJob as e:
+            if job.attempts < JOB_RETRIES:
+                retry_job(job, str(e))
+                return
+            success, detail = False, f"{e} (gave up after {job.attempts + 1} attempts)"
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) crashed: {e}")
+            success, detail = False, f"Unexpected error: {e}"
+
+        job.status = 'SUCCEEDED' if success else 'FAILED'
+        job.detail = detail
+        job.finished_at = timezone.now()
+        # The job may have been recovered meanwhile (recover_stale_jobs): keep that outcome
+        updated = Job.objects.filter(id=job.id, status='RUNNING').update(
+            status=job.status, detail=detail, result=job.result, finished_at=job.finished_at
+        )
+        if not updated:
+            logger.warning(f"Job {job.id} ({job.kind}) finished after being recovered: {detail}")
+            return
+        logger.info(f"Job {job.id} ({job.kind}) {job.status}: {detail}")
+    finally:
+        connection.close()
+
+
+def retry_job(job: Job, detail: str):
+    """
+    Puts a failed job back in the queue after a backoff delay.
+    """
+    delay = min(RETRY_BASE_DELAY * 2 ** job.attempts, RETRY_MAX_DELAY)
+    job.attempts += 1
+    job.status = 'PENDING'
+    job.detail = detail
+    job.run_after = timezone.now() + timedelta(seconds=delay)
+    job.save(update_fields=['attempts', 'status', 'detail', 'run_after'])
+    logger.warning(f"Job {job.id} ({job.kind}) failed: {detail}. Retry {job.attempts}/{JOB_RETRIES} in {delay}s")
@@ -0,0 +1,153 @@
+import json
+import os
+import ssl
+import tempfile
+import threading
+import time
+import datetime
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from django.core.management.base import BaseCommand
+from api.models import cli
+from api.rest_sessions import SESSIONS, ACCEPT_HEADER
+
+logger = logging.getLogger(__name__)
+
+
+class StandInSwitchHandler(BaseHTTPRequestHandler):
+    """Minimal imitation of the AOS REST API (auth and cli domains)"""
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real switch
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        domain = query.get('domain', [''])[0]
+        headers = {}
+        if domain == 'auth':
+            body = {'result': {'diag': 200}}
+            headers['Set-Cookie'] = 'wv_sess=standin; Path=/'
+        elif domain == 'cli':
+            cmd = query.get('cmd', [''])[0]
+            body = {'result': {'output': f'{cmd}\n', 'diag': 200}}
+        else:
+            body = {'result': {'error': 'Unknown domain'}}
+
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Measures per-command latency of cli() against a local HTTPS stand-in switch (or a real device)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200,
+                            help='Number of commands per run (default: 200)')
+        parser.add_argument('--ip', type=str,
+                            help='Benchmark a real device instead of the local stand-in')
+        parser.add_argument('--cmd', type=str, default='show system',
+                            help='Command to execute (default: "show system")')
+
+    def handle(self, *args, **options):
+        count = options['count']
+        cmd = options['cmd']
+
+        server = None
+        if options['ip']:
+            target = options['ip']
+        else:
+            server = self.start_stand_in()
+            target = f'127.0.0.1:{server.server_address[1]}'
+            self.stdout.write(f'Stand-in switch listening on https://{target}')
+
+        try:
+            baseline = self.run_unpooled(target, cmd, count)
+            SESSIONS.close(target)
+            pooled = self.run_pooled(target, cmd, count)
+        finally:
+            SESSIONS.close(target)
+            if server:
+                server.shutdown()
+                server.server_close()
+
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(f'Results ({count} commands on {target}):')
+        self.stdout.write(f'  Fresh connection per command: {baseline * 1000 / count:.2f} ms/command')
+        self.stdout.write(f'  Pooled session:               {pooled * 1000 / count:.2f} ms/command')
+        if pooled > 0:
+            self.stdout.write(f'  Speedup: x{baseline / pooled:.1f}')
+        self.stdout.write('='*50)
+
+    def run_unpooled(self, target, cmd, count):
+        """Previous behaviour: one bare requests.get (new TCP+TLS) per command"""
+        headers = {'Accept': ACCEPT_HEADER}
+        response = requests.get(f'https://{target}?domain=auth&username=admin&password=switch',
+                                headers=headers, verify=False, timeout=5)
+        headers['Cookie'] = 'wv_sess=' + response.headers['Set-Cookie'].split(';')[0].split('=', 1)[1]
+
+        start = time.perf_counter()
+        for _ in range(count):
+            requests.get(f'https://{target}?domain=cli&cmd={cmd}', headers=headers, verify=False, timeout=5)
+        return time.perf_counter() - start
+
+    def run_pooled(self, target, cmd, count):
+        """Current behaviour: cli() through the keep-alive session of the device"""
+        cli(target, cmd)  # authenticate and open the connection outside the measure
+        start = time.perf_counter()
+        for _ in range(count):
+            cli(target, cmd)
+        return time.perf_counter() - start
+
+    def start_stand_in(self):
+        """Start an HTTPS stand-in switch on a random local port"""
+        cert_file, key_file = self.create_certificate()
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_file, key_file)
+        os.unlink(cert_file)
+        os.unlink(key_file)
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StandInSwitchHandler)
+        server.daemon_threads = True
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def create_certificate(self):
+        """Generate a throwaway self-signed certificate for the stand-in"""
+        from cryptography import x509
+        from cryptography.x509.oid import NameOID
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'standin-switch')])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (x509.CertificateBuilder()
+                .subject_name(name)
+                .issuer_name(name)
+                .public_key(key.public_key())
+                .serial_number(x509.random_serial_number())
+                .not_valid_before(now)
+                .not_valid_after(now + datetime.timedelta(days=1))
+                .sign(key, hashes.SHA256()))
+
+        with tempfile.NamedTemporaryFile('wb', suffix='.crt', delete=False) as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+            cert_file = f.name
+        with tempfile.NamedTemporaryFile('wb', suffix='.key', delete=False) as f:
+            f.write(key.private_bytes(serialization.Encoding.PEM,
+                                      serialization.PrivateFormat.TraditionalOpenSSL,
+                                      serialization.NoEncryption()))
+            key_file = f.name
+        return cert_file, key_file
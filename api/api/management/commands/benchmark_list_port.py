@@ -0,0 +1,89 @@
+import time
+import logging
+from django.core.management.base import BaseCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+from rest_framework.test import APIClient
+from api.models import Switch, Port
+
+logger = logging.getLogger(__name__)
+
+PORTS_PER_SWITCH = 48
+
+
+class Rollback(Exception):
+    """Raised to discard the benchmark rows"""
+
+
+class Command(BaseCommand):
+    help = 'Measures response size and latency of /list_port/ for growing inventories (rows are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000],
+                            help='Number of ports to benchmark with (default: 100 10000 100000)')
+        parser.add_argument('--runs', type=int, default=5,
+                            help='Requests per scenario, the median is reported (default: 5)')
+
+    def handle(self, *args, **options):
+        runs = options['runs']
+        results = []
+        for size in options['sizes']:
+            self.stdout.write(f'Benchmarking with {size} ports...')
+            try:
+                with transaction.atomic():
+                    client = self.setup_inventory(size)
+                    for label, url in self.scenarios():
+                        results.append((size, label) + self.measure(client, url, runs))
+                    raise Rollback()
+            except Rollback:
+                pass
+
+        self.stdout.write('\n' + '='*78)
+        self.stdout.write(f'{"Ports":>8}  {"Request":<38}{"Rows":>8}{"Size":>12}{"Median":>12}')
+        for size, label, rows, length, latency in results:
+            self.stdout.write(f'{size:>8}  {label:<38}{rows:>8}{length / 1024:>10.1f}KB{latency * 1000:>10.1f}ms')
+        self.stdout.write('='*78)
+
+    def scenarios(self):
+        return [
+            ('full list', '/api/list_port/'),
+            ('page of 100', '/api/list_port/?page_size=100'),
+            ('page of 100, fields=id,svlan,status', '/api/list_port/?page_size=100&fields=id,svlan,status'),
+            ('filter switch', f'/api/list_port/?switch={self.first_switch_id}'),
+            ('filter free=false', '/api/list_port/?free=false'),
+        ]
+
+    def setup_inventory(self, size):
+        """Creates `size` ports spread over switches of 48 ports, every 10th port linked"""
+        switch_count = -(-size // PORTS_PER_SWITCH)
+        switches = Switch.objects.bulk_create([
+            Switch(mngt_IP=f'192.0.{i // 256}.{i % 256}', model='OS6900-BENCH', console='none')
+            for i in range(switch_count)
+        ])
+        self.first_switch_id = switches[0].id
+        Port.objects.bulk_create([
+            Port(switch=switches[i // PORTS_PER_SWITCH],
+                 port_switch=f'1/1/{i % PORTS_PER_SWITCH + 1}',
+                 backbone='198.51.100.1',
+                 port_backbone=f'1/{i // PORTS_PER_SWITCH % 8 + 1}/{i % PORTS_PER_SWITCH + 1}',
+                 svlan=1001 + i // 2 if i % 10 < 2 else None,
+                 status='UP' if i % 10 < 2 else 'DOWN')
+            for i in range(size)
+        ], batch_size=5000)
+
+        user = User.objects.create_user(username='benchmark_list_port')
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user=user)
+        return client
+
+    def measure(self, client, url, runs):
+        """Returns (rows, response bytes, median latency in seconds)"""
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            self.stdout.write(self.style.ERROR(f'{url} answered {response.status_code}'))
+        rows = len(response.json().get('ports', []))
+        return rows, len(response.content), sorted(timings)[len(timings) // 2]
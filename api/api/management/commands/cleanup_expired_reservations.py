@@ -1,11 +1,38 @@
 import time
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from django.core.management.base import BaseCommand
+from django.db import connection
 from django.utils import timezone
-from api.models import Reservation
+from api.models import Reservation, Svlan, Change
+from api.expiry import ExpiryListener, next_expiry
+from api.jobs import queue_banner
+from api.reconcile import reconcile_ports
 
 logger = logging.getLogger(__name__)
 
+# Seconds added after an end_date so the reservation is strictly expired on wake-up
+EXPIRY_MARGIN = 0.1
+
+
+class CleanupRun:
+    """Metrics of one cleanup run, filled in by the worker threads"""
+
+    def __init__(self, number, switches):
+        self.number = number
+        self.started = time.monotonic()
+        self.pending = switches
+        self.switches = switches
+        self.reservations = 0
+        self.failures = 0
+        self.lock = threading.Lock()
+
+    def summary(self):
+        return (f'Cleanup run {self.number}: {self.reservations} reservation(s) on {self.switches} switch(es) '
+                f'in {time.monotonic() - self.started:.1f}s, {self.failures} failure(s)')
+
+
 class Command(BaseCommand):
     help = 'Cleans up expired reservations automatically'
 
@@ -14,69 +41,206 @@ class Command(BaseCommand):
             '--interval',
             type=int,
             default=300,  # 5 minutes
-            help='Interval in seconds between cleanup checks (default: 300)'
+            help='Longest sleep in seconds between two checks, and interval of the SVLAN/change log/port '
+                 'status maintenance (default: 300). Expiries are handled at their end_date regardless.'
         )
         parser.add_argument(
             '--once',
             action='store_true',
             help='Run cleanup once and exit (instead of continuous monitoring)'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Maximum number of switches cleaned at the same time (default: 8)'
+        )
 
     def handle(self, *args, **options):
         interval = options['interval']
         run_once = options['once']
-        
-        if run_once:
-            self.cleanup_expired_reservations()
-        else:
-            self.stdout.write(f'Starting continuous cleanup monitoring (interval: {interval}s)')
-            self.stdout.write('Press Ctrl+C to stop')
-            
-            try:
-                while True:
-                    self.cleanup_expired_reservations()
-                    time.sleep(interval)
-            except KeyboardInterrupt:
-                self.stdout.write('\nStopping cleanup monitoring...')
+
+        self.executor = ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='cleanup')
+        # Switches being cleaned: a switch is never handed to two workers
+        self.busy_switches = set()
+        self.busy_lock = threading.Lock()
+        self.run_count = 0
+
+        try:
+            if run_once:
+                wait(self.cleanup_expired_reservations())
+            else:
+                self.stdout.write(f'Starting continuous cleanup monitoring (interval: {interval}s, '
+                                  f'{options["workers"]} workers)')
+                self.stdout.write('Press Ctrl+C to stop')
+
+                listener = ExpiryListener()
+                last_maintenance = None
+                try:
+                    while True:
+                        self.cleanup_expired_reservations()
+                        if last_maintenance is None or time.monotonic() - last_maintenance >= interval:
+                            self.reclaim_svlans()
+                            self.prune_changes()
+                            self.reconcile_port_states()
+                            last_maintenance = time.monotonic()
+                        timeout = self.seconds_until_next_expiry(interval - (time.monotonic() - last_maintenance))
+                        if listener.wait(timeout):
+                            self.stdout.write('Reservations changed, rescheduling')
+                except KeyboardInterrupt:
+                    self.stdout.write('\nStopping cleanup monitoring, waiting for running cleanups...')
+                finally:
+                    listener.close()
+        finally:
+            self.executor.shutdown(wait=True)
 
     def cleanup_expired_reservations(self):
-        """Clean up expired reservations"""
+        """
+        Hands the switches with expired reservations to the worker pool.
+        Switches still being cleaned by a previous run are left for the next one.
+
+        Returns:
+            list: Futures of the submitted switches
+        """
         try:
             now = timezone.now()
             expired_reservations = Reservation.objects.filter(
                 end_date__lt=now
-            ).exclude(end_date__isnull=True)
-            
-            cleaned_count = 0
+            ).exclude(end_date__isnull=True).select_related('user', 'switch').order_by('end_date')
+
+            by_switch = {}
             for reservation in expired_reservations:
+                by_switch.setdefault(reservation.switch_id, []).append(reservation)
+
+            with self.busy_lock:
+                skipped = by_switch.keys() & self.busy_switches
+                for switch_id in skipped:
+                    del by_switch[switch_id]
+                self.busy_switches.update(by_switch)
+
+            if skipped:
+                self.stdout.write(f'{len(skipped)} switch(es) still being cleaned, skipped')
+            if not by_switch:
+                self.stdout.write('No expired reservations found')
+                return []
+
+            self.run_count += 1
+            run = CleanupRun(self.run_count, len(by_switch))
+            return [self.executor.submit(self.cleanup_switch, run, reservations)
+                    for reservations in by_switch.values()]
+
+        except Exception as e:
+            logger.error(f"Error during cleanup: {e}")
+            self.stdout.write(
+                self.style.ERROR(f'Error during cleanup: {e}')
+            )
+            return []
+
+    def seconds_until_next_expiry(self, limit):
+        """Time to sleep until the next end_date, at most `limit` seconds"""
+        try:
+            with self.busy_lock:
+                busy = set(self.busy_switches)
+            end_date = next_expiry(busy)
+        except Exception as e:
+            logger.error(f"Error while looking for the next expiry: {e}")
+            return limit
+        if end_date is None:
+            return limit
+        return min(limit, (end_date - timezone.now()).total_seconds() + EXPIRY_MARGIN)
+
+    def cleanup_switch(self, run, reservations):
+        """
+        Deletes the expired reservations of one switch, then cleans the switch
+        if nobody holds it anymore. Runs on a worker thread.
+        """
+        switch = reservations[0].switch
+        released = failed = 0
+        try:
+            for reservation in reservations:
                 self.stdout.write(
                     f'Found expired reservation: {reservation.user.username} '
-                    f'on switch {reservation.switch.mngt_IP} '
+                    f'on switch {switch.mngt_IP} '
                     f'(expired: {reservation.end_date})'
                 )
-                
                 if reservation.delete(reservation.user.username):
-                    cleaned_count += 1
+                    released += 1
                     self.stdout.write(
                         self.style.SUCCESS(
                             f'✓ Successfully cleaned up expired reservation for {reservation.user.username}'
                         )
                     )
                 else:
+                    failed += 1
                     self.stdout.write(
                         self.style.ERROR(
                             f'✗ Failed to cleanup expired reservation for {reservation.user.username}'
                         )
                     )
-            
-            if cleaned_count > 0:
-                logger.info(f"Cleaned up {cleaned_count} expired reservations")
-                self.stdout.write(f'Cleaned up {cleaned_count} expired reservations')
-            else:
-                self.stdout.write('No expired reservations found')
-                
+
+            if released:
+                queue_banner(switch, reservations[0].user)
+            if not failed and not Reservation.objects.filter(switch=switch).exists():
+                if not switch.cleanup():
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f'✗ Failed to clean up switch {switch.mngt_IP}'))
         except Exception as e:
-            logger.error(f"Error during cleanup: {e}")
+            failed += 1
+            logger.error(f"Error during cleanup of switch {switch.mngt_IP}: {e}")
+            self.stdout.write(self.style.ERROR(f'Error during cleanup of switch {switch.mngt_IP}: {e}'))
+        finally:
+            with self.busy_lock:
+                self.busy_switches.discard(switch.id)
+            self.record(run, released, failed)
+            connection.close()
+
+    def record(self, run, released, failed):
+        """Adds the outcome of one switch to its run, and reports the run once all its switches are done"""
+        with run.lock:
+            run.reservations += released
+            run.failures += failed
+            run.pending -= 1
+            finished = run.pending == 0
+        if finished:
+            logger.info(run.summary())
+            self.stdout.write(run.summary())
+
+    def reclaim_svlans(self):
+        """Free SVLANs left behind by failed links"""
+        try:
+            reclaimed = Svlan.reclaim_orphans()
+            if reclaimed:
+                self.stdout.write(f'Reclaimed {reclaimed} orphaned SVLAN(s)')
+        except Exception as e:
+            logger.error(f"Error while reclaiming SVLANs: {e}")
             self.stdout.write(
-                self.style.ERROR(f'Error during cleanup: {e}')
+                self.style.ERROR(f'Error while reclaiming SVLANs: {e}')
+            )
+
+    def reconcile_port_states(self):
+        """Sync the port statuses with the backbones"""
+        try:
+            results = reconcile_ports()
+            changed = sum(len(result.get('changed', [])) for result in results)
+            failed = [result['backbone'] for result in results if result['status'] != 'ok']
+            if changed:
+                self.stdout.write(f'Reconciled {changed} port status(es) with the backbones')
+            if failed:
+                self.stdout.write(self.style.ERROR(f'Could not reconcile backbone(s) {", ".join(failed)}'))
+        except Exception as e:
+            logger.error(f"Error while reconciling port statuses: {e}")
+            self.stdout.write(
+                self.style.ERROR(f'Error while reconciling port statuses: {e}')
+            )
+
+    def prune_changes(self):
+        """Drop old entries of the inventory change log"""
+        try:
+            pruned = Change.prune()
+            if pruned:
+                self.stdout.write(f'Pruned {pruned} change log entries')
+        except Exception as e:
+            logger.error(f"Error while pruning the change log: {e}")
+            self.stdout.write(
+                self.style.ERROR(f'Error while pruning the change log: {e}')
             )
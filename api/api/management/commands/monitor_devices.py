@@ -0,0 +1,82 @@
+import time
+import asyncio
+import logging
+from django.core.management.base import BaseCommand
+from api.health import monitored_hosts, sweep, store, PROBE_TIMEOUT, PROBE_CONCURRENCY, PROBE_PORT
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Probes the reachability of every switch and backbone and stores it for list_switch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds between the start of two sweeps (default: 60)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run one sweep and exit (instead of continuous monitoring)'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=float,
+            default=PROBE_TIMEOUT,
+            help=f'Seconds before a probe gives up (default: {PROBE_TIMEOUT})'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=PROBE_CONCURRENCY,
+            help=f'Maximum number of probes running at the same time (default: {PROBE_CONCURRENCY})'
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=PROBE_PORT,
+            help=f'TCP port probed on every device (default: {PROBE_PORT})'
+        )
+        parser.add_argument(
+            '--banner',
+            action='store_true',
+            help='Also wait for the SSH banner instead of only the TCP connect'
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            self.run_sweep(options)
+            return
+
+        interval = options['interval']
+        self.stdout.write(f'Starting reachability monitoring (interval: {interval}s)')
+        self.stdout.write('Press Ctrl+C to stop')
+        try:
+            while True:
+                started = time.monotonic()
+                self.run_sweep(options)
+                time.sleep(max(interval - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            self.stdout.write('\nStopping reachability monitoring')
+
+    def run_sweep(self, options):
+        """Probes every host once and stores the results"""
+        try:
+            started = time.monotonic()
+            hosts = monitored_hosts()
+            results = asyncio.run(sweep(hosts, port=options['port'], timeout=options['timeout'],
+                                        banner=options['banner'], concurrency=options['concurrency']))
+            changed = store(results)
+            down = [result['host'] for result in results if not result['reachable']]
+            summary = (f'Probed {len(hosts)} host(s) in {time.monotonic() - started:.1f}s: '
+                       f'{len(hosts) - len(down)} reachable, {len(down)} unreachable, {len(changed)} changed')
+            logger.info(summary)
+            self.stdout.write(summary)
+            for host in changed:
+                self.stdout.write(self.style.SUCCESS(f'✓ {host} is reachable') if host not in down
+                                  else self.style.ERROR(f'✗ {host} is unreachable'))
+        except Exception as e:
+            logger.error(f"Error during reachability sweep: {e}")
+            self.stdout.write(self.style.ERROR(f'Error during reachability sweep: {e}'))
@@ -1,12 +1,18 @@
 import logging
 import re
-import paramiko
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.core.management.base import BaseCommand, CommandError
-from api.models import Switch, Port
+from django.db.models import Count
+from api.models import Switch, Port, Change
+from api.interfaces import parse_admin_states, diff_states, state_commands
+from api.ssh_pool import SSH_POOL
 
 logger = logging.getLogger(__name__)
 
+# Every port of a backbone: NI 1 to 8, ports 1 to 48
+BACKBONE_PORTS = [f'1/{ni}/{port}' for ni in range(1, 9) for port in range(1, 49)]
+
 class Command(BaseCommand):
     help = 'Discover switch-to-backbone connections using LLDP and populate port database'
 
@@ -17,6 +23,12 @@ class Command(BaseCommand):
                           help='SSH username (default: admin)')
         parser.add_argument('--password', type=str, default='switch',
                           help='SSH password (default: switch)')
+        parser.add_argument('--discovery-timeout', type=int, default=60,
+                          help='Maximum time in seconds to wait for LLDP to converge (default: 60)')
+        parser.add_argument('--poll-interval', type=float, default=2,
+                          help='Seconds between two LLDP polls of a switch (default: 2)')
+        parser.add_argument('--concurrency', type=int, default=16,
+                          help='Number of switches polled in parallel (default: 16)')
 
     def handle(self, *args, **options):
         backbone_ips = [ip.strip() for ip in options['backbone_ips'].split(',')]
@@ -42,21 +54,11 @@ class Command(BaseCommand):
                 else:
                     self.stdout.write(f'WARNING: Could not get system name for {backbone_ip}')
             
-            # Step 2: Discover connections from each switch
-            connections_found = 0
-            for switch in switches:
-                switch_ip = switch.mngt_IP
-                self.stdout.write(f'\nProcessing switch {switch_ip}...')
-                
-                lldp_data = self.get_lldp_data(switch_ip, username, password)
-                if not lldp_data:
-                    continue
-                
-                connections = self.parse_connections(lldp_data, backbone_info)
-                for conn in connections:
-                    self.create_port_entry(switch, conn)
-                    connections_found += 1
-                    self.stdout.write(f'  {conn["switch_port"]} ↔ {conn["backbone_ip"]}:{conn["backbone_port"]}')
+            # Step 2: Discover connections from all switches until LLDP converges
+            connections_found = self.discover_connections(
+                list(switches), backbone_info, username, password,
+                options['discovery_timeout'], options['poll_interval'], options['concurrency']
+            )
             
             # Step 3: Restore backbone ports to database states
             for backbone_ip in backbone_ips:
@@ -74,19 +76,13 @@ class Command(BaseCommand):
                     pass
 
     def ssh_connect(self, ip, username, password):
-        """Create SSH connection"""
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(ip, username=username, password=password, timeout=10)
-        return ssh
+        """Borrow a pooled SSH connection (use as a context manager)"""
+        return SSH_POOL.connection(ip, username, password, timeout=10)
 
     def ssh_command(self, ip, username, password, command):
         """Execute SSH command and return output"""
-        ssh = self.ssh_connect(ip, username, password)
-        stdin, stdout, stderr = ssh.exec_command(command)
-        output = stdout.read().decode('utf-8')
-        ssh.close()
-        return output
+        with self.ssh_connect(ip, username, password) as ssh:
+            return self.exec_on(ssh, command)
 
     def get_system_name(self, backbone_ip, username, password):
         """Get backbone system name"""
@@ -102,39 +98,86 @@ class Command(BaseCommand):
         """Enable LLDP and all ports on backbone for discovery"""
         try:
             self.stdout.write(f'  Enabling LLDP and ports on {backbone_ip}...')
-            ssh = self.ssh_connect(backbone_ip, username, password)
-            
-            # Enable LLDP and wait for completion
-            stdin, stdout, stderr = ssh.exec_command('lldp nearest-bridge chassis lldpdu tx-and-rx')
-            stdout.channel.recv_exit_status()  # Wait for command to complete
-            self.stdout.write(f'    LLDP enabled')
-            
-            # Enable all ports (1/1/1 to 1/8/48) and wait for each
-            enabled_count = 0
-            for ni in range(1, 9):
-                for port in range(1, 49):
-                    stdin, stdout, stderr = ssh.exec_command(f'interfaces 1/{ni}/{port} admin-state enable')
-                    exit_status = stdout.channel.recv_exit_status()  # Wait for each command
-                    if exit_status == 0:
-                        enabled_count += 1
-            
-            self.stdout.write(f'    Enabled {enabled_count} backbone ports')
-            ssh.close()
-            
-            # Wait longer for LLDP discovery to propagate
-            self.stdout.write(f'    Waiting 15 seconds for LLDP discovery...')
-            time.sleep(15)
+            with self.ssh_connect(backbone_ip, username, password) as ssh:
+                # Enable LLDP and wait for completion
+                stdin, stdout, stderr = ssh.exec_command('lldp nearest-bridge chassis lldpdu tx-and-rx')
+                stdout.channel.recv_exit_status()  # Wait for command to complete
+                self.stdout.write(f'    LLDP enabled')
+
+                # Enable all ports (1/1/1 to 1/8/48) that are not already enabled
+                self.push_port_states(ssh, {port: 'UP' for port in BACKBONE_PORTS})
             
         except Exception as e:
             logger.warning(f"Failed to enable discovery on {backbone_ip}: {e}")
             self.stdout.write(f'    ERROR: {e}')
 
-    def get_lldp_data(self, switch_ip, username, password):
-        """Get LLDP data from switch"""
+    def discover_connections(self, switches, backbone_info, username, password,
+                             timeout, poll_interval, concurrency):
+        """Poll LLDP on all switches in parallel until the neighbor counts stop changing"""
+        self.stdout.write(f'\nDiscovering LLDP neighbors on {len(switches)} switches '
+                          f'(timeout {timeout}s, concurrency {concurrency})...')
+
+        # Neighbors already known in the database, used as convergence target
+        expected = dict(
+            Port.objects.filter(switch__in=switches).values('switch')
+            .annotate(count=Count('id')).values_list('switch', 'count')
+        )
+        found = {}
+        pending = list(switches)
+        deadline = time.monotonic() + timeout
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            while pending:
+                futures = {
+                    executor.submit(self.poll_lldp, switch, username, password, backbone_info): switch
+                    for switch in pending
+                }
+                changed = {}
+                still_pending = []
+                for future in as_completed(futures):
+                    switch = futures[future]
+                    connections = future.result()
+                    if connections is None:
+                        # Unreachable switch: don't keep polling it
+                        continue
+                    previous = found.get(switch.id)
+                    found[switch.id] = connections
+                    if connections != previous:
+                        changed[switch] = connections
+                    target = expected.get(switch.id, 0)
+                    converged = connections and (
+                        (target and len(connections) >= target) or connections == previous
+                    )
+                    if not converged:
+                        still_pending.append(switch)
+
+                # Merge what this round brought
+                if changed:
+                    self.create_port_entries(changed)
+
+                pending = still_pending
+                if pending:
+                    if time.monotonic() + poll_interval >= deadline:
+                        self.stdout.write(self.style.WARNING(
+                            f'  LLDP did not converge on {len(pending)} switch(es) within {timeout}s: '
+                            + ', '.join(switch.mngt_IP for switch in pending)
+                        ))
+                        break
+                    time.sleep(poll_interval)
+
+        total = sum(len(connections) for connections in found.values())
+        self.stdout.write(f'  LLDP discovery finished in {time.monotonic() - start:.1f}s')
+        return total
+
+    def poll_lldp(self, switch, username, password, backbone_info):
+        """Get the backbone connections of a switch (the pooled SSH connection stays open between polls)"""
         try:
-            return self.ssh_command(switch_ip, username, password, 'show lldp remote-system')
+            lldp_data = self.ssh_command(switch.mngt_IP, username, password, 'show lldp remote-system')
+            return self.parse_connections(lldp_data, backbone_info)
         except Exception as e:
-            logger.warning(f"Failed to get LLDP from {switch_ip}: {e}")
+            logger.warning(f"Failed to get LLDP from {switch.mngt_IP}: {e}")
+            self.stdout.write(f'  WARNING: Failed to get LLDP from {switch.mngt_IP}: {e}')
             return None
 
     def parse_connections(self, lldp_data, backbone_info):
@@ -179,57 +222,88 @@ class Command(BaseCommand):
         
         return connections
 
-    def create_port_entry(self, switch, connection):
-        """Create or update port entry in database"""
+    def create_port_entries(self, connections_by_switch):
+        """Create or update the port entries of several switches with bulk queries"""
         try:
-            port, created = Port.objects.get_or_create(
-                switch=switch,
-                port_switch=connection['switch_port'],
-                defaults={
-                    'backbone': connection['backbone_ip'],
-                    'port_backbone': connection['backbone_port'],
-                    'status': 'DOWN'
-                }
-            )
-            if not created and (port.backbone != connection['backbone_ip'] or 
-                              port.port_backbone != connection['backbone_port']):
-                # Update if connection changed
-                port.backbone = connection['backbone_ip']
-                port.port_backbone = connection['backbone_port']
-                port.save()
+            existing = {
+                (port.switch_id, port.port_switch): port
+                for port in Port.objects.filter(switch__in=list(connections_by_switch))
+            }
+            new_ports = []
+            updated_ports = []
+            for switch, connections in connections_by_switch.items():
+                for conn in connections:
+                    key = (switch.id, conn['switch_port'])
+                    port = existing.get(key)
+                    if port is None:
+                        port = Port(
+                            switch=switch,
+                            port_switch=conn['switch_port'],
+                            backbone=conn['backbone_ip'],
+                            port_backbone=conn['backbone_port'],
+                            status='DOWN'
+                        )
+                        existing[key] = port
+                        new_ports.append(port)
+                    elif port.backbone != conn['backbone_ip'] or port.port_backbone != conn['backbone_port']:
+                        # Update if connection changed
+                        port.backbone = conn['backbone_ip']
+                        port.port_backbone = conn['backbone_port']
+                        updated_ports.append(port)
+                    else:
+                        continue
+                    self.stdout.write(f'  {switch.mngt_IP} {conn["switch_port"]} ↔ '
+                                      f'{conn["backbone_ip"]}:{conn["backbone_port"]}')
+
+            Port.objects.bulk_create(new_ports)
+            Port.objects.bulk_update(updated_ports, ['backbone', 'port_backbone'])
+            Change.record(Port, [port.pk for port in new_ports + updated_ports if port.pk])
         except Exception as e:
-            logger.warning(f"Failed to create port entry: {e}")
+            logger.warning(f"Failed to create port entries: {e}")
 
     def restore_backbone_ports(self, backbone_ip, username, password):
         """Restore backbone ports to database states"""
         try:
             self.stdout.write(f'  Restoring backbone ports on {backbone_ip}...')
-            ssh = self.ssh_connect(backbone_ip, username, password)
-            
-            # Disable LLDP and wait for completion
-            stdin, stdout, stderr = ssh.exec_command('lldp nearest-bridge chassis lldpdu disable')
-            stdout.channel.recv_exit_status()
-            self.stdout.write(f'    LLDP disabled')
-            
-            # Get database states
-            db_ports = {}
-            for port in Port.objects.filter(backbone=backbone_ip):
-                db_ports[port.port_backbone] = port.status
-            
-            # Restore all ports individually and wait for each command
-            restored_count = 0
-            for ni in range(1, 9):  # NI 1 to 8
-                for port in range(1, 49):  # Ports 1 to 48
-                    interface = f'1/{ni}/{port}'
-                    state = 'enable' if db_ports.get(interface) == 'UP' else 'disable'
-                    stdin, stdout, stderr = ssh.exec_command(f'interfaces {interface} admin-state {state}')
-                    exit_status = stdout.channel.recv_exit_status()
-                    if exit_status == 0:
-                        restored_count += 1
-            
-            self.stdout.write(f'    Restored {restored_count} backbone ports to database states')
-            ssh.close()
+            with self.ssh_connect(backbone_ip, username, password) as ssh:
+                # Disable LLDP and wait for completion
+                stdin, stdout, stderr = ssh.exec_command('lldp nearest-bridge chassis lldpdu disable')
+                stdout.channel.recv_exit_status()
+                self.stdout.write(f'    LLDP disabled')
+
+                # Get database states
+                db_ports = {}
+                for port in Port.objects.filter(backbone=backbone_ip):
+                    db_ports[port.port_backbone] = port.status
+
+                # Restore only the ports whose state differs from the database
+                desired = {port: 'UP' if db_ports.get(port) == 'UP' else 'DOWN' for port in BACKBONE_PORTS}
+                self.push_port_states(ssh, desired)
             
         except Exception as e:
             logger.warning(f"Failed to restore ports on {backbone_ip}: {e}")
             self.stdout.write(f'    ERROR: {e}')
+
+    def push_port_states(self, ssh, desired):
+        """Push port admin states as range commands, skipping ports already in the desired state"""
+        current = parse_admin_states(self.exec_on(ssh, 'show interfaces status'))
+        changes = diff_states(desired, current)
+        commands = state_commands(changes)
+
+        failed_commands = 0
+        for command in commands:
+            stdin, stdout, stderr = ssh.exec_command(command)
+            if stdout.channel.recv_exit_status() != 0:
+                failed_commands += 1
+                logger.warning(f"Command '{command}' failed: {stderr.read().decode('utf-8').strip()}")
+
+        # One command per port before, now the state read plus the range commands
+        changed = sum(len(ports) for ports in changes.values())
+        self.stdout.write(f'    {changed}/{len(desired)} ports changed, {len(desired) - changed} left unchanged: '
+                          f'{len(commands) + 1} command(s) sent instead of {len(desired)} ({failed_commands} failed)')
+        return failed_commands == 0
+
+    def exec_on(self, ssh, command):
+        """Execute a command on an open SSH connection and return its output"""
+        stdin, stdout, stderr = ssh.exec_command(command)
+        return stdout.read().decode('utf-8')
@@ -1,11 +1,17 @@
 import logging
 import re
+import time
 import paramiko
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from django.core.management.base import BaseCommand, CommandError
-from api.models import Switch
+from api.models import Switch, Change
+from api.ssh_pool import SSH_POOL
 
 logger = logging.getLogger(__name__)
 
+# Switch fields filled from the 'show chassis' output
+SWITCH_FIELDS = ['model', 'console', 'part_number', 'hardware_revision', 'serial_number']
+
 class Command(BaseCommand):
     help = 'Populates the switch database by connecting to switches via SSH and extracting hardware info'
 
@@ -37,6 +43,18 @@ class Command(BaseCommand):
             default='switch',
             help='SSH password (default: switch)'
         )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Number of switches processed in parallel (default: 1)'
+        )
+        parser.add_argument(
+            '--timeout',
+            type=int,
+            default=10,
+            help='Per-host SSH timeout in seconds (default: 10)'
+        )
 
     def handle(self, *args, **options):
         ips = []
@@ -60,26 +78,74 @@ class Command(BaseCommand):
         username = options['username']
         password = options['password']
         update_existing = options['update']
+        concurrency = max(1, options['concurrency'])
+        timeout = options['timeout']
+
+        # Drop duplicates while keeping the file order
+        ips = list(dict.fromkeys(ips))
 
-        self.stdout.write(f'Processing {len(ips)} switch(es)...')
+        self.stdout.write(f'Processing {len(ips)} switch(es) with concurrency {concurrency}...')
         
         successful = 0
         failed = 0
         skipped = 0
+        timings = []
 
+        # Load every known switch with a single query
+        existing_switches = {switch.mngt_IP: switch for switch in Switch.objects.filter(mngt_IP__in=ips)}
+        to_process = []
         for ip in ips:
-            try:
-                result = self.process_switch(ip, username, password, update_existing)
-                if result == 'success':
-                    successful += 1
-                elif result == 'skipped':
-                    skipped += 1
-            except Exception as e:
-                failed += 1
+            if ip in existing_switches and not update_existing:
+                skipped += 1
                 self.stdout.write(
-                    self.style.ERROR(f'✗ Failed to process {ip}: {e}')
+                    self.style.WARNING(f'⚠ Switch {ip} already exists. Use --update to update existing switches.')
                 )
-                logger.error(f"Failed to process switch {ip}: {e}")
+            else:
+                to_process.append(ip)
+
+        new_switches = []
+        updated_switches = []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = {
+                executor.submit(self.timed_process_switch, ip, username, password, timeout): ip
+                for ip in to_process
+            }
+            for future in as_completed(futures):
+                ip = futures[future]
+                parsed_info, error, elapsed = future.result()
+                if error:
+                    failed += 1
+                    timings.append((ip, 'failed', elapsed))
+                    self.stdout.write(
+                        self.style.ERROR(f'✗ Failed to process {ip}: {error}')
+                    )
+                    logger.error(f"Failed to process switch {ip}: {error}")
+                    continue
+
+                successful += 1
+                timings.append((ip, 'success', elapsed))
+                existing_switch = existing_switches.get(ip)
+                if existing_switch:
+                    for field in SWITCH_FIELDS:
+                        setattr(existing_switch, field, parsed_info[field])
+                    updated_switches.append(existing_switch)
+                    self.stdout.write(
+                        self.style.SUCCESS(f'✓ Updated switch {ip} ({parsed_info["model"]}) in {elapsed:.1f}s')
+                    )
+                    logger.info(f"Updated switch {ip} with model {parsed_info['model']}")
+                else:
+                    new_switches.append(Switch(mngt_IP=ip, **{field: parsed_info[field] for field in SWITCH_FIELDS}))
+                    self.stdout.write(
+                        self.style.SUCCESS(f'✓ Created switch {ip} ({parsed_info["model"]}) in {elapsed:.1f}s')
+                    )
+                    logger.info(f"Created switch {ip} with model {parsed_info['model']}")
+
+        # Write all results at once
+        if new_switches:
+            Switch.objects.bulk_create(new_switches)
+        if updated_switches:
+            Switch.objects.bulk_update(updated_switches, SWITCH_FIELDS)
+        Change.record(Switch, [switch.pk for switch in new_switches + updated_switches if switch.pk])
 
         # Summary
         self.stdout.write('\n' + '='*50)
@@ -87,22 +153,26 @@ class Command(BaseCommand):
         self.stdout.write(f'  Successfully processed: {successful}')
         self.stdout.write(f'  Skipped (already exist): {skipped}')
         self.stdout.write(f'  Failed: {failed}')
+        if timings:
+            self.stdout.write(f'  Per-host timing (slowest first):')
+            for ip, result, elapsed in sorted(timings, key=lambda timing: timing[2], reverse=True):
+                self.stdout.write(f'    {ip:<20} {result:<8} {elapsed:6.2f}s')
         self.stdout.write('='*50)
 
-    def process_switch(self, ip, username, password, update_existing):
-        """Process a single switch"""
-        self.stdout.write(f'\nProcessing switch: {ip}')
-        
-        # Check if switch already exists
-        existing_switch = Switch.objects.filter(mngt_IP=ip).first()
-        if existing_switch and not update_existing:
-            self.stdout.write(
-                self.style.WARNING(f'⚠ Switch {ip} already exists. Use --update to update existing switches.')
-            )
-            return 'skipped'
+    def timed_process_switch(self, ip, username, password, timeout):
+        """Run process_switch and measure it; never raises so the pool keeps going"""
+        start = time.monotonic()
+        try:
+            return self.process_switch(ip, username, password, timeout), None, time.monotonic() - start
+        except Exception as e:
+            return None, e, time.monotonic() - start
+
+    def process_switch(self, ip, username, password, timeout):
+        """Retrieve and parse the hardware info of a single switch (no DB access)"""
+        self.stdout.write(f'Processing switch: {ip}')
 
         # Connect via SSH and get chassis info
-        chassis_info = self.get_chassis_info(ip, username, password)
+        chassis_info = self.get_chassis_info(ip, username, password, timeout)
         
         if not chassis_info:
             raise Exception("Failed to retrieve chassis information")
@@ -113,62 +183,26 @@ class Command(BaseCommand):
         if not parsed_info:
             raise Exception("Failed to parse chassis information")
 
-        # Create or update the switch
-        if existing_switch:
-            # Update existing switch
-            existing_switch.model = parsed_info['model']
-            existing_switch.console = parsed_info['console']
-            existing_switch.part_number = parsed_info['part_number']
-            existing_switch.hardware_revision = parsed_info['hardware_revision']
-            existing_switch.serial_number = parsed_info['serial_number']
-            existing_switch.save()
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'✓ Updated switch {ip} ({parsed_info["model"]})')
-            )
-            logger.info(f"Updated switch {ip} with model {parsed_info['model']}")
-        else:
-            # Create new switch
-            switch = Switch.objects.create(
-                mngt_IP=ip,
-                model=parsed_info['model'],
-                console=parsed_info['console'],
-                part_number=parsed_info['part_number'],
-                hardware_revision=parsed_info['hardware_revision'],
-                serial_number=parsed_info['serial_number']
-            )
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'✓ Created switch {ip} ({parsed_info["model"]})')
-            )
-            logger.info(f"Created switch {ip} with model {parsed_info['model']}")
-
-        return 'success'
+        return parsed_info
 
-    def get_chassis_info(self, ip, username, password):
+    def get_chassis_info(self, ip, username, password, timeout=10):
         """Connect to switch via SSH and execute 'show chassis' command"""
         try:
-            ssh = paramiko.SSHClient()
-            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-            
             self.stdout.write(f'  Connecting to {ip}...')
-            ssh.connect(ip, username=username, password=password, timeout=10)
-            
-            self.stdout.write(f'  Executing "show chassis" command...')
-            stdin, stdout, stderr = ssh.exec_command('show chassis')
-            
-            output = stdout.read().decode('utf-8')
-            error = stderr.read().decode('utf-8')
-            
-            ssh.close()
-            
+            with SSH_POOL.connection(ip, username, password, timeout=timeout) as ssh:
+                self.stdout.write(f'  Executing "show chassis" command on {ip}...')
+                stdin, stdout, stderr = ssh.exec_command('show chassis', timeout=timeout)
+
+                output = stdout.read().decode('utf-8')
+                error = stderr.read().decode('utf-8')
+
             if error:
                 logger.warning(f"SSH command stderr for {ip}: {error}")
             
             if not output:
                 raise Exception("No output received from 'show chassis' command")
                 
-            self.stdout.write(f'  Successfully retrieved chassis information')
+            self.stdout.write(f'  Successfully retrieved chassis information from {ip}')
             return output
             
         except paramiko.AuthenticationException:
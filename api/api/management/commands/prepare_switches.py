@@ -1,8 +1,8 @@
 import logging
 import time
-import paramiko
 from django.core.management.base import BaseCommand, CommandError
 from api.models import Switch
+from api.ssh_pool import SSH_POOL
 
 logger = logging.getLogger(__name__)
 
@@ -109,44 +109,38 @@ class Command(BaseCommand):
         # Get switch model for configuration
         switch_model = self.get_switch_model(ip)
         
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        
         try:
             self.stdout.write(f'  Connecting to {ip}...')
-            ssh.connect(ip, username=username, password=password, timeout=10)
-            
-            # Step 1: Cleanup old files
-            if not skip_cleanup:
-                self.stdout.write(f'  Performing cleanup...')
-                self.cleanup_files(ssh, ip)
-            
-            # Step 2: Create init folder and copy files
-            if not skip_init:
-                self.stdout.write(f'  Setting up init folder...')
-                self.setup_init_folder(ssh, ip)
-            
-            # Step 3: Create configuration file
-            if not skip_config:
-                self.stdout.write(f'  Creating configuration...')
-                self.create_config(ssh, ip, switch_model)
-            
-            # Step 4: Apply configuration and reload if requested
-            if reload_switch:
-                self.stdout.write(f'  Applying configuration and reloading...')
-                self.apply_config_and_reload(ssh, ip)
-            else:
-                self.stdout.write(f'  ⚠ Configuration created but not applied. Use --reload to activate LLDP configuration.')
-            
-            self.stdout.write(
-                self.style.SUCCESS(f'✓ Successfully prepared switch {ip}')
-            )
-            logger.info(f"Successfully prepared switch {ip}")
-            
+            with SSH_POOL.connection(ip, username, password, timeout=10) as ssh:
+                # Step 1: Cleanup old files
+                if not skip_cleanup:
+                    self.stdout.write(f'  Performing cleanup...')
+                    self.cleanup_files(ssh, ip)
+
+                # Step 2: Create init folder and copy files
+                if not skip_init:
+                    self.stdout.write(f'  Setting up init folder...')
+                    self.setup_init_folder(ssh, ip)
+
+                # Step 3: Create configuration file
+                if not skip_config:
+                    self.stdout.write(f'  Creating configuration...')
+                    self.create_config(ssh, ip, switch_model)
+
+                # Step 4: Apply configuration and reload if requested
+                if reload_switch:
+                    self.stdout.write(f'  Applying configuration and reloading...')
+                    self.apply_config_and_reload(ssh, ip)
+                else:
+                    self.stdout.write(f'  ⚠ Configuration created but not applied. Use --reload to activate LLDP configuration.')
+
+                self.stdout.write(
+                    self.style.SUCCESS(f'✓ Successfully prepared switch {ip}')
+                )
+                logger.info(f"Successfully prepared switch {ip}")
+
         except Exception as e:
             raise Exception(f"Error preparing switch {ip}: {e}")
-        finally:
-            ssh.close()
 
     def get_switch_model(self, ip):
         """Get switch model from database or detect it"""
@@ -333,13 +327,12 @@ command-log enable
         
         try:
             # Use SFTP to create the configuration file
-            with ssh.open_sftp() as sftp:
-                self.stdout.write(f'    Creating vcboot.cfg with model: {switch_model}')
-                with sftp.file('init/vcboot.cfg', 'w') as config_file:
-                    config_file.write(config_content)
-                
-                self.stdout.write(f'    Configuration file created successfully')
-                
+            self.stdout.write(f'    Creating vcboot.cfg with model: {switch_model}')
+            with ssh.sftp().file('init/vcboot.cfg', 'w') as config_file:
+                config_file.write(config_content)
+
+            self.stdout.write(f'    Configuration file created successfully')
+
         except Exception as e:
             logger.error(f"Failed to create configuration file on {ip}: {e}")
             raise Exception(f"Failed to create configuration file: {e}")
@@ -427,6 +420,7 @@ command-log enable
             time.sleep(1)  # Wait for the prompt
             stdin.write('y\n')
             stdin.flush()
+            ssh.discard()  # the switch is going down
             
             self.stdout.write(f'    ✓ Working and certified directories populated')
             self.stdout.write(f'    ✓ Configuration applied and reload initiated')
@@ -0,0 +1,79 @@
+import time
+import signal
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from api.jobs import claim_jobs, run_job, recover_stale_jobs, JOB_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Runs queued connect/disconnect/banner jobs on a pool of worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Maximum number of jobs running at the same time (default: 8)'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=0.5,
+            help='Seconds between two checks of the job queue (default: 0.5)'
+        )
+        parser.add_argument(
+            '--job-timeout',
+            type=int,
+            default=JOB_TIMEOUT,
+            help=f'Seconds after which a running job is considered abandoned by its worker (default: {JOB_TIMEOUT})'
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        poll_interval = options['poll_interval']
+        job_timeout = options['job_timeout']
+
+        self.stdout.write(f'Starting job worker ({workers} threads, polling every {poll_interval}s)')
+        self.stdout.write('Press Ctrl+C to stop')
+
+        # docker stop sends SIGTERM: stop claiming and let the running jobs finish
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        running = set()
+        try:
+            while not self.stopping:
+                self.recover(job_timeout)
+                running = {future for future in running if not future.done()}
+                free_slots = workers - len(running)
+                if free_slots > 0:
+                    try:
+                        for job_id in claim_jobs(free_slots):
+                            self.stdout.write(f'Running job {job_id}')
+                            running.add(executor.submit(run_job, job_id))
+                    except Exception as e:
+                        logger.error(f"Error while claiming jobs: {e}")
+                        self.stdout.write(self.style.ERROR(f'Error while claiming jobs: {e}'))
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            self.stdout.write('\nStopping job worker, waiting for running jobs...')
+        finally:
+            executor.shutdown(wait=True)
+
+    def stop(self, signum, frame):
+        """SIGTERM handler"""
+        self.stdout.write('Received SIGTERM, waiting for running jobs...')
+        self.stopping = True
+
+    def recover(self, job_timeout):
+        """Requeues or fails the jobs abandoned by a dead worker"""
+        try:
+            recovered = recover_stale_jobs(job_timeout)
+            if recovered:
+                self.stdout.write(self.style.WARNING(f'Recovered {len(recovered)} stuck job(s): {recovered}'))
+        except Exception as e:
+            logger.error(f"Error while recovering stuck jobs: {e}")
+            self.stdout.write(self.style.ERROR(f'Error while recovering stuck jobs: {e}'))
@@ -0,0 +1,27 @@
+import logging
+from django.core.management.base import BaseCommand
+from api.models import Svlan
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Initializes the SVLAN pool and frees SVLANs orphaned by failed links'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace',
+            type=int,
+            default=300,
+            help='Age in seconds after which an allocated but unused SVLAN is reclaimed (default: 300)'
+        )
+
+    def handle(self, *args, **options):
+        free = Svlan.sync_pool()
+        pool = Svlan.pool_range()
+        self.stdout.write(f'SVLAN pool {pool.start}-{pool.stop - 1}: {free} free')
+
+        reclaimed = Svlan.reclaim_orphans(options['grace'])
+        if reclaimed:
+            self.stdout.write(self.style.SUCCESS(f'✓ Reclaimed {reclaimed} orphaned SVLAN(s)'))
+        else:
+            self.stdout.write('No orphaned SVLAN found')
@@ -0,0 +1,57 @@
+import time
+import logging
+from django.core.management.base import BaseCommand
+from api.reconcile import reconcile_ports
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Syncs Port.status with the interface states reported by the backbones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backbone',
+            action='append',
+            dest='backbones',
+            help='Backbone IP to reconcile, can be repeated (default: every backbone)'
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Seconds between two runs; 0 runs once and exits (default: 0)'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        if not interval:
+            self.run(options['backbones'])
+            return
+
+        self.stdout.write(f'Starting port reconciliation (interval: {interval}s)')
+        self.stdout.write('Press Ctrl+C to stop')
+        try:
+            while True:
+                started = time.monotonic()
+                self.run(options['backbones'])
+                time.sleep(max(interval - (time.monotonic() - started), 0))
+        except KeyboardInterrupt:
+            self.stdout.write('\nStopping port reconciliation')
+
+    def run(self, backbones):
+        """Reconciles the backbones once and reports each of them"""
+        started = time.monotonic()
+        results = reconcile_ports(backbones)
+        for result in results:
+            if result['status'] == 'ok':
+                self.stdout.write(self.style.SUCCESS(
+                    f"✓ {result['backbone']}: {len(result['changed'])}/{result['ports']} port(s) updated"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"✗ {result['backbone']}: {result['detail']}"))
+        changed = sum(len(result.get('changed', [])) for result in results)
+        failed = sum(result['status'] != 'ok' for result in results)
+        summary = (f'Reconciled {len(results)} backbone(s) in {time.monotonic() - started:.1f}s: '
+                   f'{changed} port(s) updated, {failed} failure(s)')
+        logger.info(summary)
+        self.stdout.write(summary)
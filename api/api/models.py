@@ -2,14 +2,22 @@ from django.utils import timezone
 import time
 import logging
 from typing import Any
-from django.db import models  # type: ignore
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connection, models, transaction  # type: ignore
+from django.conf import settings  # type: ignore
 from django.contrib.auth.models import User  # type: ignore
 import requests
 import paramiko
 import re
+from datetime import timedelta
 
 from requests.packages.urllib3.exceptions import InsecureRequestWarning  # type: ignore
 
+from .rest_sessions import SESSIONS, parse_max_age
+from .config_cache import VLAN_CONFIG
+from .ssh_pool import SSH_POOL
+from .breaker import BREAKERS, CircuitOpen
+
 # Configure logging to save logs to a file
 logging.basicConfig(filename='/app/logs/api_models.log', level=logging.INFO, 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -22,17 +30,22 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 SWITCH_USERNAME = "admin"
 SWITCH_PASSWORD = "switch"
 
+# Backbones torn down at the same time when a reservation is deleted
+TEARDOWN_WORKERS = 8
+
+# Request errors meaning the device couldn't be reached (fed to the circuit breaker)
+UNREACHABLE_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+
 class APIRequestError(Exception):
     """Exception raised for errors in API requests."""
     def __init__(self, message: str = "API request failed"):
         self.message = message
         super().__init__(self.message)
 
-COOKIE_CACHE = {}  # Dictionary to store cookies per switch IP
-
 def get_cookie(ip: str, retries: int = 3, delay: float = 1.0) -> str:
     """
     Authenticate and retrieve a session cookie for a given switch.
+    The cookie is stored in the device session along with its expiry.
 
     Args:
         ip (str): IP address of the network device.
@@ -45,13 +58,17 @@ def get_cookie(ip: str, retries: int = 3, delay: float = 1.0) -> str:
     Raises:
         APIRequestError: If authentication fails.
     """
-    global COOKIE_CACHE
+    session = SESSIONS.get(ip)
     auth_url = f"https://{ip}?domain=auth&username={SWITCH_USERNAME}&password={SWITCH_PASSWORD}"
-    headers = {'Accept': 'application/vnd.alcatellucentaos+json; version=1.0'}
 
     for attempt in range(retries):
         try:
-            response = requests.get(auth_url, headers=headers, verify=False, timeout=5)
+            BREAKERS.before(ip)
+        except CircuitOpen as e:
+            raise APIRequestError(e.message)
+        try:
+            response = session.http.get(auth_url, verify=False, timeout=5)
+            BREAKERS.success(ip)
             response.raise_for_status()
 
             # Extract cookie more robustly
@@ -61,11 +78,13 @@ def get_cookie(ip: str, retries: int = 3, delay: float = 1.0) -> str:
                 cookie_pair = set_cookie.split(';')[0]
                 if '=' in cookie_pair:
                     _, cookie_value = cookie_pair.split('=', 1)
-                    COOKIE_CACHE[ip] = cookie_value
+                    session.store_cookie(cookie_value, parse_max_age(set_cookie))
                     logger.info(f"Authenticated on {ip}; cookie obtained.")
                     return cookie_value
             logger.warning(f"Authentication on {ip} did not return a cookie.")
         except requests.exceptions.RequestException as e:
+            if isinstance(e, UNREACHABLE_ERRORS):
+                BREAKERS.failure(ip, e)
             logger.error(f"Attempt {attempt+1}/{retries}: Authentication failed for {ip}: {e}")
             if attempt < retries - 1:
                 time.sleep(delay)
@@ -73,9 +92,29 @@ def get_cookie(ip: str, retries: int = 3, delay: float = 1.0) -> str:
             raise APIRequestError(f"Authentication failed for {ip}: {e}")
     raise APIRequestError(f"Authentication failed for {ip} after {retries} attempts.")
 
+def session_cookie(ip: str) -> str:
+    """
+    Returns a valid session cookie for a switch, authenticating only when the
+    cached one is missing or expired. Concurrent callers share a single login.
+
+    Args:
+        ip (str): IP address of the network device.
+
+    Returns:
+        str: The session cookie.
+    """
+    session = SESSIONS.get(ip)
+    cookie = session.valid_cookie()
+    if cookie is None:
+        with session.auth_lock:
+            cookie = session.valid_cookie() or get_cookie(ip)
+    return cookie
+
 def cli(ip: str, cmd: str, retries: int = 3, delay: float = 1.0) -> Any:
     """
     Executes a CLI command on a network device using HTTPS requests with retries.
+    Requests go through the persistent session of the device, so the TLS
+    connection is reused between commands.
 
     Args:
         ip (str): IP address of the network device.
@@ -89,19 +128,18 @@ def cli(ip: str, cmd: str, retries: int = 3, delay: float = 1.0) -> Any:
     Raises:
         APIRequestError: If the API request fails.
     """
-    global COOKIE_CACHE
-    payload = {}
-    headers = {'Accept': 'application/vnd.alcatellucentaos+json; version=1.0'}
-
-    # Ensure we have a valid cookie
-    if ip not in COOKIE_CACHE:
-        COOKIE_CACHE[ip] = get_cookie(ip)
-    headers['Cookie'] = f"wv_sess={COOKIE_CACHE[ip]}"
+    session = SESSIONS.get(ip)
+    headers = {'Cookie': f"wv_sess={session_cookie(ip)}"}
 
     for attempt in range(retries):
         url = "https://{}?domain=cli&cmd={}".format(ip, cmd)
         try:
-            response = requests.get(url, headers=headers, data=payload, verify=False, timeout=5)
+            BREAKERS.before(ip)
+        except CircuitOpen as e:
+            raise APIRequestError(e.message)
+        try:
+            response = session.http.get(url, headers=headers, verify=False, timeout=5)
+            BREAKERS.success(ip)
             if response.status_code != 200:
                 try:
                     error_message = response.json().get("error", response.text)
@@ -115,16 +153,21 @@ def cli(ip: str, cmd: str, retries: int = 3, delay: float = 1.0) -> Any:
             result = data.get("result", {})
             if result.get("error") == "You must login first":
                 logger.info(f"Cookie expired on {ip}, re-authenticating.")
-                COOKIE_CACHE[ip] = get_cookie(ip)
-                headers['Cookie'] = f"wv_sess={COOKIE_CACHE[ip]}"
+                session.invalidate()
+                headers['Cookie'] = f"wv_sess={session_cookie(ip)}"
                 continue
 
             output = result.get("output")
             if output is None:
                 raise APIRequestError("Unexpected response format: 'output' missing.")
+            if not cmd.startswith("show"):
+                # Configuration changed: cached snapshot of this device is outdated
+                VLAN_CONFIG.invalidate(ip)
             return output
 
         except requests.exceptions.RequestException as e:
+            if isinstance(e, UNREACHABLE_ERRORS):
+                BREAKERS.failure(ip, e)
             logger.error(f"Attempt {attempt+1}/{retries}: Request to {ip} failed: {e}")
             if attempt < retries - 1:
                 time.sleep(delay)
@@ -133,6 +176,50 @@ def cli(ip: str, cmd: str, retries: int = 3, delay: float = 1.0) -> Any:
 
     raise APIRequestError(f"CLI command failed on {ip} after {retries} attempts.")
 
+def cli_batch(ip: str, cmds: list, retries: int = 3, delay: float = 1.0) -> list:
+    """
+    Executes an ordered list of CLI commands on a network device.
+    All commands go through the same authenticated keep-alive session, so the
+    batch pays a single login (if any) and no extra TLS handshake.
+    Execution stops at the first failing command; the remaining ones are
+    reported as skipped.
+
+    The REST 'cli' domain runs one command per request and the commands
+    depend on each other (service before SAP before port), so a batch still
+    costs one round trip per command.
+
+    Args:
+        ip (str): IP address of the network device.
+        cmds (list): CLI commands to be executed, in order.
+        retries (int): Number of retry attempts per command.
+        delay (float): Delay between retries.
+
+    Returns:
+        list: One dict per command with the keys 'cmd', 'status'
+        ('ok', 'failed' or 'skipped'), 'output' and 'error'.
+    """
+    results = []
+    failed = False
+    for cmd in cmds:
+        if failed:
+            results.append({'cmd': cmd, 'status': 'skipped', 'output': None, 'error': None})
+            continue
+        try:
+            output = cli(ip, cmd, retries, delay)
+            results.append({'cmd': cmd, 'status': 'ok', 'output': output, 'error': None})
+        except APIRequestError as e:
+            logger.error(f"Batch on {ip} stopped at '{cmd}': {e.message}")
+            results.append({'cmd': cmd, 'status': 'failed', 'output': None, 'error': e.message})
+            failed = True
+    return results
+
+def batch_error(results: list):
+    """
+    Returns the first failed command of a cli_batch() result, or None if
+    every command succeeded.
+    """
+    return next((result for result in results if result['status'] != 'ok'), None)
+
 class Switch(models.Model):
     """
     Represents a network switch.
@@ -144,6 +231,8 @@ class Switch(models.Model):
         part_number (str): Part number of the switch.
         hardware_revision (str): Hardware revision of the switch.
         serial_number (str): Serial number of the switch.
+        health (DeviceHealth): Last probe of the management IP, if any. Joined
+            on mngt_IP = host; no column, no constraint.
     """
     mngt_IP = models.CharField(max_length=255)
     model = models.CharField(max_length=255)
@@ -151,6 +240,8 @@ class Switch(models.Model):
     part_number = models.CharField(max_length=255)
     hardware_revision = models.CharField(max_length=255)
     serial_number = models.CharField(max_length=255)
+    health = models.ForeignObject('DeviceHealth', on_delete=models.DO_NOTHING, from_fields=['mngt_IP'],
+                                  to_fields=['host'], null=True, related_name='+')
 
     def __str__(self):
         return f"{self.model}_{self.mngt_IP}"
@@ -165,21 +256,15 @@ class Switch(models.Model):
             port.delete()
         return super().delete()
 
-    def changeBanner(self) -> bool:
+    def banner_text(self) -> str:
         """
-        Changes the banner of the switch.
-
-        Returns:
-            bool: True if the banner is successfully changed, False otherwise.
+        Returns the banner of the switch, naming the users who reserved it.
         """
-        if self.mngt_IP == "Not available":
-            logger.info(f"Skipping banner update for switch with management IP: {self.mngt_IP}")
-            return True
+        user_names = ', '.join(
+            Reservation.objects.filter(switch=self).values_list('user__username', flat=True)
+        ) or "nobody"
 
-        reservations = Reservation.objects.filter(switch=self)
-        user_names = ', '.join(reservation.user.username for reservation in reservations) if reservations.exists() else "nobody"
-
-        text = f"""
+        return f"""
 ***************** LAB RESERVATION SYSTEM ******************
 This switch is reserved by : {user_names}
 If you access this switch without reservation, please contact admin
@@ -188,15 +273,25 @@ To cleanup the switch:
 cp init/vc* working
 reload from working no rollback-timeout
 """
+
+    def changeBanner(self) -> bool:
+        """
+        Changes the banner of the switch.
+
+        Returns:
+            bool: True if the banner is successfully changed, False otherwise.
+        """
+        if self.mngt_IP == "Not available":
+            logger.info(f"Skipping banner update for switch with management IP: {self.mngt_IP}")
+            return True
+
+        text = self.banner_text()
         logger.info("Updating banner for switch %s", self.mngt_IP)
         try:
-            with paramiko.SSHClient() as ssh:
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                ssh.connect(self.mngt_IP, username=SWITCH_USERNAME, password=SWITCH_PASSWORD, port=22, timeout=5)
-                with ssh.open_sftp() as sftp:
-                    # Open file in write mode; adjust path if necessary
-                    with sftp.file('switch/pre_banner.txt', "w") as file:
-                        file.write(text)
+            with SSH_POOL.connection(self.mngt_IP, SWITCH_USERNAME, SWITCH_PASSWORD) as ssh:
+                # Open file in write mode; adjust path if necessary
+                with ssh.sftp().file('switch/pre_banner.txt', "w") as file:
+                    file.write(text)
                 logger.info("Banner updated successfully for switch %s", self.mngt_IP)
                 return True
         except paramiko.SSHException as ssh_exception:
@@ -221,10 +316,7 @@ reload from working no rollback-timeout
             return False
 
         try:
-            with paramiko.SSHClient() as ssh:
-                ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-                ssh.connect(self.mngt_IP, username=SWITCH_USERNAME, password=SWITCH_PASSWORD, port=22, timeout=5)
-
+            with SSH_POOL.connection(self.mngt_IP, SWITCH_USERNAME, SWITCH_PASSWORD) as ssh:
                 # Clean working directory completely
                 logger.info("Cleaning working directory on switch %s", self.mngt_IP)
                 stdin, stdout, stderr = ssh.exec_command("rm -rf working/*")
@@ -282,6 +374,7 @@ reload from working no rollback-timeout
                 time.sleep(1)  # Wait for the prompt
                 stdin.write('y\n')
                 stdin.flush()
+                ssh.discard()  # the switch is going down
                 logger.info("Successfully initiated cleanup reload for switch %s", self.mngt_IP)
                 return True
                 
@@ -289,6 +382,16 @@ reload from working no rollback-timeout
             logger.error("Error during cleanup for switch %s: %s", self.mngt_IP, e)
             return False
 
+def _delete_links_worker(links: list, user_name: str) -> set:
+    # Runs Port.delete_links on a teardown thread, which owns its DB connection
+    try:
+        return Port.delete_links(links, user_name)
+    except Exception as e:
+        logger.error(f"Error while deleting links {[portA.svlan for portA, _ in links]}: {e}")
+        return set()
+    finally:
+        connection.close()
+
 class Reservation(models.Model):
     """
     Represents a reservation for a switch.
@@ -302,7 +405,11 @@ class Reservation(models.Model):
     switch = models.ForeignKey(Switch, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     creation_date = models.DateTimeField(auto_now_add=True)
-    end_date = models.DateTimeField(null=True, blank=True)
+    end_date = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        # A switch is held by one user at a time, even under concurrent reserve requests
+        constraints = [models.UniqueConstraint(fields=['switch'], name='unique_reservation_per_switch')]
 
     def __str__(self):
         return f"{self.switch}_{self.user}"
@@ -315,7 +422,8 @@ class Reservation(models.Model):
         from django.utils import timezone
         
         logger.info("Cleaning up expired reservations...")
-        expired_reservations = cls.objects.filter(end_date__lt=timezone.now()).exclude(end_date__isnull=True)
+        expired_reservations = (cls.objects.filter(end_date__lt=timezone.now()).exclude(end_date__isnull=True)
+                                .select_related('user', 'switch'))
         
         cleaned_count = 0
         for reservation in expired_reservations:
@@ -346,33 +454,38 @@ class Reservation(models.Model):
             bool: True if the reservation was successfully deleted, False otherwise.
         """
         logger.info(f"Deleting reservation for user {username} on switch {self.switch.mngt_IP}.")
-        failure_on_port_release = False
-        ports = Port.objects.filter(switch=self.switch)
-        
-        # First, disconnect all links for this switch
-        processed_svlans = set()
-        for port in ports:
-            if port.svlan is not None and port.svlan not in processed_svlans:
-                connected_ports = list(Port.objects.filter(svlan=port.svlan))
-                if len(connected_ports) >= 2:
-                    # Delete the link between the first two connected ports
-                    portA = connected_ports[0]
-                    portB = connected_ports[1]
-                    if Port.delete_link(portA, portB, username):
-                        # Clear svlan for all connected ports
-                        for conn_port in connected_ports:
-                            conn_port.svlan = None
-                            conn_port.save()
-                        logger.info(f"Successfully deleted link for SVLAN {port.svlan}")
-                    else:
-                        failure_on_port_release = True
-                        logger.error(f"Failed to delete link for SVLAN {port.svlan}")
-                    processed_svlans.add(port.svlan)
-                elif len(connected_ports) == 1:
-                    # Single port with SVLAN, just clear it
-                    connected_ports[0].svlan = None
-                    connected_ports[0].save()
-                    processed_svlans.add(port.svlan)
+
+        # Every port sharing an SVLAN with this switch, peers included, in one query
+        linked_ports = Port.objects.filter(
+            svlan__in=Port.objects.filter(switch=self.switch_id).exclude(svlan=None).values('svlan')
+        ).order_by('svlan', 'id')
+        by_svlan = {}
+        for port in linked_ports:
+            by_svlan.setdefault(port.svlan, []).append(port)
+
+        # Single port with SVLAN: nothing to tear down, just clear it
+        freed = {svlan for svlan, ports in by_svlan.items() if len(ports) < 2}
+        by_backbone = {}
+        for svlan, ports in by_svlan.items():
+            if len(ports) >= 2:
+                # Delete the link between the first two connected ports
+                by_backbone.setdefault(ports[0].backbone, []).append((ports[0], ports[1]))
+
+        if by_backbone:
+            with ThreadPoolExecutor(max_workers=min(TEARDOWN_WORKERS, len(by_backbone))) as executor:
+                for deleted in executor.map(lambda links: _delete_links_worker(links, username), by_backbone.values()):
+                    freed |= deleted
+        failure_on_port_release = len(freed) < len(by_svlan)
+        if failure_on_port_release:
+            logger.error(f"Failed to delete link(s) for SVLAN(s) {sorted(set(by_svlan) - freed)}")
+
+        # Clear svlan for all connected ports of the deleted links at once
+        freed_ports = [port.id for svlan in freed for port in by_svlan[svlan]]
+        if freed_ports:
+            Port.objects.filter(id__in=freed_ports).update(svlan=None)
+            Change.record(Port, freed_ports)
+            Svlan.release(*freed)
+            logger.info(f"Successfully deleted link(s) for SVLAN(s) {sorted(freed)}")
 
         if not failure_on_port_release:
             # Delete the reservation
@@ -426,32 +539,119 @@ class Port(models.Model):
     def __str__(self):
         return f"{self.switch}_{self.port_backbone}"
 
+    def admin_state_command(self, state: str) -> str:
+        """
+        Returns the backbone command setting the admin state of the port.
+
+        Args:
+            state (str): 'UP' or 'DOWN'.
+        """
+        return f"interfaces {self.port_backbone} admin-state {'enable' if state == 'UP' else 'disable'}"
+
+    @staticmethod
+    def set_admin_state(ports, state: str, commands: dict = None) -> bool:
+        """
+        Sets the admin state of several ports with one command batch per backbone.
+        Extra commands can be sent ahead of the state change in the same batch.
+
+        Args:
+            ports (list): Ports to update.
+            state (str): 'UP' or 'DOWN'.
+            commands (dict): Optional backbone IP -> commands to run first.
+
+        Returns:
+            bool: True if every command succeeded, False otherwise.
+        """
+        success, _ = Port.apply_admin_state(ports, state, commands)
+        return success
+
+    @staticmethod
+    def apply_admin_state(ports, state: str, commands: dict = None) -> tuple:
+        """
+        Same as set_admin_state(), also telling which ports were changed.
+
+        Returns:
+            tuple: (True if every command succeeded, list of the ports now in `state`).
+        """
+        batches = {backbone: list(cmds) for backbone, cmds in (commands or {}).items()}
+        state_commands = {}
+        for port in ports:
+            cmd = port.admin_state_command(state)
+            batches.setdefault(port.backbone, []).append(cmd)
+            state_commands[(port.backbone, cmd)] = port
+
+        success = True
+        changed = []
+        for backbone, cmds in batches.items():
+            results = cli_batch(backbone, cmds)
+            for result in results:
+                port = state_commands.get((backbone, result['cmd']))
+                if port is not None and result['status'] == 'ok':
+                    changed.append(port)
+            error = batch_error(results)
+            if error:
+                logger.error("Command '%s' failed on %s: %s", error['cmd'], backbone, error['error'])
+                success = False
+                break
+
+        if changed:
+            Port.objects.filter(id__in=[port.id for port in changed]).update(status=state)
+            Change.record(Port, [port.id for port in changed])
+            for port in changed:
+                port.status = state
+        return success, changed
+
     def up(self) -> bool:
-        try:
-            cli(self.backbone, f"interfaces {self.port_backbone} admin-state enable")
-            self.status = 'UP'
-            self.save()
+        if Port.set_admin_state([self], 'UP'):
             logger.info("Port %s brought up successfully", self.port_backbone)
             return True
-        except APIRequestError as e:
-            logger.error("Failed to bring up port %s: %s", self.port_backbone, e)
-            return False
+        logger.error("Failed to bring up port %s", self.port_backbone)
+        return False
 
     def down(self) -> bool:
-        try:
-            cli(self.backbone, f"interfaces {self.port_backbone} admin-state disable")
-            self.status = 'DOWN'
-            self.save()
+        if Port.set_admin_state([self], 'DOWN'):
             logger.info("Port %s brought down successfully", self.port_backbone)
             return True
-        except APIRequestError as e:
-            logger.error("Failed to bring down port %s: %s", self.port_backbone, e)
-            return False
+        logger.error("Failed to bring down port %s", self.port_backbone)
+        return False
+
+    @staticmethod
+    def link_commands(portA, portB, user_name: str) -> list:
+        """
+        Returns the backbone commands creating the service of a link.
+        """
+        svlan_str = str(portA.svlan)
+        service_name = f"{user_name}_{svlan_str}"
+        return [
+            f"ethernet-service svlan {svlan_str} admin-state enable",
+            f"ethernet-service service-name {service_name} svlan {svlan_str}",
+            f"ethernet-service sap {svlan_str} service-name {service_name}",
+            f"ethernet-service sap {svlan_str} uni port {portA.port_backbone}",
+            f"ethernet-service sap {svlan_str} uni port {portB.port_backbone}",
+            f"ethernet-service sap {svlan_str} cvlan all",
+        ]
+
+    @staticmethod
+    def unlink_commands(portA, portB, user_name: str) -> list:
+        """
+        Returns the backbone commands deleting the service of a link, in order.
+        """
+        svlan_str = str(portA.svlan)
+        service_name = f"{user_name}_{svlan_str}"
+        return [
+            f"no ethernet-service sap {svlan_str} uni port {portA.port_backbone}",
+            f"no ethernet-service sap {svlan_str} uni port {portB.port_backbone}",
+            f"no ethernet-service sap {svlan_str}",
+            f"no ethernet-service service-name {service_name} svlan {svlan_str}",
+            f"no ethernet-service svlan {svlan_str}",
+        ]
 
     @staticmethod
     def create_link(portA, portB, user_name: str) -> bool:
         """
         Creates a link configuration between two ports.
+        The service configuration and the port bring-up are sent as a single
+        command batch on the backbone.
 
         Args:
             portA (Port): The first port.
@@ -461,24 +661,19 @@ class Port(models.Model):
         Returns:
             bool: True if link creation is successful, False otherwise.
         """
-        svlan_str = str(portA.svlan)
-        service_name = f"{user_name}_{svlan_str}"
-        try:
-            cli(portA.backbone, f"ethernet-service svlan {svlan_str} admin-state enable")
-            cli(portA.backbone, f"ethernet-service service-name {service_name} svlan {svlan_str}")
-            cli(portA.backbone, f"ethernet-service sap {svlan_str} service-name {service_name}")
-            cli(portA.backbone, f"ethernet-service sap {svlan_str} uni port {portA.port_backbone}")
-            cli(portA.backbone, f"ethernet-service sap {svlan_str} uni port {portB.port_backbone}")
-            cli(portA.backbone, f"ethernet-service sap {svlan_str} cvlan all")
-            return portA.up() and portB.up()  # Bring both ports up after link creation
-        except APIRequestError as e:
-            logger.error("Failed to create link between ports %s and %s: %s", portA.port_backbone, portB.port_backbone, e)
+        # Bring both ports up after link creation
+        link_commands = Port.link_commands(portA, portB, user_name)
+        if not Port.set_admin_state([portA, portB], 'UP', {portA.backbone: link_commands}):
+            logger.error("Failed to create link between ports %s and %s", portA.port_backbone, portB.port_backbone)
             return False
+        return True
 
     @staticmethod
     def delete_link(portA, portB, user_name: str) -> bool:
         """
         Deletes the link configuration between two ports.
+        Both ports are brought down first; the service configuration is only
+        removed once they are down.
 
         Args:
             portA (Port): The first port.
@@ -498,34 +693,59 @@ class Port(models.Model):
                         portA.port_backbone, portB.port_backbone, portA.svlan, portB.svlan)
             return False
 
-        svlan_str = str(portA.svlan)
-        service_name = f"{user_name}_{svlan_str}"
-        
-        try:
-            # First, bring down both ports
-            logger.info("Bringing down ports %s and %s before link deletion", portA.port_backbone, portB.port_backbone)
-            portA_down = portA.down()
-            portB_down = portB.down()
-            
-            if not portA_down or not portB_down:
-                logger.error("Failed to bring down one or both ports before link deletion")
-                return False
-            
-            # Delete the ethernet service configuration in correct order
-            logger.info("Deleting ethernet service configuration for SVLAN %s", svlan_str)
-            cli(portA.backbone, f"no ethernet-service sap {svlan_str} uni port {portA.port_backbone}")
-            cli(portA.backbone, f"no ethernet-service sap {svlan_str} uni port {portB.port_backbone}")
-            cli(portA.backbone, f"no ethernet-service sap {svlan_str}")
-            cli(portA.backbone, f"no ethernet-service service-name {service_name} svlan {svlan_str}")
-            cli(portA.backbone, f"no ethernet-service svlan {svlan_str}")
-            
-            logger.info("Link deleted successfully between ports %s and %s", portA.port_backbone, portB.port_backbone)
-            return True
-            
-        except APIRequestError as e:
-            logger.error("Failed to delete link between ports %s and %s: %s", portA.port_backbone, portB.port_backbone, e)
+        logger.info("Bringing down ports %s and %s before link deletion", portA.port_backbone, portB.port_backbone)
+        if not Port.set_admin_state([portA, portB], 'DOWN'):
+            logger.error("Failed to bring down one or both ports before link deletion")
+            return False
+
+        # Delete the ethernet service configuration in correct order
+        logger.info("Deleting ethernet service configuration for SVLAN %s", portA.svlan)
+        results = cli_batch(portA.backbone, Port.unlink_commands(portA, portB, user_name))
+        error = batch_error(results)
+        if error:
+            logger.error("Failed to delete link between ports %s and %s: %s", portA.port_backbone, portB.port_backbone, error['error'])
             return False
 
+        logger.info("Link deleted successfully between ports %s and %s", portA.port_backbone, portB.port_backbone)
+        return True
+
+    @staticmethod
+    def delete_links(links: list, user_name: str) -> set:
+        """
+        Deletes several links whose services live on the same backbone: one
+        command batch brings all their ports down, then one batch removes the
+        services. A link is kept if one of its ports couldn't be brought down
+        or one of its unlink commands failed; the others are still deleted.
+
+        Args:
+            links (list): (portA, portB) pairs, both ports of a pair sharing an SVLAN.
+            user_name (str): The username for naming the services.
+
+        Returns:
+            set: The SVLANs whose link was deleted.
+        """
+        success, down = Port.apply_admin_state([port for link in links for port in link], 'DOWN')
+        if not success:
+            down_ids = {port.id for port in down}
+            kept = [portA.svlan for portA, portB in links if not {portA.id, portB.id} <= down_ids]
+            logger.error(f"Failed to bring down the ports of SVLAN(s) {kept} before link deletion")
+            links = [(portA, portB) for portA, portB in links if {portA.id, portB.id} <= down_ids]
+            if not links:
+                return set()
+
+        backbone = links[0][0].backbone
+        commands, owners = [], []
+        for portA, portB in links:
+            link_commands = Port.unlink_commands(portA, portB, user_name)
+            commands += link_commands
+            owners += [portA.svlan] * len(link_commands)
+        results = cli_batch(backbone, commands)
+        error = batch_error(results)
+        if error:
+            logger.error("Failed to delete links on %s at '%s': %s", backbone, error['cmd'], error['error'])
+        failed = {svlan for svlan, result in zip(owners, results) if result['status'] != 'ok'}
+        return {portA.svlan for portA, _ in links} - failed
+
     def verify_configuration(self, svlan: str, expected_lines: int = 4) -> bool:
         """
         Verifies the configuration of the link.
@@ -538,24 +758,11 @@ class Port(models.Model):
             bool: True if the configuration is correct, False otherwise.
         """
         logger.info("Verifying configuration for VLAN %s on port %s", svlan, self.port_backbone)
-        config = cli(self.backbone, "show configuration snapshot vlan")
-        config_lines = [line.strip() for line in config.splitlines()]
-        sap_lines = [line for line in config_lines if f"sap {svlan}" in line]
-
-        # Expand port ranges in sap_lines
-        expanded_sap_lines = []
-        for line in sap_lines:
-            parts = line.split()
-            for i, part in enumerate(parts):
-                if "port" in part:
-                    port_range = parts[i + 1]
-                    expanded_ports = expand_port_range(port_range)
-                    for port in expanded_ports:
-                        new_line = line.replace(port_range, port)
-                        expanded_sap_lines.append(new_line)
-                    break
-            else:
-                expanded_sap_lines.append(line)
+        index = VLAN_CONFIG.get(
+            self.backbone,
+            lambda: parse_vlan_snapshot(cli(self.backbone, "show configuration snapshot vlan"))
+        )
+        expanded_sap_lines = index.get(str(svlan), [])
 
         if len(expanded_sap_lines) == expected_lines:
             logger.info("Configuration verified successfully for port %s", self.port_backbone)
@@ -563,8 +770,66 @@ class Port(models.Model):
         else:
             logger.warning("Configuration verification failed for port %s: expected %s lines, got %s",
                            self.port_backbone, expected_lines, len(expanded_sap_lines))
+            # The device may not have applied the change yet: next check refetches
+            VLAN_CONFIG.invalidate(self.backbone)
             return False
 
+    @staticmethod
+    def verify_links(backbone: str, svlans: list, expected_lines: int = 4) -> set:
+        """
+        Verifies several links of a backbone against a single configuration snapshot.
+
+        Args:
+            backbone (str): IP address of the backbone.
+            svlans (list): Service VLANs to verify.
+            expected_lines (int): Number of expected lines per SVLAN.
+
+        Returns:
+            set: The SVLANs whose configuration is correct.
+        """
+        index = VLAN_CONFIG.get(
+            backbone,
+            lambda: parse_vlan_snapshot(cli(backbone, "show configuration snapshot vlan"))
+        )
+        verified = {svlan for svlan in svlans if len(index.get(str(svlan), [])) == expected_lines}
+        if len(verified) < len(svlans):
+            logger.warning("Configuration verification failed on %s for SVLAN(s) %s",
+                           backbone, sorted(set(svlans) - verified))
+            # The device may not have applied the change yet: next check refetches
+            VLAN_CONFIG.invalidate(backbone)
+        return verified
+
+def parse_vlan_snapshot(config: str) -> dict:
+    """
+    Indexes the SAP lines of 'show configuration snapshot vlan' by SVLAN.
+    Port ranges are expanded so each port counts as one line.
+
+    Args:
+        config (str): Raw command output.
+
+    Returns:
+        dict: SVLAN (str) -> list of expanded SAP lines.
+    """
+    index = {}
+    for line in config.splitlines():
+        line = line.strip()
+        match = re.search(r"\bsap (\d+)\b", line)
+        if not match:
+            continue
+        sap_lines = index.setdefault(match.group(1), [])
+
+        # Expand port ranges in sap lines
+        parts = line.split()
+        for i, part in enumerate(parts):
+            if "port" in part and i + 1 < len(parts):
+                port_range = parts[i + 1]
+                for port in expand_port_range(port_range):
+                    sap_lines.append(line.replace(port_range, port))
+                break
+        else:
+            sap_lines.append(line)
+    return index
+
 def expand_port_range(port_range: str) -> list:
     """
     Expands port ranges into individual ports.
@@ -592,3 +857,335 @@ class TopologyShare(models.Model):
 
     def __str__(self):
         return f"Topology of {self.owner.username} shared with {self.target.username}"
+
+class Job(models.Model):
+    """
+    Represents a long-running device operation executed in the background.
+
+    Attributes:
+        kind (str): Operation to run ('connect', 'connect_many', 'disconnect' or 'banner').
+        user (User): User who submitted the job.
+        payload (dict): Arguments of the operation.
+        status (str): 'PENDING', 'RUNNING', 'SUCCEEDED' or 'FAILED'.
+        detail (str): Outcome message returned to the user.
+        result (list): Per-item outcome of the jobs working on several items.
+        attempts (int): Number of failed attempts already retried.
+        run_after (datetime): The job is not picked before this date (retry backoff).
+        created_at (datetime): Date and time when the job was submitted.
+        started_at (datetime): Date and time when a worker picked the job.
+        finished_at (datetime): Date and time when the job ended.
+    """
+    KIND_CHOICES = [
+        ('connect', 'Connect'),
+        ('connect_many', 'Connect many'),
+        ('disconnect', 'Disconnect'),
+        ('banner', 'Banner'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('SUCCEEDED', 'Succeeded'),
+        ('FAILED', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, default='PENDING', choices=STATUS_CHOICES, db_index=True)
+    detail = models.TextField(blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    run_after = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind}_{self.id}_{self.status}"
+
+class SvlanPoolExhausted(Exception):
+    """Exception raised when every SVLAN of the pool is in use."""
+    def __init__(self, message: str = "No free SVLAN left in the pool"):
+        self.message = message
+        super().__init__(self.message)
+
+class Svlan(models.Model):
+    """
+    Represents one service VLAN of the allocation pool.
+    Free rows form the free-list; allocation takes the lowest free number
+    under a row lock, so concurrent workers never get the same SVLAN.
+
+    Attributes:
+        number (int): SVLAN id.
+        in_use (bool): Whether the SVLAN is currently allocated.
+        allocated_at (datetime): Date and time of the last allocation.
+    """
+    number = models.IntegerField(unique=True)
+    in_use = models.BooleanField(default=False)
+    allocated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['in_use', 'number'])]
+
+    def __str__(self):
+        return f"svlan_{self.number}"
+
+    @staticmethod
+    def pool_range() -> range:
+        """
+        Returns the configured SVLAN range (settings.SVLAN_RANGE, bounds included).
+        """
+        first, last = getattr(settings, 'SVLAN_RANGE', (1001, 4094))
+        return range(first, last + 1)
+
+    @classmethod
+    def sync_pool(cls) -> int:
+        """
+        Creates the missing pool rows for the configured range and marks the
+        SVLANs already used by ports as allocated.
+
+        Returns:
+            int: Number of free SVLANs in the pool.
+        """
+        cls.objects.bulk_create([cls(number=number) for number in cls.pool_range()], ignore_conflicts=True)
+        used = Port.objects.exclude(svlan=None).values('svlan')
+        cls.objects.filter(number__in=used, in_use=False).update(in_use=True, allocated_at=timezone.now())
+        return cls.objects.filter(in_use=False, number__in=cls.pool_range()).count()
+
+    @classmethod
+    def allocate(cls) -> int:
+        """
+        Takes the lowest free SVLAN of the pool.
+        Rows locked by a concurrent allocation are skipped instead of waited for.
+
+        Returns:
+            int: The allocated SVLAN.
+
+        Raises:
+            SvlanPoolExhausted: If no SVLAN is free.
+        """
+        return cls.allocate_many(1)[0]
+
+    @classmethod
+    def allocate_many(cls, count: int) -> list:
+        """
+        Takes the `count` lowest free SVLANs of the pool in one query, or none.
+        Rows locked by a concurrent allocation are skipped instead of waited for.
+
+        Args:
+            count (int): Number of SVLANs needed.
+
+        Returns:
+            list: The allocated SVLANs.
+
+        Raises:
+            SvlanPoolExhausted: If fewer than `count` SVLANs are free.
+        """
+        pool = cls.pool_range()
+        for attempt in range(2):
+            with transaction.atomic():
+                numbers = list(cls.objects.select_for_update(skip_locked=True)
+                               .filter(in_use=False, number__gte=pool.start, number__lt=pool.stop)
+                               .order_by('number').values_list('number', flat=True)[:count])
+                if len(numbers) == count:
+                    cls.objects.filter(number__in=numbers).update(in_use=True, allocated_at=timezone.now())
+                    logger.info(f"Allocated SVLAN(s) {numbers}")
+                    return numbers
+            # Pool not initialized yet (or range extended): fill it and retry once
+            if attempt == 0 and not cls.sync_pool():
+                break
+        if count == 1:
+            raise SvlanPoolExhausted()
+        raise SvlanPoolExhausted(f"Fewer than {count} free SVLANs left in the pool")
+
+    @classmethod
+    def release(cls, *numbers):
+        """
+        Returns SVLANs to the free-list.
+
+        Args:
+            numbers (int): SVLANs to free. None values are ignored.
+        """
+        numbers = [number for number in numbers if number is not None]
+        if numbers:
+            cls.objects.filter(number__in=numbers).update(in_use=False, allocated_at=None)
+            logger.info(f"Released SVLAN(s) {numbers}")
+
+    @classmethod
+    def reclaim_orphans(cls, grace_seconds: int = 300) -> int:
+        """
+        Frees SVLANs left behind by failed links:
+        - SVLANs held by a single port (the link can't exist), which are also
+          cleared from that port;
+        - SVLANs allocated for more than `grace_seconds` but used by no port.
+        Ports with a connect/disconnect job still pending are left alone.
+
+        Returns:
+            int: Number of reclaimed SVLANs.
+        """
+        active_ports = set()
+        for payload in Job.objects.filter(status__in=['PENDING', 'RUNNING']).values_list('payload', flat=True):
+            for link in [payload] + payload.get('links', []):
+                active_ports.update(link.get(key) for key in ('portA', 'portB'))
+
+        lone_svlans = list(
+            Port.objects.exclude(svlan=None).exclude(id__in=active_ports).values('svlan')
+            .annotate(count=models.Count('id')).filter(count=1).values_list('svlan', flat=True)
+        )
+        if lone_svlans:
+            lone_ports = Port.objects.filter(svlan__in=lone_svlans)
+            Change.record(Port, lone_ports.values_list('id', flat=True))
+            lone_ports.update(svlan=None)
+
+        used = Port.objects.exclude(svlan=None).values('svlan')
+        cutoff = timezone.now() - timedelta(seconds=grace_seconds)
+        unused = list(cls.objects.filter(in_use=True, allocated_at__lt=cutoff).exclude(number__in=used)
+                      .values_list('number', flat=True))
+
+        reclaimed = set(lone_svlans) | set(unused)
+        cls.release(*reclaimed)
+        if reclaimed:
+            logger.info(f"Reclaimed {len(reclaimed)} orphaned SVLAN(s): {sorted(reclaimed)}")
+        return len(reclaimed)
+
+class Change(models.Model):
+    """
+    Append-only log of inventory changes (switches, ports, reservations,
+    topology shares). The id of the latest row is the change version served
+    as ETag by the list endpoints and used by the delta feed.
+
+    Attributes:
+        model (str): Model name of the changed object (e.g. 'port').
+        object_id (int): Primary key of the changed object.
+        created_at (datetime): Date and time of the change.
+    """
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['model', 'id'])]
+
+    def __str__(self):
+        return f"{self.model}_{self.object_id}_{self.id}"
+
+    @classmethod
+    def record(cls, model, ids):
+        """
+        Logs changed objects once the current transaction commits, so a
+        version is never visible before the rows it describes.
+        Signal handlers cover save()/delete(); queryset update() and bulk
+        writes must call this themselves.
+
+        Args:
+            model: Model class of the changed objects.
+            ids (iterable): Primary keys of the changed objects.
+        """
+        ids = list(ids)
+        if not ids:
+            return
+        name = model._meta.model_name
+        transaction.on_commit(lambda: cls.objects.bulk_create(
+            [cls(model=name, object_id=object_id) for object_id in ids]
+        ))
+
+    @classmethod
+    def latest(cls, *models_) -> tuple:
+        """
+        Returns the latest change of the given models.
+
+        Returns:
+            tuple: (version, datetime), (0, None) if nothing changed yet.
+        """
+        names = [model._meta.model_name for model in models_]
+        latest = cls.objects.filter(model__in=names).order_by('-id').values_list('id', 'created_at').first()
+        return latest or (0, None)
+
+    @classmethod
+    def prune(cls, max_age_seconds: int = 7 * 24 * 3600) -> int:
+        """
+        Deletes log rows older than `max_age_seconds`, always keeping the
+        latest one so the version never goes backwards.
+
+        Returns:
+            int: Number of deleted rows.
+        """
+        last_id = cls.objects.order_by('-id').values_list('id', flat=True).first()
+        if last_id is None:
+            return 0
+        cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+        deleted, _ = cls.objects.filter(created_at__lt=cutoff, id__lt=last_id).delete()
+        return deleted
+
+class DeviceCircuit(models.Model):
+    """
+    Circuit breaker state of a switch or backbone, shared by every process
+    (see breaker.py). Only openings and closings are written.
+
+    Attributes:
+        host (str): IP address of the device.
+        state (str): 'OPEN' or 'CLOSED'.
+        failures (int): Consecutive connection failures when the circuit opened.
+        open_until (datetime): End of the fail-fast period; a probe is let through after it.
+        last_error (str): Error that opened the circuit.
+        updated_at (datetime): Date and time of the last transition.
+    """
+    STATE_CHOICES = [('OPEN', 'Open'), ('CLOSED', 'Closed')]
+
+    host = models.CharField(max_length=255, unique=True)
+    state = models.CharField(max_length=10, default='CLOSED', choices=STATE_CHOICES)
+    failures = models.IntegerField(default=0)
+    open_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.host}_{self.state}"
+
+    @property
+    def current_state(self) -> str:
+        """'CLOSED', 'OPEN', or 'HALF_OPEN' once the fail-fast period is over."""
+        if self.state == 'OPEN' and self.open_until is not None and self.open_until <= timezone.now():
+            return 'HALF_OPEN'
+        return self.state
+
+class DeviceHealth(models.Model):
+    """
+    Last reachability probe of a switch management IP or backbone, written by
+    the monitor_devices command (see health.py).
+
+    Attributes:
+        host (str): IP address of the device.
+        reachable (bool): Whether the last probe got an answer.
+        latency_ms (float): Connect time of the last successful probe, in milliseconds.
+        checked_at (datetime): Date and time of the last probe.
+        last_seen (datetime): Date and time of the last successful probe.
+        error (str): Error of the last failed probe.
+    """
+    host = models.CharField(max_length=255, unique=True)
+    reachable = models.BooleanField(default=False)
+    latency_ms = models.FloatField(null=True, blank=True)
+    checked_at = models.DateTimeField()
+    last_seen = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+
+    def __str__(self):
+        return f"{self.host}_{'up' if self.reachable else 'down'}"
+
+class EventTicket(models.Model):
+    """
+    Short-lived, single-use credential of an event stream (see events.py).
+    EventSource can't send headers, so the stream URL carries a ticket
+    instead of the long-lived API token.
+
+    Attributes:
+        key (str): Random ticket sent as the 'ticket' query parameter.
+        user (User): User the stream is opened for.
+        expires_at (datetime): The ticket is refused after this date.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user.username}_{self.expires_at}"
@@ -0,0 +1,66 @@
+"""
+Cursor pagination and field projection for the inventory list endpoints.
+
+Pagination is opt-in: a request without 'page_size' nor 'cursor' still gets
+the whole list, so existing clients keep working.
+"""
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework import status
+
+from .serializers import values_of
+
+
+class IdCursorPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+def requested_fields(request, serializer_class):
+    """
+    Parses the 'fields' query parameter (e.g. ?fields=id,svlan,status).
+
+    Returns:
+        tuple: (fields or None for all fields, list of unknown field names)
+    """
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None, []
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in serializer_class.Meta.fields]
+    return fields, unknown
+
+
+def list_response(request, queryset, serializer_class, filterset_class, key):
+    """
+    Builds the response of a filterable, paginated, projectable list endpoint.
+
+    Args:
+        request (Request): The incoming request.
+        queryset (QuerySet): Rows to list.
+        serializer_class: Serializer whose Meta.fields are the listable fields.
+        filterset_class: django-filter FilterSet applied to the query string.
+        key (str): Key of the list in the response payload.
+
+    Returns:
+        Response: {key: [...], "next": <next page URL or null>}
+    """
+    filterset = filterset_class(request.query_params, queryset=queryset)
+    if not filterset.is_valid():
+        return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    fields, unknown = requested_fields(request, serializer_class)
+    if unknown:
+        return Response({"fields": f"Unknown field(s): {', '.join(unknown)}"}, status=status.HTTP_400_BAD_REQUEST)
+    if fields is not None and 'id' not in fields:
+        fields = ['id'] + fields  # the cursor is based on the id
+
+    queryset = filterset.qs.order_by('id')
+    if 'page_size' not in request.query_params and 'cursor' not in request.query_params:
+        return Response({key: values_of(queryset, serializer_class, fields), "next": None}, status=status.HTTP_200_OK)
+
+    paginator = IdCursorPagination()
+    page = paginator.paginate_queryset(values_of(queryset, serializer_class, fields, evaluate=False), request)
+    return Response({key: page, "next": paginator.get_next_link()}, status=status.HTTP_200_OK)
@@ -0,0 +1,95 @@
+"""
+Reconciliation of Port.status with the backbones.
+
+Port.status only changes when up()/down() succeed through the API, so it
+drifts when someone changes a backbone by hand. reconcile_ports() reads the
+state of every port of a backbone with a single 'show interfaces status',
+and writes only the ports that differ with one bulk_update. Backbones are
+reconciled in parallel on a small thread pool.
+
+It runs with the cleanup daemon's periodic maintenance, and on demand
+through the reconcile_ports command and endpoint.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+
+from .models import Port, Change, APIRequestError, cli
+from .interfaces import parse_admin_states
+
+logger = logging.getLogger(__name__)
+
+# Backbones reconciled at the same time
+RECONCILE_WORKERS = 8
+
+
+def reconcile_backbone(backbone: str) -> dict:
+    """
+    Aligns the status of the ports of one backbone with the device.
+
+    Ports missing from the device output are left untouched. A port whose
+    status changed in the database while the device was read (e.g. a
+    concurrent up()) is left to the next run.
+
+    Returns:
+        dict: {"backbone", "status": "ok", "ports", "changed": [port ids]}
+        or {"backbone", "status": "failed", "detail"}.
+    """
+    try:
+        states = parse_admin_states(cli(backbone, "show interfaces status"))
+    except APIRequestError as e:
+        logger.error(f"Can't read the interfaces of {backbone}: {e}")
+        return {"backbone": backbone, "status": "failed", "detail": str(e)}
+    if not states:
+        logger.error(f"No interface state could be parsed on {backbone}")
+        return {"backbone": backbone, "status": "failed", "detail": "No interface state in the device output."}
+
+    ports = list(Port.objects.filter(backbone=backbone).only('id', 'port_backbone', 'status'))
+    stale = {port.id: port for port in ports
+             if port.port_backbone in states and port.status != states[port.port_backbone]}
+    changed = []
+    if stale:
+        with transaction.atomic():
+            current = dict(Port.objects.select_for_update().filter(id__in=stale).values_list('id', 'status'))
+            for port_id, port in stale.items():
+                if port_id in current and current[port_id] == port.status:
+                    port.status = states[port.port_backbone]
+                    changed.append(port)
+            Port.objects.bulk_update(changed, ['status'])
+            # bulk_update doesn't send post_save
+            Change.record(Port, [port.id for port in changed])
+    if changed:
+        logger.info(f"Reconciled {len(changed)} port(s) on {backbone}: "
+                    f"{', '.join(f'{port.port_backbone}={port.status}' for port in changed)}")
+    return {"backbone": backbone, "status": "ok", "ports": len(ports), "changed": [port.id for port in changed]}
+
+
+def reconcile_ports(backbones: list = None) -> list:
+    """
+    Reconciles several backbones in parallel.
+
+    Args:
+        backbones (list): Backbone IPs; every backbone of the inventory by default.
+
+    Returns:
+        list: Result of reconcile_backbone() for each backbone, sorted by backbone.
+    """
+    if backbones is None:
+        backbones = Port.objects.values_list('backbone', flat=True).distinct()
+    backbones = sorted(set(backbones))
+    if not backbones:
+        return []
+
+    def worker(backbone):
+        try:
+            return reconcile_backbone(backbone)
+        except Exception as e:
+            logger.error(f"Error while reconciling {backbone}: {e}")
+            return {"backbone": backbone, "status": "failed", "detail": f"Unexpected error: {e}"}
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=min(RECONCILE_WORKERS, len(backbones)),
+                            thread_name_prefix='reconcile') as executor:
+        return list(executor.map(worker, backbones))
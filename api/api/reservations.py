@@ -0,0 +1,227 @@
+"""
+Reservation and release of several switches in one request.
+
+The database part is all-or-nothing: the switch rows are locked with
+select_for_update and every switch is checked before anything is written,
+so a topology is either fully reserved or left untouched. The single-switch
+reserve endpoint goes through the same path; the unique constraint on
+Reservation.switch turns any race left (e.g. a database without row locks)
+into a conflict instead of a double booking.
+
+The device side effects then run in parallel on a small thread pool:
+banners are queued to the job workers, and the links of released switches
+are torn down (and the switches cleaned up if requested) one switch group at
+a time. Switches linked to each other share SVLANs, so they are released by
+the same worker, one after the other.
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count
+
+from .models import Switch, Reservation, Port, TopologyShare, Change
+from .expiry import notify_reservation_change
+from . import jobs
+
+logger = logging.getLogger(__name__)
+
+# Largest number of switches accepted by a bulk request
+MAX_BULK_SWITCHES = 100
+# Switch groups released at the same time
+RELEASE_WORKERS = 8
+
+
+class BulkError(Exception):
+    """
+    Raised when a bulk request is rejected before anything was changed.
+
+    Attributes:
+        status (str): 'not_found', 'conflict', 'forbidden' or 'invalid'.
+        results (list): Per-switch outcome.
+    """
+    def __init__(self, status: str, message: str, results: list):
+        self.status = status
+        self.message = message
+        self.results = results
+        super().__init__(message)
+
+
+def parse_switch_ids(value) -> list:
+    """
+    Validates the 'switches' field of a bulk request.
+
+    Returns:
+        list: Distinct switch ids, in request order.
+
+    Raises:
+        BulkError: If the field isn't a non-empty list of ids.
+    """
+    if not isinstance(value, list) or not value:
+        raise BulkError('invalid', "'switches' must be a non-empty list of switch ids.", [])
+    if len(value) > MAX_BULK_SWITCHES:
+        raise BulkError('invalid', f"At most {MAX_BULK_SWITCHES} switches per request.", [])
+    try:
+        ids = [int(switch_id) for switch_id in value]
+    except (TypeError, ValueError):
+        raise BulkError('invalid', "'switches' must be a non-empty list of switch ids.", [])
+    return list(dict.fromkeys(ids))
+
+
+def _lock_switches(switch_ids: list) -> dict:
+    # Always lock in id order so two bulk requests can't deadlock
+    switches = {switch.id: switch for switch in
+                Switch.objects.select_for_update().filter(id__in=switch_ids).order_by('id')}
+    missing = [switch_id for switch_id in switch_ids if switch_id not in switches]
+    if missing:
+        raise BulkError('not_found', f"Unknown switch(es): {missing}", [
+            {"switch": switch_id, "status": "not_found" if switch_id in missing else "ok"}
+            for switch_id in switch_ids
+        ])
+    return switches
+
+
+def _conflict(user, switch_ids: list) -> BulkError:
+    holders = dict(Reservation.objects.filter(switch_id__in=switch_ids).values_list('switch_id', 'user_id'))
+    return BulkError('conflict', "Some switches are already reserved, nothing was reserved.", [
+        {"switch": switch_id,
+         "status": ("already_reserved" if holders[switch_id] == user.id else "unavailable")
+         if switch_id in holders else "available"}
+        for switch_id in switch_ids
+    ])
+
+
+def reserve_switches(user, switch_ids: list, end_date=None) -> list:
+    """
+    Reserves every switch of the list, or none of them.
+
+    Args:
+        user (User): User making the reservation.
+        switch_ids (list): Switches to reserve.
+        end_date (datetime): Optional end of the reservations.
+
+    Returns:
+        list: [{"switch", "status": "reserved", "banner_job"}] in request order.
+
+    Raises:
+        BulkError: If a switch doesn't exist or is already reserved.
+    """
+    try:
+        with transaction.atomic():
+            switches = _lock_switches(switch_ids)
+            if Reservation.objects.filter(switch_id__in=switch_ids).exists():
+                raise _conflict(user, switch_ids)
+            created = Reservation.objects.bulk_create(
+                [Reservation(switch=switches[switch_id], user=user, end_date=end_date) for switch_id in switch_ids]
+            )
+            # bulk_create doesn't send post_save
+            Change.record(Reservation, [reservation.id for reservation in created])
+            notify_reservation_change()
+    except IntegrityError:
+        # A concurrent request got a switch first (unique_reservation_per_switch)
+        raise _conflict(user, switch_ids)
+
+    logger.info(f"User {user.username} reserved switches {switch_ids}.")
+    return [
+        {"switch": switch_id, "status": "reserved", "banner_job": jobs.queue_banner(switches[switch_id], user).id}
+        for switch_id in switch_ids
+    ]
+
+
+def _release_groups(switch_ids: list) -> list:
+    # Union of the switches sharing an SVLAN: they are linked and must be released sequentially
+    parent = {switch_id: switch_id for switch_id in switch_ids}
+
+    def find(switch_id):
+        while parent[switch_id] != switch_id:
+            parent[switch_id] = parent[parent[switch_id]]
+            switch_id = parent[switch_id]
+        return switch_id
+
+    first_by_svlan = {}
+    for switch_id, svlan in (Port.objects.filter(switch_id__in=switch_ids, svlan__isnull=False)
+                             .values_list('switch_id', 'svlan')):
+        other = first_by_svlan.setdefault(svlan, switch_id)
+        parent[find(switch_id)] = find(other)
+
+    groups = {}
+    for switch_id in switch_ids:
+        groups.setdefault(find(switch_id), []).append(switch_id)
+    return list(groups.values())
+
+
+def release_switches(user, switch_ids: list, cleanup_switch: bool = False) -> list:
+    """
+    Releases every switch of the list. The request is rejected as a whole if
+    a switch is unknown, not reserved or not accessible to the user; then each
+    switch is released on its own and may fail independently.
+
+    Args:
+        user (User): User releasing the switches (owner or shared with).
+        switch_ids (list): Switches to release.
+        cleanup_switch (bool): Whether to cleanup the switches left free.
+
+    Returns:
+        list: [{"switch", "status": "released"|"failed", "detail"}] in request order.
+
+    Raises:
+        BulkError: If a switch can't be released by the user.
+    """
+    with transaction.atomic():
+        switches = _lock_switches(switch_ids)
+        reservations = {}
+        held = set()
+        for reservation in (Reservation.objects.filter(switch_id__in=switch_ids)
+                            .select_related('user', 'switch').order_by('id')):
+            reservations.setdefault(reservation.switch_id, reservation)
+            if reservation.user_id == user.id:
+                held.add(reservation.switch_id)
+        shared_owners = set(TopologyShare.objects.filter(target=user).values_list('owner_id', flat=True))
+
+        checks = {}
+        for switch_id in switch_ids:
+            reservation = reservations.get(switch_id)
+            if reservation is None:
+                checks[switch_id] = "not_reserved"
+            elif switch_id not in held and reservation.user_id not in shared_owners:
+                checks[switch_id] = "forbidden"
+            else:
+                checks[switch_id] = "ok"
+        if any(check != "ok" for check in checks.values()):
+            status = 'forbidden' if "forbidden" in checks.values() else 'invalid'
+            raise BulkError(status, "Some switches can't be released, nothing was released.", [
+                {"switch": switch_id, "status": checks[switch_id]} for switch_id in switch_ids
+            ])
+        remaining = dict(Reservation.objects.filter(switch_id__in=switch_ids).values('switch_id')
+                         .annotate(count=Count('id')).values_list('switch_id', 'count'))
+
+    def release_group(group):
+        outcome = {}
+        try:
+            for switch_id in group:
+                if reservations[switch_id].delete(user.username, cleanup_switch):
+                    jobs.queue_banner(switches[switch_id], user)
+                    detail = "Release successful."
+                    if cleanup_switch:
+                        detail += (" Switch cleanup performed." if remaining[switch_id] == 1
+                                   else " Cleanup skipped - other reservations exist.")
+                    outcome[switch_id] = {"status": "released", "detail": detail}
+                else:
+                    outcome[switch_id] = {"status": "failed",
+                                          "detail": "Failed to release switch. Some ports may still be connected."}
+        except Exception as e:
+            logger.error(f"Error while releasing switches {group}: {e}")
+            for switch_id in group:
+                outcome.setdefault(switch_id, {"status": "failed", "detail": f"Unexpected error: {e}"})
+        finally:
+            connection.close()
+        return outcome
+
+    groups = _release_groups(switch_ids)
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(RELEASE_WORKERS, len(groups)), thread_name_prefix='release') as executor:
+        for outcome in executor.map(release_group, groups):
+            results.update(outcome)
+
+    logger.info(f"User {user.username} released switches {switch_ids} (cleanup: {cleanup_switch}).")
+    return [{"switch": switch_id, **results[switch_id]} for switch_id in switch_ids]
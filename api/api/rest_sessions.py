@@ -0,0 +1,149 @@
+"""
+Persistent HTTPS sessions for the switch REST API.
+
+Each backbone/switch IP gets its own requests.Session backed by a keep-alive
+connection pool, so consecutive cli() calls reuse the same TLS connection
+instead of paying a new handshake every time. The manager also owns the
+authentication cookie of every device and knows when it expires.
+
+The manager is a process-wide singleton (SESSIONS): it lives as long as the
+gunicorn worker and is shared by every request served by that worker.
+"""
+import re
+import threading
+import time
+import logging
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+ACCEPT_HEADER = 'application/vnd.alcatellucentaos+json; version=1.0'
+
+# Lifetime assumed for a session cookie when the switch does not announce one.
+# Kept below the AOS web session timeout so we re-authenticate before the
+# switch answers "You must login first".
+COOKIE_TTL = 300
+
+# Maximum number of keep-alive connections kept open per device
+POOL_MAXSIZE = 4
+
+
+def parse_max_age(set_cookie: str) -> Optional[int]:
+    """
+    Extracts the Max-Age attribute from a Set-Cookie header.
+
+    Args:
+        set_cookie (str): Raw Set-Cookie header value.
+
+    Returns:
+        Optional[int]: Max-Age in seconds, or None if not present.
+    """
+    match = re.search(r'max-age=(\d+)', set_cookie, re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+class SwitchSession:
+    """
+    Keep-alive HTTPS session and authentication cookie for one device.
+
+    Attributes:
+        ip (str): IP address of the device.
+        http (requests.Session): Pooled HTTP session used for every request.
+        auth_lock (threading.Lock): Serializes authentication so concurrent
+            threads don't all log in at the same time.
+    """
+    def __init__(self, ip: str, pool_maxsize: int = POOL_MAXSIZE, cookie_ttl: int = COOKIE_TTL):
+        self.ip = ip
+        self.cookie_ttl = cookie_ttl
+        self.http = requests.Session()
+        self.http.headers['Accept'] = ACCEPT_HEADER
+        self.http.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
+        self.auth_lock = threading.Lock()
+        self._cookie = None
+        self._expires_at = 0.0
+
+    def valid_cookie(self) -> Optional[str]:
+        """
+        Returns the current cookie, or None if there is none or it has expired.
+        """
+        if self._cookie is not None and time.monotonic() < self._expires_at:
+            return self._cookie
+        return None
+
+    def store_cookie(self, cookie: str, max_age: Optional[int] = None):
+        """
+        Stores a freshly obtained cookie along with its expiry.
+
+        Args:
+            cookie (str): Cookie value.
+            max_age (Optional[int]): Lifetime announced by the switch, if any.
+        """
+        ttl = max_age if max_age is not None else self.cookie_ttl
+        self._cookie = cookie
+        self._expires_at = time.monotonic() + ttl
+
+    def invalidate(self):
+        """
+        Forgets the current cookie so the next request re-authenticates.
+        """
+        self._cookie = None
+        self._expires_at = 0.0
+
+    def close(self):
+        self.invalidate()
+        self.http.close()
+
+
+class SessionManager:
+    """
+    Thread-safe registry of SwitchSession objects, one per device IP.
+    """
+    def __init__(self, pool_maxsize: int = POOL_MAXSIZE, cookie_ttl: int = COOKIE_TTL):
+        self.pool_maxsize = pool_maxsize
+        self.cookie_ttl = cookie_ttl
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def get(self, ip: str) -> SwitchSession:
+        """
+        Returns the session for a device, creating it on first use.
+        """
+        session = self._sessions.get(ip)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(ip)
+                if session is None:
+                    session = SwitchSession(ip, self.pool_maxsize, self.cookie_ttl)
+                    self._sessions[ip] = session
+                    logger.info(f"Opened HTTPS session pool for {ip}")
+        return session
+
+    def invalidate(self, ip: str):
+        """
+        Drops the cookie of a device, keeping its open connections.
+        """
+        session = self._sessions.get(ip)
+        if session is not None:
+            session.invalidate()
+
+    def close(self, ip: str):
+        """
+        Closes the connections of a device and forgets its session.
+        """
+        with self._lock:
+            session = self._sessions.pop(ip, None)
+        if session is not None:
+            session.close()
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+SESSIONS = SessionManager()
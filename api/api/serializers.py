@@ -1,17 +1,32 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Switch, Reservation, Port
+from .models import Switch, Reservation, Port, Job
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
-        fields = '__all__'
+        fields = ['id', 'username', 'password', 'is_staff']
+        extra_kwargs = {
+            'password': {'write_only': True},
+            'is_staff': {'read_only': True},
+        }
 
 
 class SwitchSerializer(serializers.ModelSerializer):
     class Meta:
         model = Switch
-        fields = '__all__'
+        fields = ['id', 'mngt_IP', 'model', 'console', 'part_number', 'hardware_revision', 'serial_number']
+
+
+class SwitchHealthSerializer(SwitchSerializer):
+    """Switch with the stored health of its management IP (see health.with_health)."""
+    reachable = serializers.BooleanField(read_only=True, allow_null=True)
+    latency_ms = serializers.FloatField(read_only=True, allow_null=True)
+    last_seen = serializers.DateTimeField(read_only=True, allow_null=True)
+    health_checked_at = serializers.DateTimeField(read_only=True, allow_null=True)
+
+    class Meta(SwitchSerializer.Meta):
+        fields = SwitchSerializer.Meta.fields + ['reachable', 'latency_ms', 'last_seen', 'health_checked_at']
 
 
 class ReservationSerializer(serializers.ModelSerializer):
@@ -22,4 +37,26 @@ class ReservationSerializer(serializers.ModelSerializer):
 class PortSerializer(serializers.ModelSerializer):
     class Meta:
         model = Port
-        fields = '__all__'
\ No newline at end of file
+        fields = ['id', 'switch', 'port_switch', 'backbone', 'port_backbone', 'svlan', 'status']
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'status', 'detail', 'result', 'created_at', 'started_at', 'finished_at']
+
+
+def values_of(queryset, serializer_class, fields=None, evaluate=True):
+    """
+    Reads the fields of a serializer straight from the database as dicts.
+    Equivalent to serializer_class(queryset, many=True).data for flat models
+    (foreign keys come out as ids), without instantiating model objects.
+    Write-only fields are left out.
+
+    Args:
+        fields (list): Optional subset of the serializer fields to read.
+        evaluate (bool): Return a list (default) or the lazy values() queryset.
+    """
+    meta = serializer_class.Meta
+    write_only = {name for name, kwargs in getattr(meta, 'extra_kwargs', {}).items() if kwargs.get('write_only')}
+    values = queryset.values(*[field for field in (fields or meta.fields) if field not in write_only])
+    return list(values) if evaluate else values
@@ -0,0 +1,27 @@
+"""
+Signal handlers feeding the inventory change log (models.Change) and waking
+the cleanup daemon when a reservation changes.
+"""
+from django.db.models.signals import post_save, post_delete
+
+from .models import Switch, Port, Reservation, TopologyShare, Change
+from .expiry import notify_reservation_change
+
+TRACKED_MODELS = (Switch, Port, Reservation, TopologyShare)
+
+
+def record_change(sender, instance, **kwargs):
+    Change.record(sender, [instance.pk])
+
+
+def reservation_changed(sender, instance, **kwargs):
+    # An end_date may have moved: let the cleanup daemon reschedule
+    notify_reservation_change()
+
+
+for tracked in TRACKED_MODELS:
+    post_save.connect(record_change, sender=tracked, dispatch_uid=f'change_save_{tracked.__name__}')
+    post_delete.connect(record_change, sender=tracked, dispatch_uid=f'change_delete_{tracked.__name__}')
+
+post_save.connect(reservation_changed, sender=Reservation, dispatch_uid='expiry_save')
+post_delete.connect(reservation_changed, sender=Reservation, dispatch_uid='expiry_delete')
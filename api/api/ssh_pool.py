@@ -0,0 +1,246 @@
+"""
+Persistent SSH connections to the switches and backbones.
+
+Opening a paramiko.SSHClient costs a TCP connect, a key exchange and a
+password authentication. Banner updates, cleanups and the management
+commands often talk to the same device several times in a row, so
+authenticated connections are kept open and handed out again:
+
+- connections are keyed by (host, port, username) and used by one thread at
+  a time; at most SSH_MAX_PER_HOST are open per key, further callers wait;
+- an idle connection is checked before being reused and closed after
+  SSH_IDLE_TIMEOUT seconds without use;
+- a connection is dropped when the code using it raises, or when it calls
+  discard() (e.g. after a reload);
+- new connections go through the circuit breaker of the host (breaker.py):
+  an unreachable device fails fast with CircuitOpen instead of waiting for
+  the connect timeout.
+
+The pool is a process-wide singleton (SSH_POOL), like the HTTPS sessions of
+rest_sessions.SESSIONS.
+"""
+import socket
+import threading
+import time
+import logging
+from contextlib import contextmanager
+
+import paramiko
+
+from .breaker import BREAKERS, CircuitOpen
+
+logger = logging.getLogger(__name__)
+
+# Connections kept open per (host, port, username)
+SSH_MAX_PER_HOST = 2
+# Seconds an unused connection stays open
+SSH_IDLE_TIMEOUT = 60
+# Seconds a caller waits for a busy host before giving up
+SSH_WAIT_TIMEOUT = 30
+
+
+class SSHPoolExhausted(paramiko.SSHException):
+    """Raised when every connection to a host stayed busy for SSH_WAIT_TIMEOUT seconds."""
+
+
+class PooledSSH:
+    """
+    Authenticated SSH connection lent by the pool.
+
+    Attributes:
+        client (paramiko.SSHClient): The underlying client.
+    """
+    def __init__(self, key: tuple, client: paramiko.SSHClient):
+        self.key = key
+        self.client = client
+        self.last_used = time.monotonic()
+        self.broken = False
+        self._sftp = None
+
+    def exec_command(self, command: str, **kwargs):
+        """Same as paramiko.SSHClient.exec_command, on a new channel of the connection."""
+        return self.client.exec_command(command, **kwargs)
+
+    def sftp(self) -> paramiko.SFTPClient:
+        """
+        Returns the SFTP session of the connection, opened on first use and
+        kept with it. Don't close it.
+        """
+        if self._sftp is None:
+            self._sftp = self.client.open_sftp()
+        return self._sftp
+
+    def discard(self):
+        """Closes the connection instead of returning it to the pool."""
+        self.broken = True
+
+    def alive(self) -> bool:
+        transport = self.client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        try:
+            if self._sftp is not None:
+                self._sftp.close()
+        finally:
+            self.client.close()
+
+
+class _Host:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.idle = []
+        self.open = 0
+
+
+class SSHPool:
+    """
+    Thread-safe pool of SSH connections, keyed by (host, port, username).
+    """
+    def __init__(self, max_per_host: int = SSH_MAX_PER_HOST, idle_timeout: float = SSH_IDLE_TIMEOUT,
+                 wait_timeout: float = SSH_WAIT_TIMEOUT):
+        self.max_per_host = max_per_host
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    @contextmanager
+    def connection(self, host: str, username: str, password: str, port: int = 22, timeout: float = 5):
+        """
+        Lends a connection to a device for the duration of a with block.
+
+        Args:
+            host (str): IP address of the device.
+            username (str): SSH username.
+            password (str): SSH password, used when a new connection is opened.
+            port (int): SSH port.
+            timeout (float): Connect/authentication timeout of a new connection.
+
+        Yields:
+            PooledSSH: The connection.
+
+        Raises:
+            SSHPoolExhausted: If the host stayed busy for wait_timeout seconds.
+            paramiko.SSHException, OSError: If the connection can't be opened
+                (CircuitOpen if the device is known to be unreachable).
+        """
+        conn = self._acquire((host, port, username), password, timeout)
+        try:
+            yield conn
+        except Exception:
+            conn.discard()
+            raise
+        finally:
+            self._release(conn)
+
+    def _host(self, key: tuple) -> _Host:
+        with self._lock:
+            entry = self._hosts.get(key)
+            if entry is None:
+                entry = self._hosts[key] = _Host()
+            if self._reaper is None or not self._reaper.is_alive():
+                self._reaper = threading.Thread(target=self._reap, name='ssh-pool-reaper', daemon=True)
+                self._reaper.start()
+            return entry
+
+    def _acquire(self, key: tuple, password: str, timeout: float) -> PooledSSH:
+        entry = self._host(key)
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            conn = None
+            with entry.cond:
+                if entry.idle:
+                    conn = entry.idle.pop()
+                elif entry.open < self.max_per_host:
+                    entry.open += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise SSHPoolExhausted(f"No SSH connection to {key[0]} available after {self.wait_timeout}s")
+                    entry.cond.wait(remaining)
+                    continue
+
+            if conn is None:
+                return self._open(key, entry, password, timeout)
+            if time.monotonic() - conn.last_used < self.idle_timeout and conn.alive():
+                return conn
+            # Stale connection: close it and try again
+            self._drop(conn, entry)
+
+    def _open(self, key: tuple, entry: _Host, password: str, timeout: float) -> PooledSSH:
+        host, port, username = key
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        try:
+            BREAKERS.before(host)
+            client.connect(host, username=username, password=password, port=port, timeout=timeout,
+                           banner_timeout=timeout, auth_timeout=timeout)
+        except Exception as e:
+            client.close()
+            with entry.cond:
+                entry.open -= 1
+                entry.cond.notify()
+            # A refused login proves the switch is up
+            if isinstance(e, paramiko.AuthenticationException):
+                BREAKERS.success(host)
+            elif isinstance(e, (OSError, paramiko.SSHException)) and not isinstance(e, CircuitOpen):
+                BREAKERS.failure(host, e)
+            raise
+        BREAKERS.success(host)
+        # Commands and SFTP writes are small packets: don't let Nagle hold them back
+        client.get_transport().sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        logger.info(f"Opened SSH connection to {host}")
+        return PooledSSH(key, client)
+
+    def _release(self, conn: PooledSSH):
+        entry = self._host(conn.key)
+        if conn.broken:
+            self._drop(conn, entry)
+            return
+        conn.last_used = time.monotonic()
+        with entry.cond:
+            entry.idle.append(conn)
+            entry.cond.notify()
+
+    def _drop(self, conn: PooledSSH, entry: _Host):
+        try:
+            conn.close()
+        except Exception as e:
+            logger.warning(f"Error while closing SSH connection to {conn.key[0]}: {e}")
+        with entry.cond:
+            entry.open -= 1
+            entry.cond.notify()
+
+    def _reap(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 2, 1))
+            self.close_idle(self.idle_timeout)
+
+    def close_idle(self, older_than: float = 0):
+        """
+        Closes the idle connections unused for more than `older_than` seconds.
+        """
+        with self._lock:
+            entries = list(self._hosts.values())
+        now = time.monotonic()
+        for entry in entries:
+            with entry.cond:
+                expired = [conn for conn in entry.idle if now - conn.last_used >= older_than]
+                entry.idle = [conn for conn in entry.idle if conn not in expired]
+            for conn in expired:
+                self._drop(conn, entry)
+
+    def close_all(self):
+        """Closes every idle connection."""
+        self.close_idle()
+
+
+SSH_POOL = SSHPool()
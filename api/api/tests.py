@@ -0,0 +1,1397 @@
+import io
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from .models import (
+    Change, Switch, Reservation, Port, TopologyShare, Job, Svlan, SvlanPoolExhausted, DeviceCircuit, DeviceHealth,
+    APIRequestError, cli_batch, expand_port_range, parse_vlan_snapshot,
+)
+from .breaker import BreakerRegistry, CircuitOpen
+from .config_cache import VlanConfigCache
+from .topology import build_topology
+from .changes import delta, needs_resync
+from .health import with_health
+from .reconcile import reconcile_backbone, reconcile_ports
+from .reservations import _release_groups
+from .interfaces import parse_admin_states, compress_ports, diff_states, state_commands
+from .management.commands.populate_ports import Command as PopulatePorts
+from . import device_async, events, health, jobs
+
+
+def make_lab(user, switches, ports_per_switch=2, backbone='10.1.0.1'):
+    """
+    Creates `switches` switches reserved by `user`, each with `ports_per_switch`
+    ports. Consecutive switches are linked port to port, so every switch but
+    the last has one linked port.
+
+    Returns:
+        list: The created ports, switch by switch.
+    """
+    ports = []
+    for i in range(switches):
+        switch = Switch.objects.create(model='OS6900', mngt_IP=f'10.0.{user.id}.{i}')
+        Reservation.objects.create(switch=switch, user=user)
+        ports += [Port(switch=switch, port_switch=f'1/1/{j + 1}', backbone=backbone,
+                       port_backbone=f'1/{i + 1}/{j + 1}') for j in range(ports_per_switch)]
+    for i in range(switches - 1):
+        # Port 0 of switch i+1 is linked to port 1 of switch i
+        ports[i * ports_per_switch + 1].svlan = ports[(i + 1) * ports_per_switch].svlan = 1001 + i
+    return Port.objects.bulk_create(ports)
+
+
+class ConcurrentReserveTest(TransactionTestCase):
+    """
+    Many users reserving the same switches at the same time: every switch
+    must end up with exactly one reservation (201), the other requests
+    getting a conflict (409).
+
+    Meant for the project database (PostgreSQL). SQLite ignores
+    select_for_update and refuses a write while another transaction holds the
+    table instead of waiting; such requests are sent again.
+    """
+    USERS = 8
+    SWITCHES = 4
+    ROUNDS = 3
+    SQLITE_RETRIES = 50
+
+    def setUp(self):
+        self.tokens = [Token.objects.create(user=User.objects.create(username=f'user{i}')).key
+                       for i in range(self.USERS)]
+        self.switches = [Switch.objects.create(model='OS6900', mngt_IP=f'10.0.0.{i}')
+                         for i in range(self.SWITCHES)]
+
+    def reserve_all(self, token, barrier, statuses, lock):
+        client = APIClient(SERVER_NAME='localhost')
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        try:
+            barrier.wait()
+            for switch in self.switches:
+                status_code = self.reserve(client, switch)
+                with lock:
+                    statuses[switch.id].append(status_code)
+        finally:
+            connection.close()
+
+    def reserve(self, client, switch):
+        retried = False
+        for attempt in range(self.SQLITE_RETRIES):
+            try:
+                response = client.post('/api/reserve/', {'switch': switch.id}, format='json')
+            except OperationalError as e:
+                if connection.vendor != 'sqlite' or 'locked' not in str(e):
+                    raise
+                retried = True
+                time.sleep(0.01 * (attempt + 1))
+                continue
+            # SQLite may report the lock after the row was written: the retry
+            # then finds the reservation of this very user
+            if retried and response.data == {"warning": "You have already reserved this switch."}:
+                return 201
+            return response.status_code
+        self.fail(f"Switch {switch.id} still locked after {self.SQLITE_RETRIES} attempts")
+
+    def test_no_double_booking(self):
+        # Banners are written by the job worker, not by this test
+        with mock.patch('api.reservations.jobs.queue_banner'):
+            for _ in range(self.ROUNDS):
+                statuses = {switch.id: [] for switch in self.switches}
+                lock = threading.Lock()
+                barrier = threading.Barrier(self.USERS)
+                threads = [threading.Thread(target=self.reserve_all, args=(token, barrier, statuses, lock))
+                           for token in self.tokens]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+                for switch in self.switches:
+                    self.assertEqual(Counter(statuses[switch.id]), Counter({201: 1, 409: self.USERS - 1}))
+                    self.assertEqual(Reservation.objects.filter(switch=switch).count(), 1)
+                Reservation.objects.all().delete()
+
+
+class TopologyQueryTest(TestCase):
+    """
+    The topology of a user is read with one query, whatever its size.
+    """
+    def setUp(self):
+        self.owner = User.objects.create(username='owner')
+        self.viewer = User.objects.create(username='viewer')
+        TopologyShare.objects.create(owner=self.owner, target=self.viewer)
+        self.client = APIClient(SERVER_NAME='localhost')
+
+    def test_single_switch(self):
+        make_lab(self.owner, 1)
+        with self.assertNumQueries(1):
+            topology = build_topology(self.owner)
+        self.assertEqual(len(topology['switches']), 1)
+        self.assertEqual(len(topology['ports']), 2)
+        self.assertEqual(topology['connections'], [])
+
+    def test_many_switches(self):
+        make_lab(self.owner, 30, ports_per_switch=8)
+        with self.assertNumQueries(1):
+            topology = build_topology(self.owner)
+        self.assertEqual(len(topology['switches']), 30)
+        self.assertEqual(len(topology['ports']), 240)
+        self.assertEqual(len(topology['connections']), 29)
+        self.assertEqual({connection['svlan'] for connection in topology['connections']}, set(range(1001, 1030)))
+
+    def test_get_topology(self):
+        self.client.force_authenticate(self.owner)
+        for switches in (1, 20):
+            Switch.objects.all().delete()
+            make_lab(self.owner, switches)
+            with self.assertNumQueries(1):
+                response = self.client.get('/api/topology/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['connections']), switches - 1)
+
+    def test_get_shared_topology(self):
+        self.client.force_authenticate(self.viewer)
+        for switches in (1, 20):
+            Switch.objects.all().delete()
+            make_lab(self.owner, switches)
+            # Owner, share check, topology
+            with self.assertNumQueries(3):
+                response = self.client.get(f'/api/get_shared_topology/{self.owner.id}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['switches']), switches)
+
+
+class ListQueryCountTest(TestCase):
+    """
+    The list endpoints and the expired reservation cleanup run the same
+    number of queries for 10 rows as for 10k rows.
+    """
+    SIZES = (10, 10_000)
+
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.other = User.objects.create(username='other')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def add_switches(self, size):
+        # Rows are added on top of the previous size; bulk_create doesn't log changes
+        start = Switch.objects.count()
+        return Switch.objects.bulk_create([Switch(model='OS6900', mngt_IP=f'10.{i // 65536}.{i // 256 % 256}.{i % 256}')
+                                           for i in range(start, size)])
+
+    def add_ports(self, size):
+        Port.objects.bulk_create([Port(switch=switch, port_switch='1/1/1', backbone='10.1.0.1',
+                                       port_backbone=f'1/1/{switch.id}') for switch in self.add_switches(size)])
+
+    def add_reservations(self, size):
+        expired = timezone.now() - timedelta(hours=1)
+        Reservation.objects.bulk_create([Reservation(switch=switch, user=self.user, end_date=expired)
+                                         for switch in self.add_switches(size)])
+
+    def add_shares(self, size):
+        TopologyShare.objects.bulk_create([TopologyShare(owner=self.user, target=self.other)
+                                           for _ in range(size - TopologyShare.objects.count())])
+
+    def query_counts(self, seed, call):
+        counts = []
+        for size in self.SIZES:
+            seed(size)
+            with CaptureQueriesContext(connection) as queries:
+                call(size)
+            counts.append(len(queries))
+        return counts
+
+    def assert_flat(self, seed, url, key=None):
+        def call(size):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data[key] if key else response.data), size)
+        counts = self.query_counts(seed, call)
+        self.assertEqual(counts[0], counts[-1], f"{url} queries grow with rows: {counts}")
+
+    def test_list_reservation(self):
+        self.assert_flat(self.add_reservations, '/api/list_reservation/')
+
+    def test_list_port(self):
+        self.assert_flat(self.add_ports, '/api/list_port/', 'ports')
+
+    def test_list_shared_topologies(self):
+        self.assert_flat(self.add_shares, '/api/list_shared_topologies/', 'shared_by_me')
+
+    def test_cleanup_expired_reservations(self):
+        seen = []
+
+        def delete(reservation, username, cleanup_switch=False):
+            # The user and switch of every reservation come with the first query
+            seen.append((username, reservation.switch.mngt_IP))
+            return True
+
+        with mock.patch.object(Reservation, 'delete', delete):
+            counts = self.query_counts(self.add_reservations, lambda size: Reservation.cleanup_expired_reservations())
+        self.assertEqual(counts, [1, 1])
+        self.assertEqual(len(seen), self.SIZES[0] + self.SIZES[-1])
+
+
+class DisconnectGuardTest(TestCase):
+    """
+    A link can't be torn down while a job creating or deleting it is queued
+    or running.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        ports = make_lab(self.user, 2)
+        self.portA, self.portB = ports[1], ports[2]
+        self.other = ports[0]
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def disconnect(self):
+        return self.client.post('/api/disconnect/', {'portA': self.portA.id, 'portB': self.portB.id}, format='json')
+
+    def test_active_jobs_conflict(self):
+        payloads = {
+            'connect': {'portA': self.portA.id, 'portB': self.portB.id},
+            'connect_many': {'links': [{'portA': self.other.id, 'portB': 999},
+                                       {'portA': self.portB.id, 'portB': self.portA.id}]},
+            'disconnect': {'portA': self.portB.id, 'portB': self.portA.id},
+        }
+        for kind, payload in payloads.items():
+            for job_status in ('PENDING', 'RUNNING'):
+                with self.subTest(kind=kind, status=job_status):
+                    job = Job.objects.create(kind=kind, user=self.user, payload=payload, status=job_status)
+                    self.assertEqual(self.disconnect().status_code, 409)
+                    job.delete()
+
+    def test_other_jobs_dont_conflict(self):
+        Job.objects.create(kind='connect_many', user=self.user, status='PENDING',
+                           payload={'links': [{'portA': self.other.id, 'portB': 999}]})
+        Job.objects.create(kind='connect', user=self.user, status='SUCCEEDED',
+                           payload={'portA': self.portA.id, 'portB': self.portB.id})
+        response = self.disconnect()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Job.objects.get(id=response.data['job']).kind, 'disconnect')
+        # The teardown just queued blocks a second one
+        self.assertEqual(self.disconnect().status_code, 409)
+
+
+class FakeBackbone:
+    """
+    Stands for the CLI of the backbones: records the commands and fails the
+    ones listed in `failing`.
+    """
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.commands = []
+
+    def cli(self, ip, cmd, retries=3, delay=1.0):
+        self.commands.append(cmd)
+        if cmd in self.failing:
+            raise APIRequestError(f"{cmd} refused")
+        return ''
+
+    def cli_batch(self, ip, cmds, retries=3, delay=1.0):
+        with mock.patch('api.models.cli', self.cli):
+            return cli_batch(ip, cmds, retries, delay)
+
+
+class CliBatchTest(TestCase):
+    """
+    Command batches stop at the first failure, and a failed teardown only
+    keeps the links it affects.
+    """
+    def test_stops_at_first_failure(self):
+        backbone = FakeBackbone(failing=['b'])
+        with mock.patch('api.models.cli', backbone.cli):
+            results = cli_batch('10.1.0.1', ['a', 'b', 'c'])
+        self.assertEqual([result['status'] for result in results], ['ok', 'failed', 'skipped'])
+        self.assertEqual(results[1]['error'], 'b refused')
+        self.assertEqual(backbone.commands, ['a', 'b'])
+
+    def delete_links(self, failing):
+        user = User.objects.create(username='user')
+        ports = make_lab(user, 4)
+        Port.objects.update(status='UP')
+        links = [(ports[1], ports[2]), (ports[3], ports[4]), (ports[5], ports[6])]
+        backbone = FakeBackbone(failing=failing)
+        with mock.patch('api.models.cli_batch', backbone.cli_batch):
+            deleted = Port.delete_links(links, 'user')
+        return links, deleted, backbone
+
+    def test_delete_links(self):
+        links, deleted, backbone = self.delete_links(failing=[])
+        self.assertEqual(deleted, {1001, 1002, 1003})
+        self.assertEqual(set(Port.objects.filter(status='DOWN').values_list('id', flat=True)),
+                         {port.id for link in links for port in link})
+
+    def test_down_failure_keeps_only_affected_links(self):
+        # Stops at the first port of the second link (switch 2, port 2): the first link is down and deleted
+        links, deleted, backbone = self.delete_links(failing=['interfaces 1/2/2 admin-state disable'])
+        self.assertEqual(deleted, {1001})
+        self.assertIn('no ethernet-service svlan 1001', backbone.commands)
+        self.assertNotIn('no ethernet-service svlan 1002', backbone.commands)
+        self.assertEqual(set(Port.objects.filter(status='DOWN').values_list('id', flat=True)),
+                         {port.id for port in links[0]})
+
+    def test_unlink_failure_keeps_only_affected_links(self):
+        links, deleted, backbone = self.delete_links(failing=['no ethernet-service svlan 1002'])
+        self.assertEqual(deleted, {1001})
+
+
+class RecoverStaleJobsTest(TestCase):
+    """
+    Jobs left RUNNING by a dead worker are requeued (banners) or failed
+    (links), and a late outcome doesn't overwrite the recovery.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        ports = make_lab(self.user, 3)
+        self.link, self.other_link = (ports[1], ports[2]), (ports[3], ports[4])
+        Svlan.objects.bulk_create([Svlan(number=1001, in_use=True), Svlan(number=1002, in_use=True)])
+        self.started = timezone.now() - timedelta(seconds=jobs.JOB_TIMEOUT + 1)
+
+    def running(self, kind, payload, started=None):
+        return Job.objects.create(kind=kind, user=self.user, payload=payload, status='RUNNING',
+                                  started_at=started or self.started)
+
+    def svlans(self, link):
+        return [Port.objects.get(id=port.id).svlan for port in link]
+
+    def test_connect_jobs_give_back_their_svlan(self):
+        portA, portB = self.link
+        connect = self.running('connect', {'portA': portA.id, 'portB': portB.id})
+        portA, portB = self.other_link
+        connect_many = self.running('connect_many', {'links': [{'portA': portA.id, 'portB': portB.id}]})
+
+        self.assertEqual(jobs.recover_stale_jobs(), [connect.id, connect_many.id])
+        for job in (connect, connect_many):
+            job.refresh_from_db()
+            self.assertEqual(job.status, 'FAILED')
+            self.assertIsNotNone(job.finished_at)
+        self.assertEqual(self.svlans(self.link) + self.svlans(self.other_link), [None] * 4)
+        self.assertFalse(Svlan.objects.filter(in_use=True).exists())
+
+    def test_disconnect_job_keeps_the_link(self):
+        portA, portB = self.link
+        job = self.running('disconnect', {'portA': portA.id, 'portB': portB.id})
+        self.assertEqual(jobs.recover_stale_jobs(), [job.id])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertEqual(self.svlans(self.link), [1001, 1001])
+
+    def test_banner_job_is_requeued(self):
+        job = self.running('banner', {'switch': self.link[0].switch_id})
+        jobs.recover_stale_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'PENDING')
+        self.assertEqual(jobs.claim_jobs(10), [job.id])
+
+    def test_recent_jobs_are_left_running(self):
+        portA, portB = self.link
+        job = self.running('connect', {'portA': portA.id, 'portB': portB.id}, started=timezone.now())
+        self.assertEqual(jobs.recover_stale_jobs(), [])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'RUNNING')
+        self.assertEqual(self.svlans(self.link), [1001, 1001])
+
+    def test_late_outcome_is_ignored(self):
+        portA, portB = self.link
+        job = self.running('disconnect', {'portA': portA.id, 'portB': portB.id})
+
+        def handler(job):
+            # The worker is considered dead while the handler still runs
+            jobs.recover_stale_jobs()
+            return True, "Ports disconnected successfully."
+
+        with mock.patch.dict(jobs.HANDLERS, {'disconnect': handler}), mock.patch.object(jobs.connection, 'close'):
+            jobs.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertTrue(job.detail.startswith('Abandoned'))
+
+
+class InterfaceStatesTest(SimpleTestCase):
+    """
+    Port ranges and state diffs of the bulk admin-state push.
+    """
+    def test_compress_ports(self):
+        self.assertEqual(compress_ports([]), [])
+        self.assertEqual(compress_ports(['1/1/3']), ['1/1/3'])
+        self.assertEqual(compress_ports(['1/1/2', '1/1/1', '1/1/3', '1/1/3']), ['1/1/1-3'])
+        # Numeric order, gaps, and no range across slots
+        self.assertEqual(compress_ports(['1/1/10', '1/1/9', '1/1/12', '1/1/48', '1/2/1', '1/2/2']),
+                         ['1/1/9-10', '1/1/12', '1/1/48', '1/2/1-2'])
+        self.assertEqual(compress_ports([f'1/{ni}/{port}' for ni in range(1, 9) for port in range(1, 49)]),
+                         [f'1/{ni}/1-48' for ni in range(1, 9)])
+
+    def test_compress_ports_inverts_expand_port_range(self):
+        ports = ['1/1/1', '1/1/2', '1/1/5', '1/3/7', '1/3/8', '1/3/9']
+        self.assertEqual([port for port_range in compress_ports(ports) for port in expand_port_range(port_range)],
+                         ports)
+
+    def test_diff_states(self):
+        desired = {'1/1/1': 'UP', '1/1/2': 'UP', '1/1/3': 'DOWN', '1/1/4': 'DOWN'}
+        current = {'1/1/1': 'UP', '1/1/2': 'DOWN', '1/1/3': 'DOWN'}
+        # 1/1/4 isn't reported by the device: always pushed
+        self.assertEqual(diff_states(desired, current), {'UP': ['1/1/2'], 'DOWN': ['1/1/4']})
+        self.assertEqual(diff_states(desired, desired), {})
+
+    def test_state_commands(self):
+        changes = {'UP': ['1/1/1', '1/1/2', '1/1/3'], 'DOWN': ['1/2/4']}
+        self.assertEqual(state_commands(changes), ['interfaces 1/1/1-3 admin-state enable',
+                                                   'interfaces 1/2/4 admin-state disable'])
+
+    def test_parse_admin_states(self):
+        output = """
+Chas/ Admin Auto  Speed   Duplex Pause Trfc
+Slot/ Status Nego  (Mbps)
+Port
+-------+------+----+--------+------+-----+-----
+  1/1/1    en    en     Auto   Auto    -    -
+  1/1/2   dis    en     Auto   Auto    -    -
+"""
+        self.assertEqual(parse_admin_states(output), {'1/1/1': 'UP', '1/1/2': 'DOWN'})
+
+
+class PushPortStatesTest(SimpleTestCase):
+    """
+    populate_ports only pushes the ports whose state differs, as ranges.
+    """
+    def test_push_port_states(self):
+        sent = []
+
+        def exec_command(command):
+            sent.append(command)
+            stdout = mock.Mock()
+            stdout.channel.recv_exit_status.return_value = 0
+            stdout.read.return_value = b"  1/1/1    en\n  1/1/2    en\n  1/1/3   dis\n  1/1/4   dis\n"
+            return mock.Mock(), stdout, mock.Mock()
+
+        command = PopulatePorts(stdout=io.StringIO())
+        desired = {'1/1/1': 'UP', '1/1/2': 'DOWN', '1/1/3': 'DOWN', '1/1/4': 'UP', '1/1/5': 'UP'}
+        self.assertTrue(command.push_port_states(mock.Mock(exec_command=exec_command), desired))
+        self.assertEqual(sent, ['show interfaces status', 'interfaces 1/1/2 admin-state disable',
+                                'interfaces 1/1/4-5 admin-state enable'])
+        self.assertIn('3/5 ports changed, 2 left unchanged: 3 command(s) sent instead of 5',
+                      command.stdout.getvalue())
+
+
+SNAPSHOT = """
+ethernet-service svlan 1001 admin-state enable
+ethernet-service service-name user_1001 svlan 1001
+ethernet-service sap 1001 service-name user_1001
+ethernet-service sap 1001 uni port 1/1/1
+ethernet-service sap 1001 uni port 1/1/2
+ethernet-service sap 1001 cvlan all
+ethernet-service sap 1002 service-name user_1002
+ethernet-service sap 1002 uni port 1/2/3-5
+ethernet-service sap 10021 uni port 1/3/1
+"""
+
+
+class VlanSnapshotTest(SimpleTestCase):
+    """
+    Parsing and caching of the backbone VLAN configuration used to verify links.
+    """
+    def test_parse_vlan_snapshot(self):
+        index = parse_vlan_snapshot(SNAPSHOT)
+        self.assertEqual(set(index), {'1001', '1002', '10021'})
+        self.assertEqual(len(index['1001']), 4)
+        # Port ranges count as one line per port
+        self.assertEqual(index['1002'], ['ethernet-service sap 1002 service-name user_1002',
+                                         'ethernet-service sap 1002 uni port 1/2/3',
+                                         'ethernet-service sap 1002 uni port 1/2/4',
+                                         'ethernet-service sap 1002 uni port 1/2/5'])
+        self.assertEqual(parse_vlan_snapshot(''), {})
+
+    def test_expand_port_range(self):
+        self.assertEqual(expand_port_range('1/1/1-3'), ['1/1/1', '1/1/2', '1/1/3'])
+        self.assertEqual(expand_port_range('1/1/7'), ['1/1/7'])
+
+    def test_cache_serves_until_invalidated(self):
+        cache = VlanConfigCache(ttl=60)
+        fetch = mock.Mock(side_effect=lambda: parse_vlan_snapshot(SNAPSHOT))
+        self.assertIs(cache.get('10.1.0.1', fetch), cache.get('10.1.0.1', fetch))
+        self.assertEqual(fetch.call_count, 1)
+        cache.get('10.1.0.2', fetch)
+        self.assertEqual(fetch.call_count, 2)
+        cache.invalidate('10.1.0.1')
+        cache.get('10.1.0.1', fetch)
+        self.assertEqual(fetch.call_count, 3)
+
+    def test_cache_expires(self):
+        cache = VlanConfigCache(ttl=0)
+        fetch = mock.Mock(return_value={})
+        cache.get('10.1.0.1', fetch)
+        cache.get('10.1.0.1', fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_concurrent_gets_share_one_fetch(self):
+        cache = VlanConfigCache(ttl=60)
+        started, release = threading.Event(), threading.Event()
+
+        def fetch():
+            started.set()
+            release.wait(5)
+            return parse_vlan_snapshot(SNAPSHOT)
+        fetch = mock.Mock(side_effect=fetch)
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get('10.1.0.1', fetch))) for _ in range(5)]
+        threads[0].start()
+        started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(len(results), 5)
+
+    def test_failed_fetch_is_not_cached(self):
+        cache = VlanConfigCache(ttl=60)
+        with self.assertRaises(APIRequestError):
+            cache.get('10.1.0.1', mock.Mock(side_effect=APIRequestError()))
+        self.assertEqual(cache.get('10.1.0.1', lambda: {'1001': []}), {'1001': []})
+
+    def test_verify_links(self):
+        with mock.patch('api.models.VLAN_CONFIG', VlanConfigCache(ttl=60)), \
+                mock.patch('api.models.cli', return_value=SNAPSHOT) as cli:
+            self.assertEqual(Port.verify_links('10.1.0.1', [1001, 1002, 1003]), {1001, 1002})
+            self.assertEqual(cli.call_count, 1)
+            # A failed verification drops the snapshot: the next one refetches
+            Port.verify_links('10.1.0.1', [1001])
+            self.assertEqual(cli.call_count, 2)
+
+
+class ListFilterPaginationTest(TestCase):
+    """
+    Filters, field projection and cursor pagination of list_port and list_switch.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.ports = make_lab(self.user, 3, ports_per_switch=4)
+        Port.objects.filter(id__in=[port.id for port in self.ports[:6]]).update(status='UP')
+        self.free_switch = Switch.objects.create(model='OS2360', mngt_IP='10.0.9.9')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def ids(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['ports' if 'port' in url else 'switchs']]
+
+    def test_port_filters(self):
+        ports = self.ports
+        self.assertEqual(self.ids(f'/api/list_port/?switch={ports[0].switch_id}'), [port.id for port in ports[:4]])
+        self.assertEqual(self.ids('/api/list_port/?status=UP'), [port.id for port in ports[:6]])
+        self.assertEqual(self.ids('/api/list_port/?free=false'), [ports[1].id, ports[4].id, ports[5].id, ports[8].id])
+        self.assertEqual(self.ids('/api/list_port/?svlan=1002'), [ports[5].id, ports[8].id])
+        self.assertEqual(self.ids('/api/list_port/?status=UP&free=true'),
+                         [ports[0].id, ports[2].id, ports[3].id])
+        self.assertEqual(self.client.get('/api/list_port/?switch=abc').status_code, 400)
+
+    def test_switch_filters(self):
+        self.assertEqual(self.ids('/api/list_switch/?free=true'), [self.free_switch.id])
+        self.assertEqual(len(self.ids('/api/list_switch/?free=false')), 3)
+        self.assertEqual(self.ids('/api/list_switch/?model=OS2360'), [self.free_switch.id])
+
+    def test_fields(self):
+        response = self.client.get('/api/list_port/?fields=svlan,status')
+        self.assertEqual(set(response.data['ports'][0]), {'id', 'svlan', 'status'})
+        response = self.client.get('/api/list_port/?fields=svlan,password')
+        self.assertEqual(response.status_code, 400)
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get('/api/list_port/')
+        self.assertEqual(len(response.data['ports']), 12)
+        self.assertIsNone(response.data['next'])
+
+    def test_cursor_pagination(self):
+        ids, url = [], '/api/list_port/?page_size=5&fields=id'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['ports']), 5)
+            ids += [row['id'] for row in response.data['ports']]
+            url = response.data['next']
+        self.assertEqual(ids, [port.id for port in self.ports])
+
+
+@mock.patch('api.changes.SETTLE_SECONDS', 0)
+class ChangeLogTest(TestCase):
+    """
+    Conditional GETs of the inventory lists and the delta feed.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.switch = Switch.objects.create(model='OS6900', mngt_IP='10.0.0.1')
+            self.port = Port.objects.create(switch=self.switch, port_switch='1/1/1', backbone='10.1.0.1',
+                                            port_backbone='1/1/1')
+
+    def test_not_modified(self):
+        response = self.client.get('/api/list_port/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag, modified = response['ETag'], response['Last-Modified']
+
+        self.assertEqual(self.client.get('/api/list_port/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/api/list_port/', HTTP_IF_MODIFIED_SINCE=modified).status_code, 304)
+
+        # A reservation change doesn't touch the ports
+        with self.captureOnCommitCallbacks(execute=True):
+            Reservation.objects.create(switch=self.switch, user=self.user)
+        self.assertEqual(self.client.get('/api/list_port/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get('/api/list_reservation/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Port.objects.filter(id=self.port.id).update(status='UP')
+            Change.record(Port, [self.port.id])
+        response = self.client.get('/api/list_port/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_change_not_visible_before_commit(self):
+        version = Change.latest(Port)
+        Change.record(Port, [self.port.id])
+        self.assertEqual(Change.latest(Port), version)
+
+    def test_delta(self):
+        since = self.client.get('/api/changes/').data['version']
+        self.assertEqual(delta(self.user, since)['ports'], [])
+
+        other = User.objects.create(username='other')
+        with self.captureOnCommitCallbacks(execute=True):
+            Port.objects.filter(id=self.port.id).update(svlan=1001)
+            Change.record(Port, [self.port.id])
+            deleted = Switch.objects.create(model='OS6900', mngt_IP='10.0.0.2').id
+            Switch.objects.filter(id=deleted).delete()
+            TopologyShare.objects.create(owner=self.user, target=other)
+            TopologyShare.objects.create(owner=other, target=User.objects.create(username='third'))
+
+        response = self.client.get(f'/api/changes/?since={since}')
+        self.assertEqual(response.status_code, 200)
+        result = response.data
+        self.assertEqual([(port['id'], port['svlan']) for port in result['ports']], [(self.port.id, 1001)])
+        self.assertEqual(result['switchs'], [])
+        self.assertEqual(result['deleted']['switchs'], [deleted])
+        # Only the shares of the user
+        self.assertEqual([share['target_id'] for share in result['topology_shares']], [other.id])
+        self.assertGreater(result['version'], since)
+        self.assertEqual(delta(self.user, result['version'])['ports'], [])
+
+    def test_needs_resync(self):
+        latest = Change.objects.order_by('-id').first().id
+        self.assertFalse(needs_resync(latest))
+        self.assertTrue(needs_resync(latest + 1))
+        Change.objects.filter(id__lt=latest).delete()
+        self.assertFalse(needs_resync(latest - 1))
+        self.assertTrue(needs_resync(latest - 2))
+        self.assertEqual(self.client.get(f'/api/changes/?since={latest - 2}').status_code, 410)
+        self.assertEqual(self.client.get('/api/changes/?since=abc').status_code, 400)
+        Change.objects.all().delete()
+        self.assertFalse(needs_resync(0))
+        self.assertTrue(needs_resync(latest))
+
+
+@mock.patch.object(jobs.connection, 'close')
+class BannerJobTest(TestCase):
+    """
+    Banner writes are queued once per switch and retried with a backoff.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.switch = Switch.objects.create(model='OS6900', mngt_IP='10.0.0.1')
+
+    def test_pending_banner_is_reused(self, close):
+        job = jobs.queue_banner(self.switch, self.user)
+        self.assertEqual(jobs.queue_banner(self.switch, self.user), job)
+        other = Switch.objects.create(model='OS6900', mngt_IP='10.0.0.2')
+        self.assertNotEqual(jobs.queue_banner(other, self.user), job)
+        # Once a worker runs it, a new change needs a new write
+        jobs.claim_jobs(10)
+        self.assertNotEqual(jobs.queue_banner(self.switch, self.user), job)
+
+    def test_banner_text(self, close):
+        Reservation.objects.create(switch=self.switch, user=self.user)
+        self.assertIn('This switch is reserved by : user', self.switch.banner_text())
+        Reservation.objects.all().delete()
+        self.assertIn('This switch is reserved by : nobody', self.switch.banner_text())
+
+    def test_failed_write_is_retried(self, close):
+        job = jobs.queue_banner(self.switch, self.user)
+        with mock.patch.object(Switch, 'changeBanner', return_value=False):
+            for attempt in range(jobs.JOB_RETRIES):
+                Job.objects.filter(id=job.id).update(run_after=None)
+                self.assertEqual(jobs.claim_jobs(10), [job.id])
+                jobs.run_job(job.id)
+                job.refresh_from_db()
+                self.assertEqual((job.status, job.attempts), ('PENDING', attempt + 1))
+                delay = min(jobs.RETRY_BASE_DELAY * 2 ** attempt, jobs.RETRY_MAX_DELAY)
+                self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), delay, delta=5)
+                # Not claimed before its backoff
+                self.assertEqual(jobs.claim_jobs(10), [])
+
+            Job.objects.filter(id=job.id).update(run_after=None)
+            jobs.claim_jobs(10)
+            jobs.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertIn('gave up', job.detail)
+
+    def test_successful_write(self, close):
+        job = jobs.queue_banner(self.switch, self.user)
+        jobs.claim_jobs(10)
+        with mock.patch.object(Switch, 'changeBanner', return_value=True) as change_banner:
+            jobs.run_job(job.id)
+        change_banner.assert_called_once()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'SUCCEEDED')
+
+    def test_deleted_switch_is_skipped(self, close):
+        job = jobs.queue_banner(self.switch, self.user)
+        Switch.objects.filter(id=self.switch.id).delete()
+        jobs.claim_jobs(10)
+        jobs.run_job(job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'SUCCEEDED')
+
+
+class BulkReservationTest(TestCase):
+    """
+    reserve_bulk and release_bulk accept or reject a request as a whole.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.other = User.objects.create(username='other')
+        self.switches = [Switch.objects.create(model='OS6900', mngt_IP=f'10.0.0.{i}') for i in range(3)]
+        self.ids = [switch.id for switch in self.switches]
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def post(self, url, switches, **data):
+        return self.client.post(url, {'switches': switches, **data}, format='json')
+
+    def test_reserve_all(self):
+        response = self.post('/api/reserve_bulk/', self.ids + [self.ids[0]], end_date='2030-01-01T00:00:00Z')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([result['switch'] for result in response.data['results']], self.ids)
+        self.assertEqual(Reservation.objects.filter(user=self.user, end_date__isnull=False).count(), 3)
+        self.assertEqual(Job.objects.filter(kind='banner').count(), 3)
+
+    def test_conflict_reserves_nothing(self):
+        Reservation.objects.create(switch=self.switches[1], user=self.other)
+        Reservation.objects.create(switch=self.switches[2], user=self.user)
+        response = self.post('/api/reserve_bulk/', self.ids)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['available', 'unavailable', 'already_reserved'])
+        self.assertFalse(Reservation.objects.filter(switch=self.switches[0]).exists())
+
+    def test_unknown_switch_reserves_nothing(self):
+        response = self.post('/api/reserve_bulk/', [self.ids[0], 999])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual([result['status'] for result in response.data['results']], ['ok', 'not_found'])
+        self.assertFalse(Reservation.objects.exists())
+
+    def test_invalid_requests(self):
+        for switches in ([], 'abc', [1, 'x'], list(range(101))):
+            with self.subTest(switches=switches):
+                self.assertEqual(self.post('/api/reserve_bulk/', switches).status_code, 400)
+                self.assertEqual(self.post('/api/release_bulk/', switches).status_code, 400)
+
+    def test_release_rejected_as_a_whole(self):
+        Reservation.objects.create(switch=self.switches[0], user=self.user)
+        Reservation.objects.create(switch=self.switches[1], user=self.other)
+        with mock.patch.object(Reservation, 'delete') as delete:
+            response = self.post('/api/release_bulk/', self.ids[:2])
+            self.assertEqual(response.status_code, 403)
+            self.assertEqual([result['status'] for result in response.data['results']], ['ok', 'forbidden'])
+            response = self.post('/api/release_bulk/', [self.ids[0], self.ids[2]])
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual([result['status'] for result in response.data['results']], ['ok', 'not_reserved'])
+        delete.assert_not_called()
+
+    def test_release_groups(self):
+        # Switches 0 and 1 share an SVLAN: released by the same worker
+        Port.objects.bulk_create([
+            Port(switch=self.switches[0], port_switch='1/1/1', backbone='10.1.0.1', port_backbone='1/1/1', svlan=1001),
+            Port(switch=self.switches[1], port_switch='1/1/1', backbone='10.1.0.1', port_backbone='1/1/2', svlan=1001),
+            Port(switch=self.switches[2], port_switch='1/1/1', backbone='10.1.0.1', port_backbone='1/1/3'),
+        ])
+        self.assertEqual(sorted(_release_groups(self.ids)), [self.ids[:2], [self.ids[2]]])
+
+
+class BulkReleaseTest(TransactionTestCase):
+    """
+    Accepted bulk releases run on worker threads, each switch failing on its own.
+    """
+    def test_release(self):
+        user = User.objects.create(username='user')
+        owner = User.objects.create(username='owner')
+        TopologyShare.objects.create(owner=owner, target=user)
+        switches = [Switch.objects.create(model='OS6900', mngt_IP=f'10.0.0.{i}') for i in range(2)]
+        Reservation.objects.create(switch=switches[0], user=user)
+        Reservation.objects.create(switch=switches[1], user=owner)
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+
+        def delete(reservation, username, cleanup_switch=False):
+            return reservation.switch_id == switches[0].id
+
+        with mock.patch.object(Reservation, 'delete', delete):
+            response = client.post('/api/release_bulk/', {'switches': [switches[0].id, switches[1].id]},
+                                   format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']], ['released', 'failed'])
+        self.assertEqual(list(Job.objects.filter(kind='banner').values_list('payload__switch', flat=True)),
+                         [switches[0].id])
+
+
+@override_settings(SVLAN_RANGE=(1001, 1010))
+class SvlanPoolTest(TestCase):
+    """
+    SVLANs are taken lowest first, all or none, and never handed out twice.
+    """
+    def test_pool_is_filled_on_first_use(self):
+        self.assertEqual(Svlan.allocate_many(3), [1001, 1002, 1003])
+        self.assertEqual(Svlan.objects.count(), 10)
+
+    def test_ports_in_use_are_skipped(self):
+        user = User.objects.create(username='user')
+        make_lab(user, 3)
+        self.assertEqual(Svlan.allocate_many(2), [1003, 1004])
+
+    def test_successive_allocations_dont_overlap(self):
+        first = Svlan.allocate_many(4)
+        second = Svlan.allocate()
+        self.assertEqual(first + [second] + Svlan.allocate_many(5), list(range(1001, 1011)))
+
+    def test_exhaustion_allocates_nothing(self):
+        Svlan.allocate_many(8)
+        with self.assertRaises(SvlanPoolExhausted):
+            Svlan.allocate_many(3)
+        self.assertEqual(Svlan.objects.filter(in_use=False).count(), 2)
+        Svlan.allocate_many(2)
+        with self.assertRaises(SvlanPoolExhausted):
+            Svlan.allocate()
+
+    def test_release(self):
+        Svlan.allocate_many(3)
+        Svlan.release(1002, None)
+        self.assertEqual(Svlan.allocate_many(2), [1002, 1004])
+
+
+@override_settings(SVLAN_RANGE=(1001, 1040))
+class ConcurrentSvlanTest(TransactionTestCase):
+    """
+    Workers allocating at the same time get disjoint SVLANs, the losers of
+    the race on an exhausted pool getting none.
+    """
+    WORKERS = 8
+    COUNT = 6
+
+    def allocate(self, barrier, results):
+        try:
+            barrier.wait()
+            for attempt in range(50):
+                try:
+                    results.append(Svlan.allocate_many(self.COUNT))
+                    return
+                except SvlanPoolExhausted:
+                    return
+                except OperationalError as e:
+                    # SQLite has no skip_locked and refuses concurrent writers
+                    if connection.vendor != 'sqlite' or 'locked' not in str(e):
+                        raise
+                    time.sleep(0.01 * (attempt + 1))
+        finally:
+            connection.close()
+
+    def test_no_overlap(self):
+        Svlan.sync_pool()
+        results = []
+        barrier = threading.Barrier(self.WORKERS)
+        threads = [threading.Thread(target=self.allocate, args=(barrier, results)) for _ in range(self.WORKERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        allocated = [number for numbers in results for number in numbers]
+        # 40 SVLANs: 6 workers get 6 each, the other 2 get nothing
+        self.assertEqual(len(results), 40 // self.COUNT)
+        self.assertEqual(len(set(allocated)), len(allocated))
+        self.assertEqual(set(Svlan.objects.filter(in_use=True).values_list('number', flat=True)), set(allocated))
+
+
+@override_settings(SVLAN_RANGE=(1001, 1005))
+class ConnectManyTest(TestCase):
+    """
+    connect_many gives every link its own SVLAN and queues a single job, or
+    changes nothing.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        # 1001 to 1003 are used by the lab, 1004 and 1005 are left
+        self.free = [port for port in make_lab(self.user, 4, ports_per_switch=3) if port.svlan is None]
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+
+    def connect(self, *pairs):
+        links = [{'portA': portA.id, 'portB': portB.id} for portA, portB in pairs]
+        return self.client.post('/api/connect_many/', {'links': links}, format='json')
+
+    def svlans(self, ports):
+        return [Port.objects.get(id=port.id).svlan for port in ports]
+
+    def test_connect_many(self):
+        a, b, c, d = self.free[:4]
+        response = self.connect((a, b), (c, d))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.svlans([a, b, c, d]), [1004, 1004, 1005, 1005])
+        job = Job.objects.get(id=response.data['job'])
+        self.assertEqual((job.kind, job.payload), ('connect_many', {'links': [
+            {'portA': a.id, 'portB': b.id}, {'portA': c.id, 'portB': d.id}]}))
+
+    def test_not_enough_svlans(self):
+        response = self.connect(*zip(self.free[0:6:2], self.free[1:6:2]))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.svlans(self.free[:6]), [None] * 6)
+        self.assertFalse(Svlan.objects.filter(number__gte=1004, in_use=True).exists())
+        self.assertFalse(Job.objects.exists())
+
+    def test_linked_port_rejects_the_request(self):
+        a, b = self.free[:2]
+        response = self.connect((a, b), (self.free[2], Port.objects.exclude(svlan=None).first()))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.svlans([a, b]), [None, None])
+        self.assertFalse(Job.objects.exists())
+
+    def test_port_in_two_links(self):
+        a, b, c = self.free[:3]
+        self.assertEqual(self.connect((a, b), (b, c)).status_code, 400)
+
+
+class AsyncDisconnectTest(TestCase):
+    """
+    async_disconnect runs the teardown itself, recorded as a RUNNING job
+    that check_link sees from every process.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.token = Token.objects.create(user=self.user).key
+        ports = make_lab(self.user, 2)
+        self.portA, self.portB = ports[1], ports[2]
+        Svlan.objects.create(number=1001, in_use=True)
+
+    async def disconnect(self, token=None):
+        return await self.async_client.post(
+            '/api/async/disconnect/', {'portA': self.portA.id, 'portB': self.portB.id},
+            content_type='application/json', headers={'Authorization': f'Token {token or self.token}'})
+
+    async def svlans(self):
+        return [port.svlan async for port in Port.objects.filter(id__in=[self.portA.id, self.portB.id])]
+
+    @mock.patch('api.views.device_async.verify_links', new_callable=mock.AsyncMock, return_value={1001})
+    @mock.patch('api.views.device_async.delete_link', new_callable=mock.AsyncMock, return_value=True)
+    async def test_disconnect(self, delete_link, verify_links):
+        response = await self.disconnect()
+        self.assertEqual(response.status_code, 200)
+        delete_link.assert_awaited_once()
+        self.assertEqual(await self.svlans(), [None, None])
+        self.assertFalse(await Svlan.objects.filter(number=1001, in_use=True).aexists())
+        job = await Job.objects.aget()
+        self.assertEqual((job.kind, job.status), ('disconnect', 'SUCCEEDED'))
+
+    @mock.patch('api.views.device_async.delete_link', new_callable=mock.AsyncMock, return_value=False)
+    async def test_failure_keeps_the_link(self, delete_link):
+        response = await self.disconnect()
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(await self.svlans(), [1001, 1001])
+        job = await Job.objects.aget()
+        self.assertEqual((job.status, job.detail), ('FAILED', "Ports failed to disconnect."))
+
+    @mock.patch('api.views.device_async.delete_link', new_callable=mock.AsyncMock, return_value=True)
+    async def test_active_job_conflicts(self, delete_link):
+        await Job.objects.acreate(kind='connect', user=self.user, status='RUNNING',
+                                  payload={'portA': self.portA.id, 'portB': self.portB.id})
+        response = await self.disconnect()
+        self.assertEqual(response.status_code, 409)
+        delete_link.assert_not_awaited()
+        self.assertEqual(await Job.objects.acount(), 1)
+
+    async def test_token_required(self):
+        self.assertEqual((await self.disconnect(token='unknown')).status_code, 401)
+
+
+class AsyncBreakerTest(TransactionTestCase):
+    """
+    The async client feeds the circuit breaker without blocking the loop and
+    fails fast once the circuit of a device is open.
+    """
+    HOST = '10.9.9.9'
+
+    def setUp(self):
+        self.breakers = BreakerRegistry(threshold=2)
+        patcher = mock.patch('api.device_async.BREAKERS', self.breakers)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def circuit(self):
+        return await DeviceCircuit.objects.filter(host=self.HOST).values('state', 'failures').afirst()
+
+    async def test_failures_open_the_circuit(self):
+        await device_async.breaker_failure(self.HOST, 'timeout')
+        self.assertIsNone(await self.circuit())
+        await device_async.breaker_failure(self.HOST, 'timeout')
+        self.assertEqual(await self.circuit(), {'state': 'OPEN', 'failures': 2})
+        with self.assertRaises(CircuitOpen):
+            await device_async.breaker_before(self.HOST)
+
+    async def test_open_circuit_skips_the_device(self):
+        for _ in range(2):
+            await device_async.breaker_failure(self.HOST, 'timeout')
+        with mock.patch('httpx.AsyncClient.get', new_callable=mock.AsyncMock) as get:
+            with self.assertRaisesMessage(APIRequestError, 'circuit open'):
+                await device_async.cli(self.HOST, 'show vlan')
+        get.assert_not_awaited()
+
+    async def test_state_of_other_processes_is_adopted(self):
+        await DeviceCircuit.objects.acreate(host=self.HOST, state='OPEN', failures=3,
+                                            open_until=timezone.now() + timedelta(seconds=60))
+        with self.assertRaises(CircuitOpen):
+            await device_async.breaker_before(self.HOST)
+
+    async def test_successful_probe_closes_the_circuit(self):
+        self.breakers.reset = 0
+        for _ in range(2):
+            await device_async.breaker_failure(self.HOST, 'timeout')
+        # Half-open at once: this call is the probe
+        await device_async.breaker_before(self.HOST)
+        await device_async.breaker_success(self.HOST)
+        self.assertEqual(await self.circuit(), {'state': 'CLOSED', 'failures': 0})
+        await device_async.breaker_before(self.HOST)
+
+
+class ReservationTeardownTest(TestCase):
+    """
+    Releasing a switch tears its links down with one delete_links() batch per
+    backbone, and keeps the reservation when a batch fails.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        ports = make_lab(self.user, 3, ports_per_switch=3)
+        # Switch 1 is linked to switch 0 over 10.1.0.1 and to switch 2 over 10.1.0.2
+        self.first, self.second = (ports[1], ports[3]), (ports[4], ports[6])
+        Port.objects.filter(id__in=[port.id for port in self.second]).update(backbone='10.1.0.2')
+        # A port left with the SVLAN of a half-created link
+        self.lone = ports[5]
+        Port.objects.filter(id=self.lone.id).update(svlan=1003)
+        Svlan.objects.bulk_create([Svlan(number=number, in_use=True) for number in (1001, 1002, 1003)])
+        self.reservation = Reservation.objects.get(switch=ports[3].switch)
+        self.calls = []
+
+    def release(self, failing_backbone=None):
+        def delete_links(links, user_name):
+            backbone = links[0][0].backbone
+            self.calls.append((backbone, [(portA.id, portB.id) for portA, portB in links]))
+            return set() if backbone == failing_backbone else {portA.svlan for portA, _ in links}
+
+        with mock.patch.object(Port, 'delete_links', side_effect=delete_links), \
+                mock.patch('api.models.connection.close'), \
+                self.captureOnCommitCallbacks(execute=True):
+            return self.reservation.delete('user')
+
+    def svlans(self, ports):
+        return [Port.objects.get(id=port.id).svlan for port in ports]
+
+    def test_one_batch_per_backbone(self):
+        self.assertTrue(self.release())
+        self.assertEqual(sorted(self.calls), [
+            ('10.1.0.1', [tuple(port.id for port in self.first)]),
+            ('10.1.0.2', [tuple(port.id for port in self.second)]),
+        ])
+        self.assertEqual(self.svlans(self.first + self.second + (self.lone,)), [None] * 5)
+        self.assertFalse(Svlan.objects.filter(in_use=True).exists())
+        self.assertFalse(Reservation.objects.filter(id=self.reservation.id).exists())
+
+    def test_failed_batch_keeps_the_reservation(self):
+        self.assertFalse(self.release(failing_backbone='10.1.0.2'))
+        self.assertEqual(self.svlans(self.first + self.second), [None, None, 1002, 1002])
+        self.assertEqual(list(Svlan.objects.filter(in_use=True).values_list('number', flat=True)), [1002])
+        self.assertTrue(Reservation.objects.filter(id=self.reservation.id).exists())
+
+
+class BreakerRegistryTest(SimpleTestCase):
+    """
+    Circuit transitions: closed, open after the threshold, half-open after
+    the reset delay with a single probe, probe expiry.
+    """
+    HOST = '10.9.9.9'
+
+    def setUp(self):
+        self.breakers = BreakerRegistry(threshold=3, reset=30, probe_timeout=60)
+        self.now = 1000.0
+        patcher = mock.patch('api.breaker.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def before(self):
+        self.breakers.before(self.HOST, sync=False)
+
+    def open(self):
+        for _ in range(self.breakers.threshold):
+            transition = self.breakers.record_failure(self.HOST, 'timeout')
+        return transition
+
+    def test_threshold_opens_the_circuit(self):
+        self.assertIsNone(self.breakers.record_failure(self.HOST))
+        self.assertIsNone(self.breakers.record_failure(self.HOST))
+        self.before()
+        transition = self.breakers.record_failure(self.HOST, 'timeout')
+        self.assertEqual((transition['state'], transition['failures'], transition['last_error']),
+                         ('OPEN', 3, 'timeout'))
+        with self.assertRaises(CircuitOpen):
+            self.before()
+
+    def test_success_resets_the_count(self):
+        self.breakers.record_failure(self.HOST)
+        self.breakers.record_failure(self.HOST)
+        self.assertIsNone(self.breakers.record_success(self.HOST))
+        self.assertIsNone(self.breakers.record_failure(self.HOST))
+        self.before()
+
+    def test_single_probe_when_half_open(self):
+        self.open()
+        self.now += 29
+        with self.assertRaises(CircuitOpen):
+            self.before()
+        self.now += 1
+        self.before()
+        # The probe is running: the other calls still fail fast
+        with self.assertRaises(CircuitOpen):
+            self.before()
+        self.assertEqual(self.breakers.record_success(self.HOST)['state'], 'CLOSED')
+        self.before()
+        self.before()
+
+    def test_failed_probe_reopens_the_circuit(self):
+        self.open()
+        self.now += 30
+        self.before()
+        self.assertEqual(self.breakers.record_failure(self.HOST)['state'], 'OPEN')
+        self.now += 29
+        with self.assertRaises(CircuitOpen):
+            self.before()
+        self.now += 1
+        self.before()
+
+    def test_probe_without_outcome_expires(self):
+        self.open()
+        self.now += 30
+        self.before()
+        self.now += 59
+        with self.assertRaises(CircuitOpen):
+            self.before()
+        self.now += 1
+        self.before()
+        with self.assertRaises(CircuitOpen):
+            self.before()
+
+    def test_hosts_are_independent(self):
+        self.open()
+        self.breakers.before('10.9.9.10', sync=False)
+        self.breakers.reset_all()
+        self.before()
+
+
+@mock.patch('api.changes.SETTLE_SECONDS', 0)
+class SwitchHealthTest(TestCase):
+    """
+    Stored probe results, their join on the switches and the list_switch
+    validators that follow the sweeps.
+    """
+    def setUp(self):
+        self.user = User.objects.create(username='user')
+        self.client = APIClient(SERVER_NAME='localhost')
+        self.client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.up, self.down, self.unknown = [Switch.objects.create(model='OS6900', mngt_IP=f'10.0.0.{i}')
+                                                for i in range(3)]
+
+    def sweep(self, *results):
+        with self.captureOnCommitCallbacks(execute=True):
+            return health.store([{'host': host, 'reachable': latency is not None, 'latency_ms': latency,
+                                  'error': '' if latency is not None else 'timeout'} for host, latency in results])
+
+    def health_of(self, switch):
+        return with_health(Switch.objects.filter(id=switch.id)).values(
+            'reachable', 'latency_ms', 'last_seen', 'health_checked_at').get()
+
+    def switch_changes(self):
+        return list(Change.objects.filter(model='switch').values_list('object_id', flat=True))
+
+    def test_store(self):
+        self.assertEqual(self.sweep(('10.0.0.0', 1.5), ('10.0.0.1', None), ('10.1.0.1', 0.5)),
+                         ['10.0.0.0', '10.0.0.1', '10.1.0.1'])
+        seen = DeviceHealth.objects.get(host='10.0.0.0').last_seen
+        self.assertIsNotNone(seen)
+        self.assertIsNone(DeviceHealth.objects.get(host='10.0.0.1').last_seen)
+        changes = self.switch_changes()
+
+        # Latency alone isn't a change; the backbone left the inventory
+        self.assertEqual(self.sweep(('10.0.0.0', None), ('10.0.0.1', None)), ['10.0.0.0'])
+        down = DeviceHealth.objects.get(host='10.0.0.0')
+        self.assertEqual((down.reachable, down.latency_ms, down.last_seen, down.error), (False, None, seen, 'timeout'))
+        self.assertFalse(DeviceHealth.objects.filter(host='10.1.0.1').exists())
+        self.assertEqual(self.switch_changes()[len(changes):], [self.up.id])
+
+    def test_with_health(self):
+        self.sweep(('10.0.0.0', 1.5), ('10.0.0.1', None))
+        with self.assertNumQueries(1):
+            switches = {row['id']: row for row in with_health(Switch.objects.all()).values(
+                'id', 'reachable', 'latency_ms', 'last_seen')}
+        self.assertEqual(len(switches), 3)
+        self.assertEqual((switches[self.up.id]['reachable'], switches[self.up.id]['latency_ms']), (True, 1.5))
+        self.assertEqual(switches[self.down.id]['reachable'], False)
+        self.assertIsNone(switches[self.down.id]['last_seen'])
+        self.assertEqual(self.health_of(self.unknown),
+                         {'reachable': None, 'latency_ms': None, 'last_seen': None, 'health_checked_at': None})
+
+    def test_list_switch_follows_the_sweeps(self):
+        self.sweep(('10.0.0.0', 1.5))
+        response = self.client.get('/api/list_switch/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual({row['id']: row['latency_ms'] for row in response.data['switchs']},
+                         {self.up.id: 1.5, self.down.id: None, self.unknown.id: None})
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/list_switch/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Same reachability, new latency: no change logged, but a newer sweep
+        self.sweep(('10.0.0.0', 2.5))
+        response = self.client.get('/api/list_switch/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(next(row['latency_ms'] for row in response.data['switchs'] if row['id'] == self.up.id), 2.5)
+
+
+INTERFACES_STATUS = """
+Chas/ Admin Auto  Speed   Duplex Pause Trfc
+Slot/ Status Nego  (Mbps)
+Port
+-------+------+----+--------+------+-----+-----
+  1/1/1    en    en     Auto   Auto    -    -
+  1/1/2   dis    en     Auto   Auto    -    -
+  1/1/3    en    en     Auto   Auto    -    -
+"""
+
+
+@mock.patch('api.changes.SETTLE_SECONDS', 0)
+class ReconcileBackboneTest(TestCase):
+    """
+    Port.status is aligned with 'show interfaces status', writing only the
+    ports that differ.
+    """
+    def setUp(self):
+        switch = Switch.objects.create(model='OS6900', mngt_IP='10.0.0.1')
+        # 1/1/4 isn't in the device output
+        self.ports = Port.objects.bulk_create([
+            Port(switch=switch, port_switch=f'1/1/{i}', backbone='10.1.0.1', port_backbone=f'1/1/{i}', status=status)
+            for i, status in ((1, 'DOWN'), (2, 'DOWN'), (3, 'UP'), (4, 'UP'))
+        ])
+
+    def statuses(self):
+        return list(Port.objects.order_by('id').values_list('status', flat=True))
+
+    def reconcile(self, output=INTERFACES_STATUS, error=None):
+        with mock.patch('api.reconcile.cli', return_value=output, side_effect=error) as cli, \
+                self.captureOnCommitCallbacks(execute=True):
+            result = reconcile_backbone('10.1.0.1')
+        cli.assert_called_once_with('10.1.0.1', "show interfaces status")
+        return result
+
+    def test_reconcile(self):
+        self.assertEqual(self.reconcile(), {"backbone": '10.1.0.1', "status": "ok", "ports": 4,
+                                            "changed": [self.ports[0].id]})
+        self.assertEqual(self.statuses(), ['UP', 'DOWN', 'UP', 'UP'])
+        self.assertEqual(list(Change.objects.filter(model='port').values_list('object_id', flat=True)),
+                         [self.ports[0].id])
+        # Nothing left to write
+        with self.assertNumQueries(1):
+            self.assertEqual(self.reconcile()['changed'], [])
+
+    def test_unreachable_backbone(self):
+        result = self.reconcile(error=APIRequestError("Request to 10.1.0.1 failed"))
+        self.assertEqual((result['status'], result['detail']), ('failed', "Request to 10.1.0.1 failed"))
+        self.assertEqual(self.statuses(), ['DOWN', 'DOWN', 'UP', 'UP'])
+
+    def test_unparsable_output(self):
+        self.assertEqual(self.reconcile(output='ERROR: Invalid entry')['status'], 'failed')
+        self.assertEqual(self.statuses(), ['DOWN', 'DOWN', 'UP', 'UP'])
+
+
+class ReconcilePortsTest(TransactionTestCase):
+    """
+    Backbones are reconciled in parallel, each failing on its own.
+    """
+    def test_reconcile_ports(self):
+        switch = Switch.objects.create(model='OS6900', mngt_IP='10.0.0.1')
+        Port.objects.bulk_create([Port(switch=switch, port_switch=f'1/1/{i}', backbone=f'10.1.0.{i}',
+                                       port_backbone='1/1/1') for i in (1, 2)])
+
+        def cli(backbone, cmd):
+            if backbone == '10.1.0.2':
+                raise APIRequestError(f"Request to {backbone} failed")
+            return INTERFACES_STATUS
+
+        with mock.patch('api.reconcile.cli', side_effect=cli):
+            results = reconcile_ports()
+        self.assertEqual([(result['backbone'], result['status']) for result in results],
+                         [('10.1.0.1', 'ok'), ('10.1.0.2', 'failed')])
+        self.assertEqual(dict(Port.objects.values_list('backbone', 'status')), {'10.1.0.1': 'UP', '10.1.0.2': 'DOWN'})
+
+
+class EventBrokerTest(TestCase):
+    """
+    Brokers implement listen() as an async iterator feeding the event hub.
+    """
+    class ListBroker(events.Broker):
+        def __init__(self, batches):
+            self.batches = batches
+
+        async def listen(self):
+            for batch in self.batches:
+                yield batch
+
+    def test_listen_is_required(self):
+        with self.assertRaises(TypeError):
+            events.Broker()
+
+        class Incomplete(events.Broker):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+    async def test_hub_publishes_the_broker_changes(self):
+        switch = await Switch.objects.acreate(model='OS6900', mngt_IP='10.0.0.1')
+        hub = events.EventHub(self.ListBroker([[(1, 'switch', switch.id)], [(2, 'switch', switch.id + 1)]]))
+        subscription = hub.subscribe(user_id=1)
+        await hub.task
+        received = [subscription.queue.get_nowait() for _ in range(subscription.queue.qsize())]
+        self.assertEqual([(event['type'], event['id'], event.get('deleted', False)) for event in received],
+                         [('switch', switch.id, False), ('switch', switch.id + 1, True)])
+        self.assertEqual(received[0]['data']['mngt_IP'], '10.0.0.1')
@@ -0,0 +1,69 @@
+"""
+Topology of a user: the switches they reserved, their ports and the links
+between those ports.
+
+The whole graph is built from a single query joining ports, switches and
+reservations, ordered by SVLAN so links are grouped while iterating.
+"""
+import itertools
+
+from .models import Port
+
+
+def build_topology(user) -> dict:
+    """
+    Builds the topology of a user.
+
+    Args:
+        user (User): Owner of the topology.
+
+    Returns:
+        dict: {
+            "switches": [{"id", "model", "mngt_IP"}],
+            "ports": [{"id", "switch", "port_switch", "port_backbone", "svlan", "status"}],
+            "connections": [{"port1_id", "port2_id", "svlan"}]
+        }
+    """
+    rows = (
+        Port.objects.filter(switch__reservation__user=user)
+        .order_by('svlan', 'id')
+        .values('id', 'switch_id', 'switch__model', 'switch__mngt_IP',
+                'port_switch', 'port_backbone', 'svlan', 'status')
+        .distinct()
+    )
+
+    switches = {}
+    ports = []
+    connections = []
+    for svlan, group in itertools.groupby(rows, key=lambda row: row['svlan']):
+        group = list(group)
+        for row in group:
+            switches.setdefault(row['switch_id'], {
+                "id": row['switch_id'],
+                "model": row['switch__model'],
+                "mngt_IP": row['switch__mngt_IP'],
+            })
+            ports.append({
+                "id": row['id'],
+                "switch": row['switch_id'],
+                "port_switch": row['port_switch'],
+                "port_backbone": row['port_backbone'],
+                "svlan": row['svlan'],
+                "status": row['status'],
+            })
+
+        # Ports without SVLAN are not linked to anything
+        if svlan is None:
+            continue
+        for port1, port2 in itertools.combinations(group, 2):
+            connections.append({
+                "port1_id": port1['id'],
+                "port2_id": port2['id'],
+                "svlan": svlan,
+            })
+
+    return {
+        "switches": sorted(switches.values(), key=lambda switch: switch['id']),
+        "ports": ports,
+        "connections": connections,
+    }
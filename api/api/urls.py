@@ -32,12 +32,26 @@ path('list_port/', views.list_port),
 path('list_port/<int:switch_id>/', views.list_port_by_switch),
 path('reserve/', views.reserve),
 path('release/', views.release),
+path('reserve_bulk/', views.reserve_bulk),
+path('release_bulk/', views.release_bulk),
 path('list_reservation/', views.list_reservation),
+path('changes/', views.changes),
+path('event_ticket/', views.event_ticket),
+path('events/', views.events),
 path('connect/', views.connect),
+path('connect_many/', views.connect_many),
 path('disconnect/', views.disconnect),
+path('job/<int:job_id>/', views.job_status),
+path('device_health/', views.device_health),
+path('reconcile_ports/', views.reconcile_ports),
+path('async/reserve/', views.async_reserve),
+path('async/release/', views.async_release),
+path('async/connect/', views.async_connect),
+path('async/disconnect/', views.async_disconnect),
 path('', views.welcome),
 path('share_topology/', views.share_topology),
 path('list_shared_topologies/', views.list_shared_topologies),
 path('unshare_topology/<int:share_id>/', views.unshare_topology),
 path('get_shared_topology/<int:owner_id>/', views.get_shared_topology),
+path('topology/', views.get_topology),
 ]
\ No newline at end of file
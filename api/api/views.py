@@ -1,5 +1,7 @@
-import time
+import json
+import asyncio
 import logging  # Add logging import
+from asgiref.sync import sync_to_async
 from rest_framework.decorators import api_view, authentication_classes, permission_classes
 from rest_framework.authentication import SessionAuthentication, TokenAuthentication
 from rest_framework.permissions import IsAuthenticated, IsAdminUser
@@ -11,9 +13,22 @@ from django.db import transaction
 from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.dateparse import parse_datetime
-
-from .models import Switch, Reservation, Port, User, TopologyShare
-from .serializers import SwitchSerializer, ReservationSerializer, PortSerializer, UserSerializer
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import (
+    Switch, Reservation, Port, User, TopologyShare, Job, Svlan, SvlanPoolExhausted, Change, APIRequestError, DeviceCircuit,
+)
+from .serializers import SwitchHealthSerializer, ReservationSerializer, PortSerializer, UserSerializer, JobSerializer, values_of
+from . import jobs
+from .topology import build_topology
+from .filters import PortFilter, SwitchFilter
+from .pagination import list_response
+from .reservations import BulkError, parse_switch_ids, reserve_switches, release_switches
+from .reconcile import reconcile_ports as reconcile_port_states
+from .changes import inventory_condition, base_queryset, current_version, delta, needs_resync
+from .health import health_modified
+from . import events as live_events
+from . import device_async
 from django.shortcuts import get_object_or_404
 
 """
@@ -26,20 +41,30 @@ Features:
 - User Details: Enables users to retrieve details of a specific user account.
 - Test Token: Allows users to test the validity of their authentication token.
 - Welcome: Provides a welcome message along with a list of available API endpoints.
-- List Switches: Enables users to retrieve a list of all switches in the system.
+- List Switches: Enables users to retrieve a list of all switches in the system, with their last known health.
 - Delete Switch: Allows administrators to delete a switch from the system.
 - Delete Port: Enables users to delete a port from the system.
 - List Ports: Allows users to retrieve a list of all ports in the system.
 - List Ports by Switch: Enables users to retrieve a list of ports belonging to a specific switch.
 - Reserve Switch: Allows users to reserve a switch for their use.
 - Release Switch: Enables users to release a previously reserved switch.
+- Bulk Reserve/Release: Reserves or releases several switches in one request.
 - List Reservations: Allows users to retrieve a list of all reservations made in the system.
+- Changes: Returns the inventory changes since the client's last sync.
+- Event Ticket: Issues the single-use credential of an event stream.
+- Events: Streams live port, reservation and link changes (server-sent events, ASGI only).
 - Connect Ports: Allows users to connect two ports belonging to different switches.
+- Connect Many: Creates several links in one request.
 - Disconnect Ports: Enables users to disconnect two previously connected ports.
+- Async Reserve/Release/Connect/Disconnect: Same operations, run inline on the ASGI application.
+- Job Status: Allows users to follow the progress of a connect/disconnect operation.
+- Device Health: Lists the switches and backbones currently failing fast (circuit breaker).
+- Reconcile Ports: Syncs the port statuses with the backbones (admin only).
 - Traps: Handles various alerts sent by switches.
 - Share Topology: Allows users to share their topology with other users.
 - List Shared Topologies: Enables users to view topologies shared with them.
 - Get Shared Topology: Allows users to retrieve a specific shared topology.
+- Get Topology: Allows users to retrieve their own topology.
 """
 
 
@@ -48,15 +73,6 @@ logging.basicConfig(filename='/app/logs/api_views.log', level=logging.INFO,
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Utility function to generate unique SVLAN
-def get_unique_svlan():
-    all_svlans = set(Port.objects.exclude(svlan=None).values_list('svlan', flat=True))
-    unique_svlan = 1001
-    while unique_svlan in all_svlans:
-        unique_svlan += 1
-    return unique_svlan
-
-
 # Utility function to check if user has access to a switch (owns or shared with them)
 def user_has_switch_access(user, switch):
     """
@@ -206,9 +222,8 @@ def list_user(request):
     List Users endpoint.
     Allows users to retrieve a list of all users registered in the system for sharing purposes.
     """
-    users = User.objects.all()
-    serializer = UserSerializer(instance=users, many=True)
-    return Response({"users": serializer.data}, status=status.HTTP_200_OK)
+    users = values_of(User.objects.order_by('id'), UserSerializer)
+    return Response({"users": users}, status=status.HTTP_200_OK)
 
 
 # API endpoint to get details of a specific user
@@ -264,14 +279,28 @@ def welcome(request):
             "/list_port_by_switch/<int:switch_id>",
             "/reserve",
             "/release",
+            "/reserve_bulk",
+            "/release_bulk",
             "/list_reservation",
+            "/changes",
+            "/event_ticket",
+            "/events",
             "/connect",
+            "/connect_many",
             "/disconnect",
+            "/job/<int:job_id>",
+            "/device_health",
+            "/reconcile_ports",
+            "/async/reserve",
+            "/async/release",
+            "/async/connect",
+            "/async/disconnect",
             "/traps",
             "/share_topology",
             "/list_shared_topologies",
             "/unshare_topology/<int:share_id>",
-            "/get_shared_topology/<int:owner_id>"
+            "/get_shared_topology/<int:owner_id>",
+            "/topology"
         ]
     }
     return Response(api_urls)
@@ -283,14 +312,28 @@ def welcome(request):
 @api_view(['GET'])
 @authentication_classes([SessionAuthentication, TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@inventory_condition(Switch, Reservation, extra_modified=health_modified)
 def list_switch(request):
     """
     List Switches endpoint.
     Enables users to retrieve a list of all switches in the system.
+
+    Optional query parameters:
+        model, mngt_IP: Exact match filters.
+        free: true for switches nobody reserved, false for reserved ones.
+        fields: Comma-separated subset of fields to return (e.g. "id,model").
+        page_size, cursor: Cursor pagination; follow "next" to get the following page.
+
+    Each switch carries the last health seen by the reachability monitor
+    (reachable, latency_ms, last_seen, health_checked_at); no device is contacted.
+
+    Expected Response Payload:
+    {
+        "switchs": [...],
+        "next": "<next page URL>" | null
+    }
     """
-    switch = Switch.objects.all()
-    serializer = SwitchSerializer(instance=switch, many=True)
-    return Response({"switchs": serializer.data}, status=status.HTTP_200_OK)
+    return list_response(request, base_queryset(Switch), SwitchHealthSerializer, SwitchFilter, "switchs")
 
 
 # API endpoint to delete a switch (admin only)
@@ -351,14 +394,25 @@ def del_port(request):
 @api_view(['GET'])
 @authentication_classes([SessionAuthentication, TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@inventory_condition(Port)
 def list_port(request):
     """
     List Ports endpoint.
     Allows users to retrieve a list of all ports in the system.
+
+    Optional query parameters:
+        switch, backbone, status, svlan: Exact match filters.
+        free: true for ports without link, false for linked ports.
+        fields: Comma-separated subset of fields to return (e.g. "id,svlan,status").
+        page_size, cursor: Cursor pagination; follow "next" to get the following page.
+
+    Expected Response Payload:
+    {
+        "ports": [...],
+        "next": "<next page URL>" | null
+    }
     """
-    port = Port.objects.all()
-    serializer = PortSerializer(instance=port, many=True)
-    return Response({"ports": serializer.data}, status=status.HTTP_200_OK)
+    return list_response(request, Port.objects.all(), PortSerializer, PortFilter, "ports")
 
 
 # API endpoint to list ports by switch
@@ -366,14 +420,14 @@ def list_port(request):
 @api_view(['GET'])
 @authentication_classes([SessionAuthentication, TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@inventory_condition(Port)
 def list_port_by_switch(request, switch_id):
     """
     List Ports by Switch endpoint.
     Enables users to retrieve a list of ports belonging to a specific switch.
     """
-    ports = Port.objects.filter(switch=switch_id)
-    serializer = PortSerializer(ports, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    ports = values_of(Port.objects.filter(switch=switch_id).order_by('id'), PortSerializer)
+    return Response(ports, status=status.HTTP_200_OK)
 
 
 # API endpoint to reserve a switch
@@ -394,25 +448,20 @@ def reserve(request):
     end_date = parse_datetime(end_date_str) if end_date_str else None
     switch = get_object_or_404(Switch, id=switch_id)
 
-    # Check if the switch is already reserved by this user
-    if Reservation.objects.filter(switch=switch, user=user).exists():
-        logger.warning(f"User {user.username} attempted to reserve an already reserved switch {switch_id}.")
-        return Response({"warning": "You have already reserved this switch."}, status=status.HTTP_400_BAD_REQUEST)
-
-    # Check if the switch is reserved by someone else
-    existing_reservation = Reservation.objects.filter(switch=switch).first()
-    if existing_reservation:
+    # Locks the switch row: concurrent requests for the same switch are serialized
+    try:
+        reserve_switches(user, [switch.id], end_date)
+    except BulkError as e:
+        if e.status != 'conflict':
+            return Response({"error": e.message}, status=BULK_ERROR_STATUS[e.status])
+        if e.results[0]['status'] == 'already_reserved':
+            logger.warning(f"User {user.username} attempted to reserve an already reserved switch {switch_id}.")
+            return Response({"warning": "You have already reserved this switch."}, status=status.HTTP_409_CONFLICT)
         logger.warning(f"Switch {switch_id} is already reserved by another user.")
-        return Response({"warning": "This switch is already reserved."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"warning": "This switch is already reserved."}, status=status.HTTP_409_CONFLICT)
 
-    # Create a new reservation if switch is not reserved
-    Reservation.objects.create(switch=switch, user=user, end_date=end_date)
-    if switch.changeBanner():
-        logger.info(f"User {user.username} reserved switch {switch_id} successfully.")
-        return Response({"detail": "Reservation successful."}, status=status.HTTP_201_CREATED)
-    else:
-        return Response({"detail": "Reservation successful, but failed to update the switch banner."}, 
-                       status=status.HTTP_201_CREATED)
+    logger.info(f"User {user.username} reserved switch {switch_id} successfully.")
+    return Response({"detail": "Reservation successful."}, status=status.HTTP_201_CREATED)
 
 
 # API endpoint to release a switch
@@ -471,30 +520,316 @@ def release(request):
             message += " Cleanup skipped - other reservations exist."
         elif not cleanup_switch and is_last_reservation:
             message += " Switch ready for manual cleanup if needed."
-            
-        if switch.changeBanner():
-            logger.info(f"User {user.username} released switch {switch_id} successfully (cleanup: {cleanup_switch}).")
-            return Response({"detail": message}, status=status.HTTP_200_OK)
-        else:
-            logger.warning(f"Switch {switch_id} released but failed to update the banner.")
-            return Response({"detail": message + " Banner couldn't be changed"}, status=status.HTTP_201_CREATED)
+
+        jobs.queue_banner(switch, user)
+        logger.info(f"User {user.username} released switch {switch_id} successfully (cleanup: {cleanup_switch}).")
+        return Response({"detail": message}, status=status.HTTP_200_OK)
     else:
         return Response({"error": "Failed to release switch. Some ports may still be connected."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+BULK_ERROR_STATUS = {
+    'invalid': status.HTTP_400_BAD_REQUEST,
+    'forbidden': status.HTTP_403_FORBIDDEN,
+    'not_found': status.HTTP_404_NOT_FOUND,
+    'conflict': status.HTTP_409_CONFLICT,
+}
+
+
+# API endpoint to reserve several switches at once
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def reserve_bulk(request):
+    """
+    Bulk Reserve endpoint.
+    Reserves all the given switches in one transaction, or none of them.
+
+    Request Payload:
+    {
+        "switches": [<switch_id>, ...],
+        "end_date": "<ISO 8601>" (optional)
+    }
+
+    Expected Response Payload (Successful, 201):
+    {
+        "detail": "Reservation successful.",
+        "results": [{"switch": <switch_id>, "status": "reserved", "banner_job": <job_id>}, ...]
+    }
+
+    On a 404/409 nothing is reserved and "results" tells the state of each switch
+    ('not_found', 'already_reserved', 'unavailable', 'available').
+    """
+    user = request.user
+    end_date_str = request.data.get('end_date')
+    end_date = parse_datetime(end_date_str) if end_date_str else None
+    try:
+        switch_ids = parse_switch_ids(request.data.get('switches'))
+        results = reserve_switches(user, switch_ids, end_date)
+    except BulkError as e:
+        logger.warning(f"Bulk reservation by {user.username} rejected: {e.message}")
+        return Response({"error": e.message, "results": e.results}, status=BULK_ERROR_STATUS[e.status])
+    return Response({"detail": "Reservation successful.", "results": results}, status=status.HTTP_201_CREATED)
+
+
+# API endpoint to release several switches at once
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def release_bulk(request):
+    """
+    Bulk Release endpoint.
+    Releases all the given switches. The request is rejected as a whole if one
+    of them can't be released by the user; the links of the switches are then
+    torn down in parallel.
+
+    Request Payload:
+    {
+        "switches": [<switch_id>, ...],
+        "cleanup": true/false (optional, default: false)
+    }
+
+    Expected Response Payload (200 if every switch was released, 207 otherwise):
+    {
+        "results": [{"switch": <switch_id>, "status": "released"|"failed", "detail": "..."}, ...]
+    }
+    """
+    user = request.user
+    cleanup_switch = request.data.get('cleanup', False)
+    try:
+        switch_ids = parse_switch_ids(request.data.get('switches'))
+        results = release_switches(user, switch_ids, cleanup_switch)
+    except BulkError as e:
+        logger.warning(f"Bulk release by {user.username} rejected: {e.message}")
+        return Response({"error": e.message, "results": e.results}, status=BULK_ERROR_STATUS[e.status])
+    if all(result['status'] == 'released' for result in results):
+        return Response({"results": results}, status=status.HTTP_200_OK)
+    return Response({"results": results}, status=status.HTTP_207_MULTI_STATUS)
+
+
 # API endpoint to list all reservations
 @csrf_exempt
 @api_view(['GET'])
 @authentication_classes([SessionAuthentication, TokenAuthentication])
 @permission_classes([IsAuthenticated])
+@inventory_condition(Reservation)
 def list_reservation(request):
     """
     List Reservations endpoint.
     Allows users to retrieve a list of all reservations made in the system.
     """
-    reservations = Reservation.objects.all()
-    serializer = ReservationSerializer(reservations, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    reservations = values_of(Reservation.objects.order_by('id'), ReservationSerializer)
+    return Response(reservations, status=status.HTTP_200_OK)
+
+
+# API endpoint to get the inventory changes since a version
+@csrf_exempt
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def changes(request):
+    """
+    Changes endpoint.
+    Returns the switches, ports, reservations and topology shares changed since
+    the version of the client's last sync. Without 'since', only the current
+    version is returned: fetch the full lists, then poll with it.
+
+    Query parameters:
+        since (int): "version" returned by the previous call.
+
+    Expected Response Payload:
+    {
+        "version": <int>,
+        "switchs": [...], "ports": [...], "reservations": [...], "topology_shares": [...],
+        "deleted": {"switchs": [ids], "ports": [ids], "reservations": [ids], "topology_shares": [ids]}
+    }
+    A 410 response means the changes are no longer available: reload the full lists.
+    """
+    since = request.query_params.get('since')
+    if since is None:
+        return Response({"version": current_version()}, status=status.HTTP_200_OK)
+    try:
+        since = int(since)
+    except ValueError:
+        return Response({"detail": "'since' must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+    if needs_resync(since):
+        return Response({"detail": "Changes since this version are no longer available, reload the full lists."},
+                        status=status.HTTP_410_GONE)
+    return Response(delta(request.user, since), status=status.HTTP_200_OK)
+
+
+# API endpoint issuing the credential of an event stream
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def event_ticket(request):
+    """
+    Event Ticket endpoint.
+    Returns a single-use ticket opening the event stream
+    (/events?ticket=...), so the API token never appears in a URL.
+
+    Expected Response Payload:
+    {
+        "ticket": "<ticket>",
+        "expires_in": <seconds>
+    }
+    """
+    ticket = live_events.issue_ticket(request.user)
+    return Response({"ticket": ticket, "expires_in": live_events.TICKET_TTL}, status=status.HTTP_201_CREATED)
+
+
+# API endpoint streaming live inventory changes (served by the ASGI application)
+async def events(request):
+    """
+    Events endpoint.
+    Server-sent event stream of the switch, reservation, port (status and
+    links) and topology share changes visible to the user. Authenticates with
+    the session cookie or a 'ticket' query parameter from /event_ticket.
+
+    Each message is a JSON object:
+    {"type": "port", "id": ..., "data": {...}, "version": ...}
+    {"type": "port", "id": ..., "deleted": true, "version": ...}
+    {"type": "resync"}: reload everything, the stream reconnects by itself.
+    """
+    if request.method != 'GET':
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    user = await live_events.authenticate(request)
+    if user is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+    subscription = live_events.HUB.subscribe(user.id)
+    response = StreamingHttpResponse(live_events.stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # let nginx flush every event
+    return response
+
+
+class LinkRequestError(Exception):
+    """Rejection of a connect/disconnect request, with the HTTP status to answer."""
+    def __init__(self, detail: str, status_code: int):
+        self.detail = detail
+        self.status_code = status_code
+        super().__init__(detail)
+
+
+def _get_ports(portA_id, portB_id) -> tuple:
+    try:
+        return Port.objects.get(id=portA_id), Port.objects.get(id=portB_id)
+    except (Port.DoesNotExist, ValueError, TypeError):
+        raise LinkRequestError("One or both ports do not exist.", status.HTTP_404_NOT_FOUND)
+
+
+def assign_link(user, portA_id, portB_id) -> tuple:
+    """
+    Validates a connect request and assigns a new SVLAN to both ports.
+
+    Returns:
+        tuple: (portA, portB) with their SVLAN set.
+
+    Raises:
+        LinkRequestError: If the ports can't be linked.
+    """
+    portA, portB = _get_ports(portA_id, portB_id)
+
+    # Check if user has access to both switches (owns or shared)
+    if not (user_has_switch_access(user, portA.switch) and user_has_switch_access(user, portB.switch)):
+        logger.warning(f"User {user.username} attempted to connect ports on switches they don't have access to.")
+        raise LinkRequestError("You don't have access to one or both switches.", status.HTTP_403_FORBIDDEN)
+
+    with transaction.atomic():
+        # Lock both ports so two concurrent requests can't link the same port
+        locked = {port.id: port for port in Port.objects.select_for_update().filter(id__in=[portA.id, portB.id])}
+        portA, portB = locked[portA.id], locked[portB.id]
+
+        # Validate that ports are not already connected
+        if portA.svlan is not None or portB.svlan is not None:
+            logger.warning(f"User {user.username} attempted to connect ports that are already linked.")
+            raise LinkRequestError("One or both ports are already connected. Disconnect them first.",
+                                   status.HTTP_400_BAD_REQUEST)
+
+        try:
+            svlan = Svlan.allocate()
+        except SvlanPoolExhausted as e:
+            logger.error(f"Cannot connect ports {portA.id} and {portB.id}: {e.message}")
+            raise LinkRequestError("No SVLAN available, try again later.", status.HTTP_503_SERVICE_UNAVAILABLE)
+        Port.objects.filter(id__in=[portA.id, portB.id]).update(svlan=svlan)
+        Change.record(Port, [portA.id, portB.id])
+    portA.svlan = portB.svlan = svlan
+    return portA, portB
+
+
+def start_disconnect(user, portA_id, portB_id, inline: bool = False) -> tuple:
+    """
+    Validates a disconnect request and records it as a job, atomically: the
+    ports are locked, so two requests (from any process) can't both start
+    tearing down the same link.
+
+    Args:
+        inline (bool): The caller deletes the link itself; the job is created
+            RUNNING (jobs.start_inline) instead of queued for the workers.
+
+    Returns:
+        tuple: (portA, portB, job), the ports being linked to each other.
+
+    Raises:
+        LinkRequestError: If the link can't be deleted by the user.
+    """
+    with transaction.atomic():
+        portA, portB = check_link(user, portA_id, portB_id)
+        payload = {'portA': portA.id, 'portB': portB.id}
+        job = jobs.start_inline('disconnect', user, payload) if inline else jobs.submit('disconnect', user, payload)
+    return portA, portB, job
+
+
+def check_link(user, portA_id, portB_id) -> tuple:
+    """
+    Validates a disconnect request. Must run in a transaction: the ports are
+    locked until it ends.
+
+    Returns:
+        tuple: (portA, portB), linked to each other.
+
+    Raises:
+        LinkRequestError: If the link can't be deleted by the user.
+    """
+    portA, portB = _get_ports(portA_id, portB_id)
+    # Lock and re-read the ports: a concurrent request may have just changed them
+    locked = {port.id: port for port in Port.objects.select_for_update(of=('self',)).select_related('switch')
+              .filter(id__in=[portA.id, portB.id]).order_by('id')}
+    portA, portB = locked[portA.id], locked[portB.id]
+
+    # Check if user has access to both switches (owns or shared)
+    if not (user_has_switch_access(user, portA.switch) and user_has_switch_access(user, portB.switch)):
+        logger.warning(f"User {user.username} attempted to disconnect ports on switches they don't have access to.")
+        raise LinkRequestError("You don't have access to one or both switches.", status.HTTP_403_FORBIDDEN)
+
+    # Validate that ports are actually connected (same SVLAN)
+    if portA.svlan is None or portB.svlan is None or portA.svlan != portB.svlan:
+        logger.warning(f"User {user.username} attempted to disconnect ports that are not linked.")
+        raise LinkRequestError("These ports are not connected to each other.", status.HTTP_400_BAD_REQUEST)
+
+    # Don't tear down a link still being created, nor run the same teardown twice
+    link_ports = {portA.id, portB.id}
+    active = (Job.objects.filter(kind__in=['connect', 'connect_many', 'disconnect'], status__in=['PENDING', 'RUNNING'])
+              .filter(Q(payload__portA__in=link_ports) | Q(payload__portB__in=link_ports) | Q(kind='connect_many'))
+              .values_list('payload', flat=True))
+    if any(link_ports.intersection(jobs.job_ports(payload)) for payload in active):
+        raise LinkRequestError("A connection or disconnection of these ports is already in progress.",
+                               status.HTTP_409_CONFLICT)
+    return portA, portB
+
+
+def release_link(portA, portB, svlan):
+    """
+    Forgets the link of two ports and returns its SVLAN to the pool.
+    """
+    Port.objects.filter(id__in=[portA.id, portB.id]).update(svlan=None)
+    Change.record(Port, [portA.id, portB.id])
+    Svlan.release(svlan)
 
 
 # API endpoint to connect two ports
@@ -515,55 +850,98 @@ def connect(request):
 
     Expected Response Payload (Successful):
     {
-        "detail": "Ports connected successfully with svlan <svlan>"
+        "detail": "Connection in progress.",
+        "job": <job_id>
     }
+    The outcome is available through /job/<job_id>.
     """
-    portA = get_object_or_404(Port, id=request.data.get('portA'))
-    portB = get_object_or_404(Port, id=request.data.get('portB'))
-
     user = request.user
-    switchA = portA.switch
-    switchB = portB.switch
+    try:
+        portA, portB = assign_link(user, request.data.get('portA'), request.data.get('portB'))
+    except LinkRequestError as e:
+        return Response({"detail": e.detail}, status=e.status_code)
 
-    # Check if user has access to both switches (owns or shared)
-    if not (user_has_switch_access(user, switchA) and user_has_switch_access(user, switchB)):
+    # Link creation and verification run in the background
+    job = jobs.submit('connect', user, {'portA': portA.id, 'portB': portB.id})
+    return Response({"detail": "Connection in progress.", "job": job.id}, status=status.HTTP_202_ACCEPTED)
+
+
+# Largest number of links accepted by connect_many
+MAX_LINKS_PER_REQUEST = 100
+
+
+# API endpoint to create several links at once
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def connect_many(request):
+    """
+    Connect Many endpoint.
+    Creates several links in one background job, e.g. a whole ring or mesh.
+    The SVLANs of all the links are allocated at once; the links of each
+    backbone are created over one session and verified with one snapshot.
+
+    Request Payload:
+    {
+        "links": [{"portA": "<port_id>", "portB": "<port_id>"}, ...]
+    }
+
+    Expected Response Payload (Successful):
+    {
+        "detail": "Connection in progress.",
+        "job": <job_id>
+    }
+    The per-link outcome is available in the "result" of /job/<job_id>.
+    """
+    user = request.user
+    links = request.data.get('links')
+    try:
+        links = [{'portA': int(link['portA']), 'portB': int(link['portB'])} for link in links]
+    except (TypeError, KeyError, ValueError):
+        links = None
+    if not links:
+        return Response({"detail": "'links' must be a non-empty list of {portA, portB}."}, status=status.HTTP_400_BAD_REQUEST)
+    if len(links) > MAX_LINKS_PER_REQUEST:
+        return Response({"detail": f"At most {MAX_LINKS_PER_REQUEST} links per request."}, status=status.HTTP_400_BAD_REQUEST)
+
+    port_ids = [link[key] for link in links for key in ('portA', 'portB')]
+    if len(set(port_ids)) != len(port_ids):
+        return Response({"detail": "A port can only appear in one link."}, status=status.HTTP_400_BAD_REQUEST)
+
+    ports = Port.objects.select_related('switch').in_bulk(port_ids)
+    missing = sorted(set(port_ids) - ports.keys())
+    if missing:
+        return Response({"detail": f"Unknown port(s): {missing}"}, status=status.HTTP_404_NOT_FOUND)
+
+    # Check if user has access to every switch (owns or shared)
+    switches = {port.switch_id: port.switch for port in ports.values()}
+    if not all(user_has_switch_access(user, switch) for switch in switches.values()):
         logger.warning(f"User {user.username} attempted to connect ports on switches they don't have access to.")
-        return Response({"detail": "You don't have access to one or both switches."}, status=status.HTTP_403_FORBIDDEN)
-
-    # Validate that ports are not already connected
-    if portA.svlan is not None or portB.svlan is not None:
-        logger.warning(f"User {user.username} attempted to connect ports that are already linked.")
-        return Response({"detail": "One or both ports are already connected. Disconnect them first."}, status=status.HTTP_400_BAD_REQUEST)
-
-    svlan = get_unique_svlan()
-    portA.svlan = svlan
-    portB.svlan = svlan
-    portA.save()
-    portB.save()
-
-    if Port.create_link(portA, portB, request.user.username):
-        max_retries = 3
-        for attempt in range(max_retries):
-            if portA.verify_configuration(portA.svlan, 4):
-                logger.info(f"Ports {portA.id} and {portB.id} connected successfully with svlan {svlan}.")
-                return Response({"detail": "Ports connected successfully with svlan {}".format(svlan)}, status=status.HTTP_200_OK)
-            else:
-                print(f"Verification failed on attempt {attempt + 1}/{max_retries}. Retrying...")
-                time.sleep(2)  # Wait before retrying
-
-        # If all retries fail
-        portA.svlan = None
-        portB.svlan = None
-        portA.save()
-        portB.save()
-        return Response({"detail": "Ports failed to connect - Verification fail"}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
-    else:
-        logger.error(f"Failed to connect ports {portA.id} and {portB.id}.")
-        portA.svlan = None
-        portB.svlan = None
-        portA.save()
-        portB.save()
-        return Response({"detail": "Ports failed to connect"}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        return Response({"detail": "You don't have access to one or more switches."}, status=status.HTTP_403_FORBIDDEN)
+
+    with transaction.atomic():
+        # Lock the ports so a concurrent request can't link the same port
+        locked = {port.id: port for port in Port.objects.select_for_update().filter(id__in=port_ids).order_by('id')}
+        busy = sorted(port_id for port_id, port in locked.items() if port.svlan is not None)
+        if busy:
+            logger.warning(f"User {user.username} attempted to connect ports that are already linked: {busy}.")
+            return Response({"detail": f"Port(s) {busy} are already connected. Disconnect them first."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            svlans = Svlan.allocate_many(len(links))
+        except SvlanPoolExhausted as e:
+            logger.error(f"Cannot connect {len(links)} links: {e.message}")
+            return Response({"detail": "Not enough SVLANs available, try again later."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        for link, svlan in zip(links, svlans):
+            locked[link['portA']].svlan = locked[link['portB']].svlan = svlan
+        Port.objects.bulk_update(locked.values(), ['svlan'])
+        Change.record(Port, port_ids)
+
+    # Link creation and verification run in the background
+    job = jobs.submit('connect_many', user, {'links': links})
+    return Response({"detail": "Connection in progress.", "job": job.id}, status=status.HTTP_202_ACCEPTED)
 
 
 # API endpoint to disconnect two ports
@@ -584,55 +962,315 @@ def disconnect(request):
 
     Expected Response Payload (Successful):
     {
-        "detail": "Ports disconnected successfully."
+        "detail": "Disconnection in progress.",
+        "job": <job_id>
     }
+    The outcome is available through /job/<job_id>.
     """
-    portA_id = request.data.get('portA')
-    portB_id = request.data.get('portB')
+    user = request.user
+    try:
+        # Link deletion and verification run in the background
+        portA, portB, job = start_disconnect(user, request.data.get('portA'), request.data.get('portB'))
+    except LinkRequestError as e:
+        return Response({"detail": e.detail}, status=e.status_code)
+    return Response({"detail": "Disconnection in progress.", "job": job.id}, status=status.HTTP_202_ACCEPTED)
+
+
+# Async counterparts of the device-bound endpoints, served by the ASGI
+# application: the device operations run inline on the event loop instead of
+# holding a thread or going through the job queue.
 
+async def device_request(request):
+    """
+    Authenticates and parses a request to an async device endpoint.
+    Only the 'Authorization: Token <key>' header is accepted, these views
+    don't go through DRF's CSRF checks for session logins.
+
+    Returns:
+        tuple: (user, payload dict), or (None, JsonResponse) to answer directly.
+    """
+    if request.method != 'POST':
+        return None, JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    scheme, _, key = request.headers.get('Authorization', '').partition(' ')
+    user = await live_events.token_user(key) if scheme == 'Token' and key else None
+    if user is None:
+        return None, JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
     try:
-        portA = Port.objects.get(id=portA_id)
-        portB = Port.objects.get(id=portB_id)
-    except Port.DoesNotExist:
-        return Response({"detail": "One or both ports do not exist."}, status=status.HTTP_404_NOT_FOUND)
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return None, JsonResponse({"detail": "Invalid JSON payload."}, status=400)
+    return user, data
 
-    user = request.user
-    switchA = portA.switch
-    switchB = portB.switch
 
-    # Check if user has access to both switches (owns or shared)
-    if not (user_has_switch_access(user, switchA) and user_has_switch_access(user, switchB)):
-        logger.warning(f"User {user.username} attempted to disconnect ports on switches they don't have access to.")
-        return Response({"detail": "You don't have access to one or both switches."}, status=status.HTTP_403_FORBIDDEN)
+@csrf_exempt
+async def async_reserve(request):
+    """
+    Async Reserve Switch endpoint. Same payload and responses as /reserve.
+    """
+    user, data = await device_request(request)
+    if user is None:
+        return data
+    end_date_str = data.get('end_date')
+    end_date = parse_datetime(end_date_str) if end_date_str else None
+    switch_id = data.get('switch')
+    if not str(switch_id).isdigit():
+        return JsonResponse({"error": f"Unknown switch(es): [{switch_id}]"}, status=404)
+    try:
+        await sync_to_async(reserve_switches)(user, [int(switch_id)], end_date)
+    except BulkError as e:
+        if e.status != 'conflict':
+            return JsonResponse({"error": e.message}, status=BULK_ERROR_STATUS[e.status])
+        if e.results[0]['status'] == 'already_reserved':
+            return JsonResponse({"warning": "You have already reserved this switch."}, status=409)
+        return JsonResponse({"warning": "This switch is already reserved."}, status=409)
+    logger.info(f"User {user.username} reserved switch {switch_id} successfully.")
+    return JsonResponse({"detail": "Reservation successful."}, status=201)
+
+
+def _release_target(user, switch_id):
+    # Same checks as /release; returns (switch, reservation, is_last_reservation) or an error
+    switch = Switch.objects.filter(id=switch_id).first() if str(switch_id).isdigit() else None
+    if switch is None:
+        return None, ({"error": f"Switch with id {switch_id} not found"}, 404)
+    if not user_has_switch_access(user, switch):
+        return None, ({"warning": "You don't have access to this switch."}, 403)
+    reservations = list(Reservation.objects.filter(switch=switch))
+    if not reservations:
+        return None, ({"warning": "This switch is not reserved."}, 400)
+    return (switch, reservations[0], len(reservations) == 1), None
 
-    # Validate that ports are actually connected (same SVLAN)
-    if portA.svlan is None or portB.svlan is None or portA.svlan != portB.svlan:
-        logger.warning(f"User {user.username} attempted to disconnect ports that are not linked.")
-        return Response({"detail": "These ports are not connected to each other."}, status=status.HTTP_400_BAD_REQUEST)
 
-    # Store SVLAN before deletion for verification
-    original_svlan = portA.svlan
-    
-    if Port.delete_link(portA, portB, request.user.username):
-        max_retries = 3
-        for attempt in range(max_retries):
-            # Verify the link is actually deleted by checking for 0 configuration lines
-            if portA.verify_configuration(str(original_svlan), 0):
-                portA.svlan = None
-                portB.svlan = None
-                portA.save()
-                portB.save()
-                logger.info(f"Ports {portA.id} and {portB.id} disconnected successfully.")
-                return Response({"detail": "Ports disconnected successfully."}, status=status.HTTP_200_OK)
-            else:
-                print(f"Verification failed on attempt {attempt + 1}/{max_retries}. Retrying...")
-                time.sleep(2)  # Wait before retrying
-
-        # If all retries fail
-        return Response({"detail": "Ports failed to disconnect - Verification fail"}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+def _free_svlan(svlan):
+    ports = Port.objects.filter(svlan=svlan)
+    Change.record(Port, ports.values_list('id', flat=True))
+    ports.update(svlan=None)
+    Svlan.release(svlan)
+
+
+async def _unlink_svlan(svlan, user_name: str) -> bool:
+    # Tears down the link using an SVLAN and frees it, like Reservation.delete()
+    peers = [port async for port in Port.objects.filter(svlan=svlan).order_by('id')]
+    if len(peers) >= 2 and not await device_async.delete_link(peers[0], peers[1], user_name):
+        logger.error(f"Failed to delete link for SVLAN {svlan}")
+        return False
+    await sync_to_async(_free_svlan)(svlan)
+    return True
+
+
+@csrf_exempt
+async def async_release(request):
+    """
+    Async Release Switch endpoint. Same payload and responses as /release;
+    the links of the switch are torn down concurrently.
+    """
+    user, data = await device_request(request)
+    if user is None:
+        return data
+    cleanup_switch = data.get('cleanup', False)
+    target, error = await sync_to_async(_release_target)(user, data.get('switch'))
+    if error:
+        body, status_code = error
+        return JsonResponse(body, status=status_code)
+    switch, reservation, is_last_reservation = target
+
+    svlans = {svlan async for svlan in Port.objects.filter(switch=switch).exclude(svlan=None)
+              .values_list('svlan', flat=True)}
+    unlinked = await asyncio.gather(*(_unlink_svlan(svlan, user.username) for svlan in svlans))
+    if not all(unlinked):
+        return JsonResponse({"error": "Failed to release switch. Some ports may still be connected."}, status=500)
+
+    await Reservation.objects.filter(id=reservation.id).adelete()
+    message = "Release successful."
+    if cleanup_switch and is_last_reservation:
+        if not await device_async.cleanup(switch):
+            logger.warning(f"Failed to clean up switch {switch.mngt_IP} after releasing last reservation")
+        message += " Switch cleanup performed."
+    elif cleanup_switch:
+        message += " Cleanup skipped - other reservations exist."
+    elif is_last_reservation:
+        message += " Switch ready for manual cleanup if needed."
+
+    await sync_to_async(jobs.queue_banner)(switch, user)
+    logger.info(f"User {user.username} released switch {switch.id} successfully (cleanup: {cleanup_switch}).")
+    return JsonResponse({"detail": message}, status=200)
+
+
+async def _verify_link(port, svlan, expected_lines: int) -> bool:
+    for attempt in range(jobs.VERIFY_RETRIES):
+        try:
+            if svlan in await device_async.verify_links(port.backbone, [svlan], expected_lines):
+                return True
+        except APIRequestError as e:
+            logger.error(f"Verification of SVLAN {svlan} on {port.backbone} failed: {e.message}")
+        logger.warning(f"Verification failed on attempt {attempt + 1}/{jobs.VERIFY_RETRIES}. Retrying...")
+        await asyncio.sleep(jobs.VERIFY_DELAY)
+    return False
+
+
+@csrf_exempt
+async def async_connect(request):
+    """
+    Async Connect Ports endpoint. Same payload as /connect, but answers once
+    the link is created and verified:
+    {"detail": "Ports connected successfully with svlan <svlan>"} (200)
+    """
+    user, data = await device_request(request)
+    if user is None:
+        return data
+    try:
+        portA, portB = await sync_to_async(assign_link)(user, data.get('portA'), data.get('portB'))
+    except LinkRequestError as e:
+        return JsonResponse({"detail": e.detail}, status=e.status_code)
+    svlan = portA.svlan
+
+    if await device_async.create_link(portA, portB, user.username):
+        if await _verify_link(portA, svlan, 4):
+            logger.info(f"Ports {portA.id} and {portB.id} connected successfully with svlan {svlan}.")
+            return JsonResponse({"detail": f"Ports connected successfully with svlan {svlan}"}, status=200)
+        detail = "Ports failed to connect - Verification fail"
     else:
-        logger.error(f"Failed to disconnect ports {portA.id} and {portB.id}.")
-        return Response({"detail": "Ports failed to disconnect."}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        detail = "Ports failed to connect"
+    logger.error(f"Failed to connect ports {portA.id} and {portB.id}: {detail}")
+    await sync_to_async(release_link)(portA, portB, svlan)
+    return JsonResponse({"detail": detail}, status=500)
+
+
+@csrf_exempt
+async def async_disconnect(request):
+    """
+    Async Disconnect Ports endpoint. Same payload as /disconnect, but answers
+    once the link is deleted and verified:
+    {"detail": "Ports disconnected successfully."} (200)
+    """
+    user, data = await device_request(request)
+    if user is None:
+        return data
+    try:
+        # The RUNNING job shows the teardown to check_link in every process
+        portA, portB, job = await sync_to_async(start_disconnect)(user, data.get('portA'), data.get('portB'), inline=True)
+    except LinkRequestError as e:
+        return JsonResponse({"detail": e.detail}, status=e.status_code)
+    svlan = portA.svlan
+
+    success, detail = False, "Disconnection interrupted."
+    try:
+        if not await device_async.delete_link(portA, portB, user.username):
+            detail = "Ports failed to disconnect."
+        elif not await _verify_link(portA, svlan, 0):
+            detail = "Ports failed to disconnect - Verification fail"
+        else:
+            await sync_to_async(release_link)(portA, portB, svlan)
+            success, detail = True, "Ports disconnected successfully."
+    finally:
+        await sync_to_async(jobs.finish_inline)(job, success, detail)
+    if not success:
+        return JsonResponse({"detail": detail}, status=500)
+    logger.info(f"Ports {portA.id} and {portB.id} disconnected successfully.")
+    return JsonResponse({"detail": detail}, status=200)
+
+
+# API endpoint to get the status of a background job
+@csrf_exempt
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def job_status(request, job_id):
+    """
+    Job Status endpoint.
+    Allows users to poll the progress of a connect/disconnect operation.
+
+    Expected Response Payload:
+    {
+        "id": <job_id>,
+        "kind": "connect" | "disconnect",
+        "status": "PENDING" | "RUNNING" | "SUCCEEDED" | "FAILED",
+        "detail": "<outcome message>",
+        ...
+    }
+    """
+    job = get_object_or_404(Job, id=job_id)
+    if job.user != request.user and not request.user.is_staff:
+        return Response({"detail": "You don't have access to this job."}, status=status.HTTP_403_FORBIDDEN)
+    serializer = JobSerializer(job)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+# API endpoint to get the circuit breaker state of the devices
+@csrf_exempt
+@api_view(['GET'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def device_health(request):
+    """
+    Device Health endpoint.
+    Lists the devices whose circuit is not closed, and the switches they make
+    unusable: a switch is affected when its management IP or the backbone of
+    one of its ports fails fast.
+
+    Expected Response Payload:
+    {
+        "hosts": [{"host": "<ip>", "state": "OPEN" | "HALF_OPEN", "failures": <int>,
+                   "open_until": "<datetime>", "last_error": "<message>"}, ...],
+        "switches": {"<switch_id>": "OPEN" | "HALF_OPEN", ...}
+    }
+    """
+    circuits = {circuit.host: circuit for circuit in DeviceCircuit.objects.exclude(state='CLOSED')}
+    hosts = [
+        {"host": circuit.host, "state": circuit.current_state, "failures": circuit.failures,
+         "open_until": circuit.open_until, "last_error": circuit.last_error}
+        for circuit in circuits.values()
+    ]
+
+    switches = {}
+    if circuits:
+        # A switch is as healthy as the least healthy device it depends on
+        for switch_id, ip in Switch.objects.filter(mngt_IP__in=circuits).values_list('id', 'mngt_IP'):
+            switches[switch_id] = circuits[ip].current_state
+        for switch_id, backbone in (Port.objects.filter(backbone__in=circuits)
+                                    .values_list('switch_id', 'backbone').distinct()):
+            if switches.get(switch_id) != 'OPEN':
+                switches[switch_id] = circuits[backbone].current_state
+    return Response({"hosts": hosts, "switches": switches}, status=status.HTTP_200_OK)
+
+
+# API endpoint to sync the port statuses with the backbones (admin only)
+@csrf_exempt
+@api_view(['POST'])
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAdminUser])
+def reconcile_ports(request):
+    """
+    Reconcile Ports endpoint.
+    Reads the interface states of the backbones (one command per backbone, in
+    parallel) and updates the ports whose status drifted.
+
+    Expected Request Payload (optional):
+    {
+        "backbones": ["<backbone IP>", ...]   (default: every backbone)
+    }
+
+    Expected Response Payload (200 if every backbone was read, 207 otherwise):
+    {
+        "results": [{"backbone": "<ip>", "status": "ok", "ports": <int>, "changed": [<port_id>, ...]}
+                    | {"backbone": "<ip>", "status": "failed", "detail": "<error>"}, ...]
+    }
+    """
+    backbones = request.data.get('backbones')
+    if backbones is not None and (not isinstance(backbones, list)
+                                  or not all(isinstance(backbone, str) for backbone in backbones)):
+        return Response({"detail": "'backbones' must be a list of backbone IPs."}, status=status.HTTP_400_BAD_REQUEST)
+    if backbones is not None:
+        unknown = set(backbones) - set(Port.objects.filter(backbone__in=backbones)
+                                       .values_list('backbone', flat=True).distinct())
+        if unknown:
+            return Response({"detail": f"Unknown backbone(s): {sorted(unknown)}"}, status=status.HTTP_404_NOT_FOUND)
+
+    results = reconcile_port_states(backbones)
+    if all(result['status'] == 'ok' for result in results):
+        return Response({"results": results}, status=status.HTTP_200_OK)
+    return Response({"results": results}, status=status.HTTP_207_MULTI_STATUS)
 
 
 # API endpoint to share topology with another user
@@ -668,22 +1306,26 @@ def list_shared_topologies(request):
     Liste les topologies partagées avec l'utilisateur courant et celles qu'il a partagées.
     """
     # Topologies shared WITH me (where I'm the target)
-    shared_with_me = TopologyShare.objects.filter(target=request.user)
+    shared_with_me = TopologyShare.objects.filter(target=request.user).values(
+        'id', 'owner_id', 'owner__username', 'created_at'
+    )
     shared_with_me_data = [{
-        "id": s.id,
-        "owner_id": s.owner.id, 
-        "owner_username": s.owner.username, 
-        "shared_at": s.created_at,
+        "id": s['id'],
+        "owner_id": s['owner_id'],
+        "owner_username": s['owner__username'],
+        "shared_at": s['created_at'],
         "direction": "received"
     } for s in shared_with_me]
     
     # Topologies I shared (where I'm the owner)
-    shared_by_me = TopologyShare.objects.filter(owner=request.user)
+    shared_by_me = TopologyShare.objects.filter(owner=request.user).values(
+        'id', 'target_id', 'target__username', 'created_at'
+    )
     shared_by_me_data = [{
-        "id": s.id,
-        "target_id": s.target.id,
-        "target_username": s.target.username,
-        "shared_at": s.created_at,
+        "id": s['id'],
+        "target_id": s['target_id'],
+        "target_username": s['target__username'],
+        "shared_at": s['created_at'],
         "direction": "shared"
     } for s in shared_by_me]
     
@@ -733,24 +1375,26 @@ def get_shared_topology(request, owner_id):
         owner = User.objects.get(id=owner_id)
         if not TopologyShare.objects.filter(owner=owner, target=request.user).exists():
             return Response({"detail": "No shared topology from this user."}, status=status.HTTP_403_FORBIDDEN)
-        # On réutilise la logique de save_topology mais pour l'utilisateur owner
-        topology_data = {
-            "connections": []
-        }
-        user_reservations = Reservation.objects.filter(user=owner)
-        user_ports = Port.objects.filter(switch__in=user_reservations.values('switch'))
-        svlan_groups = user_ports.values_list('svlan', flat=True).distinct()
-        import itertools
-        for svlan in svlan_groups:
-            ports_with_same_svlan = list(user_ports.filter(svlan=svlan))
-            if len(ports_with_same_svlan) > 1:
-                connections = list(itertools.combinations(ports_with_same_svlan, 2))
-                for port1, port2 in connections:
-                    topology_data["connections"].append({
-                        "port1_id": port1.id,
-                        "port2_id": port2.id,
-                        "svlan": svlan
-                    })
-        return Response(topology_data, status=status.HTTP_200_OK)
+        return Response(build_topology(owner), status=status.HTTP_200_OK)
     except User.DoesNotExist:
         return Response({"detail": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+
+# API endpoint to get the topology of the current user
+@api_view(['GET'])
+@csrf_exempt
+@authentication_classes([SessionAuthentication, TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def get_topology(request):
+    """
+    Get Topology endpoint.
+    Returns the switches reserved by the current user, their ports and the links between them.
+
+    Expected Response Payload:
+    {
+        "switches": [{"id": ..., "model": ..., "mngt_IP": ...}],
+        "ports": [{"id": ..., "switch": ..., "port_switch": ..., "port_backbone": ..., "svlan": ..., "status": ...}],
+        "connections": [{"port1_id": ..., "port2_id": ..., "svlan": ...}]
+    }
+    """
+    return Response(build_topology(request.user), status=status.HTTP_200_OK)
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     "api",
     'rest_framework.authtoken',
     'corsheaders',
+    'django_filters',
 ]
 
 MIDDLEWARE = [
@@ -153,6 +154,12 @@ SESSION_COOKIE_SAMESITE = 'Lax'  # or 'Strict' or 'None'
 
 TRAP_SECURITY_KEY = 'your_secure_static_key_here'
 
+# Service VLANs handed out to port links (bounds included)
+SVLAN_RANGE = (1001, 4094)
+
+# Source of the live events streamed by /api/events/ (see api/events.py)
+EVENT_BROKER = 'api.events.ChangeLogBroker'
+
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
@@ -88,23 +88,121 @@ export const portService = {
   },
   
   async connect(portA, portB) {
-    return baseApiCall(
+    const result = await baseApiCall(
       () => api.post(API_ENDPOINTS.CONNECT, { 
         portA: portA, 
         portB: portB 
       }),
       'connect ports'
     );
+    return result.success ? jobService.waitFor(result.data.job) : result;
   },
   
   async disconnect(portA, portB) {
-    return baseApiCall(
+    const result = await baseApiCall(
       () => api.post(API_ENDPOINTS.DISCONNECT, { 
         portA: portA, 
         portB: portB 
       }),
       'disconnect ports'
     );
+    return result.success ? jobService.waitFor(result.data.job) : result;
+  }
+};
+
+// Background Job API calls
+export const jobService = {
+  async get(jobId) {
+    return baseApiCall(
+      () => api.get(`${API_ENDPOINTS.JOB}${jobId}/`),
+      'fetch job'
+    );
+  },
+
+  /**
+   * Poll a job until it is finished
+   * @param {number} jobId - Id returned by connect/disconnect
+   * @param {number} interval - Delay between two polls in milliseconds
+   * @param {number} timeout - Give up after this many milliseconds (the server
+   *   fails jobs abandoned by a dead worker after 10 minutes)
+   * @returns {Promise<Object>} - Standardized response object of the final job state
+   */
+  async waitFor(jobId, interval = 1000, timeout = 15 * 60 * 1000) {
+    const deadline = Date.now() + timeout;
+    for (;;) {
+      const result = await this.get(jobId);
+      if (!result.success) {
+        return result;
+      }
+      if (result.data.status === 'SUCCEEDED') {
+        return result;
+      }
+      if (result.data.status === 'FAILED') {
+        return { success: false, message: result.data.detail, status: 422 };
+      }
+      if (Date.now() >= deadline) {
+        return { success: false, message: 'The operation is still running, check again later.', status: 504 };
+      }
+      await new Promise(resolve => setTimeout(resolve, interval));
+    }
+  }
+};
+
+// Live update stream (server-sent events)
+export const eventService = {
+  /**
+   * Open the live event stream of the current user
+   * @param {Function} onEvent - Called with each parsed event ({type, id, data|deleted})
+   * @param {Function} onStatus - Called with true when the stream is open, false when it is down
+   * @returns {Function} - Closes the stream
+   */
+  subscribe(onEvent, onStatus = () => {}) {
+    // The stream URL carries a single-use ticket, never the API token: every
+    // (re)connection asks for a new ticket instead of letting EventSource retry
+    const reconnectDelay = 3000;
+    let source = null;
+    let timer = null;
+    let closed = false;
+
+    const reconnect = () => {
+      onStatus(false);
+      if (!closed) {
+        timer = setTimeout(open, reconnectDelay);
+      }
+    };
+
+    const open = async () => {
+      let ticket;
+      try {
+        ticket = (await api.post(API_ENDPOINTS.EVENT_TICKET)).data.ticket;
+      } catch (error) {
+        logError(error, 'event ticket');
+        reconnect();
+        return;
+      }
+      if (closed) return;
+      const url = `${api.defaults.baseURL}${API_ENDPOINTS.EVENTS}?ticket=${encodeURIComponent(ticket)}`;
+      source = new EventSource(url, { withCredentials: true });
+      source.onopen = () => onStatus(true);
+      source.onerror = () => {
+        source.close();
+        reconnect();
+      };
+      source.onmessage = (message) => {
+        try {
+          onEvent(JSON.parse(message.data));
+        } catch (error) {
+          logError(error, 'live event');
+        }
+      };
+    };
+
+    open();
+    return () => {
+      closed = true;
+      clearTimeout(timer);
+      if (source) source.close();
+    };
   }
 };
 
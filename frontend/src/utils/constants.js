@@ -15,6 +15,9 @@ export const API_ENDPOINTS = {
   RELEASE: 'release/',
   CONNECT: 'connect/',
   DISCONNECT: 'disconnect/',
+  JOB: 'job/',
+  EVENT_TICKET: 'event_ticket/',
+  EVENTS: 'events/',
   SHARE_TOPOLOGY: 'share_topology/',
   LIST_SHARED_TOPOLOGIES: 'list_shared_topologies/',
   UNSHARE_TOPOLOGY: 'unshare_topology/'